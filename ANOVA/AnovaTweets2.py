@@ -1,62 +1,415 @@
+from array import array
+from collections import Counter
 from pathlib import Path
-import csv
+import argparse
+import json
+import math
+import os
+import sys
+import time
 try:
-    import matplotlib.pyplot as plt
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
 except Exception:
-    plt = None
+    np = Figure = FigureCanvasAgg = None
 
+# Módulos compartidos en la raíz del repositorio (formato columnar, lector mmap,
+# compresión, tiempos por etapa)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import columnar  # noqa: E402
+import compressed  # noqa: E402
+import features  # noqa: E402
+import mmap_csv  # noqa: E402
+import pipeline  # noqa: E402
 
-def leer_estadisticas(csv_path: Path):
+from agrupado import acumulador, combinar  # noqa: E402
+
+
+TARGETS = (0, 2, 4)
+FACTORES = ("sentimiento", "marca", "hashtag")
+PATRONES_PARTES = ("part-*.csv", "part-*.csv.gz", "part-*.csv.zst")
+# Tope de array('H'); un texto más largo solo sale de un CSV mal formado
+# (p. ej. una comilla sin cerrar que se traga las líneas siguientes)
+LARGO_MAXIMO = 65535
+
+
+def _avisar_largos(omitidas, origen):
+    if omitidas:
+        print(
+            f"Aviso: {omitidas} filas de {origen} con texto de más de {LARGO_MAXIMO} caracteres omitidas (¿CSV mal formado?)",
+            file=sys.stderr,
+        )
+
+
+def _indices_columnas(header):
+    # Posiciones de target y text en el encabezado del part file de Spark
+    lowered = [c.strip().lower() for c in header]
+    try:
+        return lowered.index("target"), lowered.index("text")
+    except ValueError:
+        return None
+
+
+def serializar_acumuladores(accs):
+    return json.dumps({str(t): acc for t, acc in accs.items()})
+
+
+def deserializar_acumuladores(texto):
+    accs = {}
+    for t, acc in json.loads(texto).items():
+        hist = acc.get("hist")
+        if hist is not None:
+            hist = {int(v): c for v, c in hist.items()}
+        accs[int(t)] = {**acc, "hist": hist}
+    return accs
+
+
+def acumular_archivo(csv_path: Path, con_longitudes: bool = True):
     """
-    Lee: target,ids,date,flag,user,text (latin-1)
-    Calcula por grupo (0,2,4): n, suma longitudes y suma de cuadrados.
-    """
-    grupos = {0: {"n": 0, "sum": 0.0, "sumsq": 0.0},
-              2: {"n": 0, "sum": 0.0, "sumsq": 0.0},
-              4: {"n": 0, "sum": 0.0, "sumsq": 0.0}}
-    with csv_path.open(newline="", encoding="latin-1") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                t = int(row.get("target", ""))
-            except Exception:
+    Una sola pasada sobre target,ids,date,flag,user,text (latin-1, con encabezado).
+    Devuelve (accs, lengths): un acumulador por grupo (0,2,4) y las longitudes
+    de cada grupo en array('H'). Con con_longitudes=False no se guardan las
+    longitudes ni el histograma.
+    Si csv_path es una copia columnar (.cols) solo se leen target y los
+    offsets de text, sin decodificar el texto. También acepta el CSV
+    comprimido (gzip, zstd o un miembro de un zip).
+    """
+    if columnar.is_columnar(csv_path):
+        return _acumular_columnar(csv_path, con_longitudes)
+    n = {t: 0 for t in TARGETS}
+    suma = {t: 0 for t in TARGETS}
+    sumsq = {t: 0 for t in TARGETS}
+    lengths = {t: array("H") for t in TARGETS}
+    rapido = {str(t): t for t in TARGETS}
+    omitidas = 0
+    with mmap_csv.open_csv(str(csv_path), encoding="latin-1") as f:
+        header, inicio = f.first_record()
+        idx = _indices_columnas(header) if header else None
+        if idx is not None:
+            t_idx, text_idx = idx
+            for row in f.iter_rows(inicio):
+                try:
+                    v = row[t_idx]
+                except IndexError:
+                    continue
+                t = rapido.get(v)
+                if t is None:
+                    try:
+                        t = int(v)
+                    except Exception:
+                        continue
+                    if t not in n:
+                        continue
+                L = len(row[text_idx]) if text_idx < len(row) else 0
+                if L > LARGO_MAXIMO:
+                    omitidas += 1
+                    continue
+                n[t] += 1
+                suma[t] += L
+                sumsq[t] += L * L
+                if con_longitudes:
+                    lengths[t].append(L)
+    _avisar_largos(omitidas, csv_path)
+    hists = histogramas(lengths) if con_longitudes else {t: None for t in TARGETS}
+    accs = {t: acumulador(n[t], suma[t], sumsq[t], hists[t]) for t in TARGETS}
+    return accs, lengths
+
+
+def _acumular_columnar(path: Path, con_longitudes: bool = True):
+    with columnar.ColumnarTable(path) as table:
+        codes = table.target_codes()
+        largos = table.char_lengths("text")
+        lengths = {t: array("H") for t in TARGETS}
+        omitidas = 0
+        if np is not None:
+            # Columnas completas: un filtro por grupo en vez de un bucle por fila
+            objetivos = np.frombuffer(codes, dtype=np.uint8)
+            largos = np.asarray(largos)
+            cabe = largos <= LARGO_MAXIMO
+            for t in TARGETS:
+                del_grupo = objetivos == t
+                omitidas += int(np.count_nonzero(del_grupo & ~cabe))
+                lengths[t] = array("H", largos[del_grupo & cabe].astype(np.uint16).tobytes())
+            del objetivos
+        else:
+            for t, L in zip(codes, largos):
+                if t in lengths:
+                    if L > LARGO_MAXIMO:
+                        omitidas += 1
+                        continue
+                    lengths[t].append(L)
+        codes.release()
+    _avisar_largos(omitidas, path)
+    accs = {}
+    for t in TARGETS:
+        xs = lengths[t]
+        accs[t] = acumulador(len(xs), sum(xs), sum(L * L for L in xs), None)
+    if con_longitudes:
+        hists = histogramas(lengths)
+        for t in TARGETS:
+            accs[t]["hist"] = hists[t]
+    else:
+        lengths = {t: array("H") for t in TARGETS}
+    return accs, lengths
+
+
+def acumular_caracteristicas(db_path: Path, con_longitudes: bool = True):
+    """
+    Mismo resultado que acumular_archivo, leyendo target y longitud de la
+    tabla de características (features.py) en vez de recorrer el CSV.
+    """
+    import sqlite3
+
+    n = {t: 0 for t in TARGETS}
+    suma = {t: 0 for t in TARGETS}
+    sumsq = {t: 0 for t in TARGETS}
+    lengths = {t: array("H") for t in TARGETS}
+    rapido = {str(t): t for t in TARGETS}
+    omitidas = 0
+    conn = sqlite3.connect(str(db_path))
+    try:
+        features.require(conn, "length")
+        filas = conn.execute(
+            "SELECT t.target, f.length FROM tweets t JOIN f_length f ON f.row = t.row ORDER BY t.row"
+        )
+        for v, L in filas:
+            t = rapido.get(v)
+            if t is None:
+                try:
+                    t = int(v)
+                except Exception:
+                    continue
+                if t not in n:
+                    continue
+            if L > LARGO_MAXIMO:
+                omitidas += 1
                 continue
-            if t not in grupos:
+            n[t] += 1
+            suma[t] += L
+            sumsq[t] += L * L
+            if con_longitudes:
+                lengths[t].append(L)
+    finally:
+        conn.close()
+    _avisar_largos(omitidas, db_path)
+    hists = histogramas(lengths) if con_longitudes else {t: None for t in TARGETS}
+    accs = {t: acumulador(n[t], suma[t], sumsq[t], hists[t]) for t in TARGETS}
+    return accs, lengths
+
+
+def buscar_partes(entrada: Path):
+    # Un CSV concreto (comprimido o no) o copia columnar (.cols), o todos los
+    # part-*.csv[.gz|.zst] de un directorio de salida de Spark; cada part usa
+    # su <part>.cols si está al día
+    if columnar.is_columnar(entrada):
+        return [entrada]
+    if entrada.is_dir():
+        partes = []
+        for p in sorted(q for patron in PATRONES_PARTES for q in entrada.glob(patron)):
+            cols = columnar.columnar_path_for(p)
+            partes.append(cols if columnar.is_up_to_date(p, cols) else p)
+        return partes
+    archivo, _ = compressed.split_zip_member(str(entrada))
+    return [entrada] if os.path.isfile(archivo) else []
+
+
+def leer_partes(rutas, workers=1, con_longitudes=True):
+    """
+    Acumula cada part file por separado (en paralelo si workers > 1) y combina
+    los resultados en el orden de los archivos.
+    """
+    if workers > 1 and len(rutas) > 1:
+        from multiprocessing import Pool
+        with Pool(min(workers, len(rutas))) as pool:
+            partes = pool.starmap(acumular_archivo, [(r, con_longitudes) for r in rutas])
+    else:
+        partes = [acumular_archivo(r, con_longitudes) for r in rutas]
+
+    accs = {t: acumulador(hist={} if con_longitudes else None) for t in TARGETS}
+    lengths = {t: array("H") for t in TARGETS}
+    for accs_parte, lengths_parte in partes:
+        for t in TARGETS:
+            accs[t] = combinar(accs[t], accs_parte[t])
+            lengths[t].extend(lengths_parte[t])
+    return accs, lengths
+
+
+def filas_factor_caracteristicas(db_path: Path, factor: str):
+    """
+    (target, longitud, etiqueta) desde la tabla de características
+    (features.py). Con factor "hashtag" un tweet aparece una vez por cada
+    hashtag distinto (en minúsculas) y los tweets sin hashtag no aparecen.
+    """
+    import sqlite3
+
+    omitidas = 0
+    conn = sqlite3.connect(str(db_path))
+    try:
+        features.require(conn, "length")
+        if factor == "marca":
+            features.require(conn, "brand")
+            sql = (
+                "SELECT t.target, l.length, b.brand FROM tweets t"
+                " JOIN f_length l ON l.row = t.row JOIN f_brand b ON b.row = t.row ORDER BY t.row"
+            )
+        else:
+            features.require(conn, "hashtags")
+            sql = (
+                "SELECT t.target, l.length, h.tag"
+                " FROM (SELECT DISTINCT row, lower(hashtag) AS tag FROM f_hashtags) h"
+                " JOIN tweets t ON t.row = h.row JOIN f_length l ON l.row = h.row ORDER BY h.row"
+            )
+        yield from conn.execute(sql)
+    finally:
+        conn.close()
+
+
+def filas_factor_marcas_csv(csv_path: Path):
+    """
+    (target, longitud, marca) desde la salida de exportar_marcas_csv.py.
+    Con encabezado se buscan las columnas text, Marca y (si está) target; la
+    salida por defecto (ids,user,text,Marca, UTF-8) no tiene target y se
+    devuelve None. Sin encabezado se asume --preserve_all_columns sobre
+    Sentiment140 (target … text, Marca; latin-1).
+    """
+    with mmap_csv.open_csv(str(csv_path), encoding="latin-1") as f:
+        primera, inicio = f.first_record()
+    lowered = [c.strip().lower() for c in primera]
+    if "marca" in lowered and "text" in lowered:
+        t_idx = lowered.index("target") if "target" in lowered else None
+        text_idx, m_idx = lowered.index("text"), lowered.index("marca")
+    elif len(primera) >= 7:
+        t_idx, text_idx, m_idx, inicio = 0, 5, 6, 0
+    else:
+        return
+    # Misma codificación con la que escribe exportar_marcas_csv.py
+    encoding = "ISO-8859-1" if t_idx is not None else "UTF-8"
+    need = max(text_idx, m_idx, t_idx or 0)
+    with mmap_csv.open_csv(str(csv_path), encoding=encoding) as f:
+        for row in f.iter_rows(inicio):
+            if len(row) <= need:
                 continue
-            L = len(row.get("text", ""))
-            g = grupos[t]
-            g["n"] += 1
-            g["sum"] += L
-            g["sumsq"] += L * L
+            yield (row[t_idx] if t_idx is not None else None), len(row[text_idx]), row[m_idx]
+
+
+def acumular_por_factor(filas, con_histogramas=True):
+    """
+    Acumuladores por celda {(target, etiqueta): acc} en una pasada sobre
+    (target, longitud, etiqueta). target None (sin columna de sentimiento)
+    se conserva como nivel; filas con target no válido se descartan.
+    """
+    import agrupado
 
-    # Convertir a mean/var
+    rapido = {str(t): t for t in TARGETS}
+    grupos = agrupado.AcumuladorPorGrupo(con_histogramas)
+    for v, L, etiqueta in filas:
+        t = None
+        if v is not None:
+            t = rapido.get(v)
+            if t is None:
+                try:
+                    t = int(v)
+                except Exception:
+                    continue
+                if t not in TARGETS:
+                    continue
+        grupos.agregar((t, etiqueta), L)
+    return grupos.acumuladores()
+
+
+def estadisticas(accs):
+    """n, media y varianza muestral por grupo a partir de los acumuladores."""
     stats = {}
-    for t, g in grupos.items():
-        n = g["n"]
-        if n > 0:
-            mean = g["sum"] / n
-            var = (g["sumsq"] - (g["sum"] ** 2) / n) / (n - 1) if n > 1 else 0.0
-        else:
-            mean = 0.0
-            var = 0.0
-        stats[t] = {"n": n, "mean": mean, "var": var}
+    for t, acc in accs.items():
+        n = acc["n"]
+        var = acc["m2"] / (n - 1) if n > 1 else 0.0
+        stats[t] = {"n": n, "mean": acc["mean"] if n > 0 else 0.0, "var": var}
     return stats
 
 
+def leer_un_paso(csv_path: Path, con_longitudes: bool = True):
+    """
+    Devuelve (stats, lengths) de un solo archivo: n/media/varianza por grupo
+    (0,2,4) y las longitudes de cada grupo en array('H').
+    """
+    accs, lengths = acumular_archivo(csv_path, con_longitudes)
+    return estadisticas(accs), lengths
+
+
+def leer_estadisticas(csv_path: Path):
+    """
+    Lee: target,ids,date,flag,user,text (latin-1)
+    Calcula por grupo (0,2,4): n, media y varianza de la longitud.
+    """
+    return leer_un_paso(csv_path, con_longitudes=False)[0]
+
+
 def leer_longitudes(csv_path: Path):
-    grupos = {0: [], 2: [], 4: []}
-    with csv_path.open(newline="", encoding="latin-1") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                t = int(row.get("target", ""))
-            except Exception:
-                continue
-            if t not in grupos:
-                continue
-            L = len(row.get("text", ""))
-            grupos[t].append(L)
-    return grupos
+    return leer_un_paso(csv_path)[1]
+
+
+def histogramas(lengths):
+    """Conteos por valor de longitud para cada grupo: {t: {longitud: n}} ordenados por longitud."""
+    return {t: dict(sorted(Counter(xs).items())) for t, xs in lengths.items()}
+
+
+def _vista(xs):
+    # Vista NumPy sin copia sobre el buffer de array('H'); sin NumPy se usa tal cual
+    if not isinstance(xs, array):
+        return xs
+    try:
+        import numpy as np
+    except Exception:
+        return xs
+    return np.frombuffer(xs, dtype=np.uint16)
+
+
+def _momentos_centrales(hist):
+    n = sum(hist.values())
+    mean = math.fsum(v * c for v, c in hist.items()) / n
+    m2 = math.fsum(c * (v - mean) ** 2 for v, c in hist.items()) / n
+    m3 = math.fsum(c * (v - mean) ** 3 for v, c in hist.items()) / n
+    m4 = math.fsum(c * (v - mean) ** 4 for v, c in hist.items()) / n
+    return n, m2, m3, m4
+
+
+def dagostino_histograma(hist):
+    """
+    Prueba K² de D'Agostino-Pearson (misma fórmula que scipy.stats.normaltest)
+    calculada desde el histograma de conteos. Requiere n >= 8.
+    """
+    n, m2, m3, m4 = _momentos_centrales(hist)
+    if n < 8 or m2 <= 0:
+        return None
+    # Asimetría (skewtest)
+    b1 = m3 / m2 ** 1.5
+    y = b1 * math.sqrt(((n + 1) * (n + 3)) / (6.0 * (n - 2)))
+    beta2 = (3.0 * (n * n + 27 * n - 70) * (n + 1) * (n + 3)
+             / ((n - 2.0) * (n + 5) * (n + 7) * (n + 9)))
+    w2 = -1 + math.sqrt(2 * (beta2 - 1))
+    delta = 1 / math.sqrt(0.5 * math.log(w2))
+    alpha = math.sqrt(2.0 / (w2 - 1))
+    if y == 0:
+        y = 1
+    z_s = delta * math.log(y / alpha + math.sqrt((y / alpha) ** 2 + 1))
+    # Curtosis (kurtosistest)
+    b2 = m4 / m2 ** 2
+    e = 3.0 * (n - 1) / (n + 1)
+    varb2 = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+    x = (b2 - e) / math.sqrt(varb2)
+    sqrtbeta1 = (6.0 * (n * n - 5 * n + 2) / ((n + 7) * (n + 9))
+                 * math.sqrt((6.0 * (n + 3) * (n + 5)) / (n * (n - 2) * (n - 3))))
+    a = 6.0 + 8.0 / sqrtbeta1 * (2.0 / sqrtbeta1 + math.sqrt(1 + 4.0 / (sqrtbeta1 ** 2)))
+    term1 = 1 - 2 / (9.0 * a)
+    denom = 1 + x * math.sqrt(2 / (a - 4.0))
+    if denom == 0:
+        return None
+    term2 = math.copysign(((1 - 2.0 / a) / abs(denom)) ** (1 / 3.0), denom)
+    z_k = (term1 - term2) / math.sqrt(2 / (9.0 * a))
+    k2 = z_s * z_s + z_k * z_k
+    # chi² con 2 g.l.: sf(x) = exp(-x/2)
+    return {"stat": k2, "p": math.exp(-k2 / 2)}
 
 
 def anova(stats):
@@ -86,141 +439,302 @@ def anova(stats):
     return {"F": F, "df1": df1, "df2": df2, "p": p, "grand_mean": grand_mean}
 
 
-def pruebas_normalidad(lengths):
+def pruebas_normalidad(lengths, hists=None):
+    if hists is None:
+        hists = histogramas(lengths)
     res = {0: {"shapiro": None, "dagostino": None}, 2: {"shapiro": None, "dagostino": None}, 4: {"shapiro": None, "dagostino": None}}
+    for t in (0, 2, 4):
+        h = hists.get(t, {})
+        if sum(h.values()) >= 8:
+            try:
+                res[t]["dagostino"] = dagostino_histograma(h)
+            except Exception:
+                res[t]["dagostino"] = None
     try:
-        from scipy.stats import shapiro, normaltest
+        from scipy.stats import shapiro
         for t in (0, 2, 4):
             xs = lengths.get(t, [])
             if len(xs) >= 3:
                 try:
-                    w, p = shapiro(xs[:5000])
+                    w, p = shapiro(_vista(xs)[:5000])
                     res[t]["shapiro"] = {"stat": float(w), "p": float(p)}
                 except Exception:
                     res[t]["shapiro"] = None
-            if len(xs) >= 8:
-                try:
-                    k2, p2 = normaltest(xs)
-                    res[t]["dagostino"] = {"stat": float(k2), "p": float(p2)}
-                except Exception:
-                    res[t]["dagostino"] = None
     except Exception:
         pass
     return res
 
 
-def homogeneidad_test(lengths):
-    try:
-        from scipy.stats import levene
-        grupos = [g for g in (lengths.get(0, []), lengths.get(2, []), lengths.get(4, [])) if len(g) > 1]
-        if len(grupos) >= 2:
-            stat, p = levene(*grupos)
-            return {"stat": float(stat), "p": float(p)}
-    except Exception:
-        return None
-    return None
+def _mediana_histograma(hist):
+    # Misma convención que np.median: promedio de los dos centrales si n es par
+    n = sum(hist.values())
+    objetivos = ((n - 1) // 2, n // 2)
+    valores = []
+    acum = 0
+    for v, c in sorted(hist.items()):
+        acum += c
+        while len(valores) < 2 and objetivos[len(valores)] < acum:
+            valores.append(v)
+        if len(valores) == 2:
+            break
+    return (valores[0] + valores[1]) / 2
+
+
+def _tamanos_grupos(grupos):
+    # n de cada grupo; las pruebas necesitan al menos dos grupos no vacíos
+    ns = [sum(h.values()) for h in grupos]
+    if len(grupos) < 2:
+        raise ValueError("Se necesitan al menos dos grupos.")
+    if not all(ns):
+        raise ValueError("Hay grupos vacíos; exclúyalos antes de la prueba.")
+    return ns
 
 
-def kruskal_wallis(lengths):
+def levene_histogramas(grupos):
+    """
+    Levene centrado en la mediana (Brown–Forsythe, igual que scipy.stats.levene
+    por defecto) a partir de histogramas {valor: conteo}; O(valores distintos).
+    Devuelve (W, k - 1, N - k).
+    """
+    ns = _tamanos_grupos(grupos)
+    k = len(grupos)
+    N = sum(ns)
+    medias_z = []
+    ssw = []
+    for h, n in zip(grupos, ns):
+        med = _mediana_histograma(h)
+        zbar = math.fsum(c * abs(v - med) for v, c in h.items()) / n
+        medias_z.append(zbar)
+        ssw.append(math.fsum(c * (abs(v - med) - zbar) ** 2 for v, c in h.items()))
+    zbar_total = math.fsum(n * z for n, z in zip(ns, medias_z)) / N
+    numer = (N - k) * math.fsum(n * (z - zbar_total) ** 2 for n, z in zip(ns, medias_z))
+    denom = (k - 1) * math.fsum(ssw)
+    # Todos los grupos constantes: W indefinido, como en SciPy
+    return (numer / denom if denom else float("nan")), k - 1, N - k
+
+
+def kruskal_histogramas(grupos):
+    """
+    H de Kruskal–Wallis con corrección por empates (igual que scipy.stats.kruskal)
+    a partir de histogramas: cada valor distinto recibe su rango promedio.
+    Devuelve (H, k - 1).
+    """
+    ns = _tamanos_grupos(grupos)
+    k = len(grupos)
+    N = sum(ns)
+    valores = sorted(set().union(*grupos))
+    sumas_rangos = [0.0] * k
+    empates = 0
+    antes = 0
+    for v in valores:
+        cs = [h.get(v, 0) for h in grupos]
+        t = sum(cs)
+        rango = antes + (t + 1) / 2
+        for i, c in enumerate(cs):
+            if c:
+                sumas_rangos[i] += c * rango
+        empates += t ** 3 - t
+        antes += t
+    ssbn = math.fsum(r * r / n for r, n in zip(sumas_rangos, ns))
+    h = 12.0 / (N * (N + 1)) * ssbn - 3 * (N + 1)
+    correccion = 1 - empates / (N ** 3 - N)
+    # Un solo valor en todos los grupos: H indefinido, como en SciPy
+    return (h / correccion if correccion else float("nan")), k - 1
+
+
+def homogeneidad_test(hists):
     try:
-        from scipy.stats import kruskal
-        grupos = [g for g in (lengths.get(0, []), lengths.get(2, []), lengths.get(4, [])) if len(g) > 0]
-        if len(grupos) >= 2:
-            h, p = kruskal(*grupos)
-            return {"H": float(h), "p": float(p)}
-    except Exception:
+        from scipy.stats import f as f_dist
+    except ImportError:
+        return None
+    grupos = [h for h in hists.values() if h]
+    if len(grupos) < 2 or sum(sum(h.values()) for h in grupos) <= len(grupos):
         return None
-    return None
+    stat, df1, df2 = levene_histogramas(grupos)
+    return {"stat": float(stat), "p": float(f_dist.sf(stat, df1, df2))}
 
 
-def grafico_histogramas(lengths, base: Path):
-    if plt is None:
-        return []
-    label = {0: "negativo", 2: "neutral", 4: "positivo"}
-    rutas = []
-    for t in (0, 2, 4):
-        xs = lengths.get(t, [])
-        if not xs:
-            continue
-        fig = plt.figure(figsize=(6, 4))
-        plt.hist(xs, bins=30, color="#4C78A8", alpha=0.9)
-        plt.title(f"Histograma longitud – {label.get(t)}")
-        plt.xlabel("longitud")
-        plt.ylabel("frecuencia")
-        ruta = base / f"AnovaTweets2_hist_{t}.png"
-        fig.tight_layout()
-        fig.savefig(ruta)
-        plt.close(fig)
-        rutas.append(str(ruta))
-    return rutas
-
-
-def grafico_boxplot(lengths, base: Path):
-    if plt is None:
+def kruskal_wallis(hists):
+    try:
+        from scipy.stats import chi2
+    except ImportError:
         return None
-    datos = []
-    etiquetas = []
-    label = {0: "negativo", 2: "neutral", 4: "positivo"}
-    for t in (0, 2, 4):
-        xs = lengths.get(t, [])
-        if xs:
-            datos.append(xs)
-            etiquetas.append(label.get(t))
-    if not datos:
+    grupos = [h for h in hists.values() if h]
+    if len(grupos) < 2:
         return None
-    fig = plt.figure(figsize=(7, 5))
-    plt.boxplot(datos, labels=etiquetas, showmeans=True)
-    plt.title("Boxplot longitud por sentimiento")
-    plt.ylabel("longitud")
-    ruta = base / "AnovaTweets2_boxplot.png"
+    h, df = kruskal_histogramas(grupos)
+    return {"H": float(h), "p": float(chi2.sf(h, df))}
+
+
+ETIQUETAS = {0: "negativo", 2: "neutral", 4: "positivo"}
+BINS_HISTOGRAMA = 30
+QQ_PUNTOS = 2000
+# Rangos por bloque al ajustar la recta del QQ plot (memoria acotada)
+QQ_BLOQUE = 1 << 20
+
+
+def _guardar(fig, ruta: Path):
+    # Lienzo Agg explícito: sin pyplot ni estado global, seguro en procesos hijos
+    FigureCanvasAgg(fig)
     fig.tight_layout()
     fig.savefig(ruta)
-    plt.close(fig)
     return str(ruta)
 
 
-def grafico_qq(lengths, base: Path):
-    if plt is None:
-        return []
-    rutas = []
-    try:
-        from scipy.stats import probplot
-    except Exception:
-        return []
-    label = {0: "negativo", 2: "neutral", 4: "positivo"}
-    for t in (0, 2, 4):
-        xs = lengths.get(t, [])
-        if len(xs) >= 3:
-            fig = plt.figure(figsize=(6, 4))
-            probplot(xs, dist="norm", plot=plt)
-            plt.title(f"QQ plot normal – {label.get(t)}")
-            ruta = base / f"AnovaTweets2_qq_{t}.png"
-            fig.tight_layout()
-            fig.savefig(ruta)
-            plt.close(fig)
-            rutas.append(str(ruta))
-    return rutas
+def _valores_conteos(hist):
+    valores = np.fromiter(hist.keys(), dtype=float, count=len(hist))
+    conteos = np.fromiter(hist.values(), dtype=np.int64, count=len(hist))
+    orden = np.argsort(valores)
+    return valores[orden], conteos[orden]
 
 
-def grafico_varianzas(stats, base: Path):
-    if plt is None:
+def bins_histograma(hist, bins=BINS_HISTOGRAMA):
+    """(conteos, bordes) en los mismos bins que hist() sobre los datos crudos."""
+    valores, conteos = _valores_conteos(hist)
+    return np.histogram(valores, bins=bins, weights=conteos)
+
+
+def _percentil_histograma(valores, acumulado, q):
+    # Interpolación lineal entre rangos, como np.percentile sobre los datos crudos
+    n = int(acumulado[-1])
+    pos = (n - 1) * q
+    k = int(math.floor(pos))
+    bajo = valores[int(np.searchsorted(acumulado, k, side="right"))]
+    alto = valores[int(np.searchsorted(acumulado, min(k + 1, n - 1), side="right"))]
+    return float(bajo + (alto - bajo) * (pos - k))
+
+
+def cajas_histograma(hist, etiqueta):
+    """
+    Estadísticos de la caja (cuartiles, bigotes a 1.5·RIC, media y atípicos)
+    desde el histograma, con la convención de matplotlib.cbook.boxplot_stats.
+    Cada valor atípico distinto aparece una vez.
+    """
+    valores, conteos = _valores_conteos(hist)
+    acumulado = np.cumsum(conteos)
+    q1, med, q3 = (_percentil_histograma(valores, acumulado, q) for q in (0.25, 0.5, 0.75))
+    ric = q3 - q1
+    dentro_alto = valores[valores <= q3 + 1.5 * ric]
+    dentro_bajo = valores[valores >= q1 - 1.5 * ric]
+    whishi = float(dentro_alto.max()) if len(dentro_alto) and dentro_alto.max() >= q3 else q3
+    whislo = float(dentro_bajo.min()) if len(dentro_bajo) and dentro_bajo.min() <= q1 else q1
+    return {
+        "label": etiqueta,
+        "q1": q1,
+        "med": med,
+        "q3": q3,
+        "whislo": whislo,
+        "whishi": whishi,
+        "mean": float((valores * conteos).sum() / acumulado[-1]),
+        "fliers": valores[(valores < whislo) | (valores > whishi)],
+    }
+
+
+def grafico_histograma(t, conteos, bordes, base: Path):
+    fig = Figure(figsize=(6, 4))
+    ax = fig.add_subplot()
+    ax.stairs(conteos, bordes, fill=True, color="#4C78A8", alpha=0.9)
+    ax.set_title(f"Histograma longitud – {ETIQUETAS.get(t)}")
+    ax.set_xlabel("longitud")
+    ax.set_ylabel("frecuencia")
+    return _guardar(fig, base / f"AnovaTweets2_hist_{t}.png")
+
+
+def grafico_boxplot(cajas, base: Path):
+    if not cajas:
         return None
-    etiquetas = []
-    valores = []
-    label = {0: "negativo", 2: "neutral", 4: "positivo"}
-    for t in (0, 2, 4):
-        s = stats.get(t)
-        etiquetas.append(label.get(t))
-        valores.append(s["var"])
-    fig = plt.figure(figsize=(7, 5))
-    plt.bar(etiquetas, valores, color="#F58518")
-    plt.title("Varianzas por grupo")
-    plt.ylabel("varianza")
-    ruta = base / "AnovaTweets2_varianzas.png"
-    fig.tight_layout()
-    fig.savefig(ruta)
-    plt.close(fig)
-    return str(ruta)
+    fig = Figure(figsize=(7, 5))
+    ax = fig.add_subplot()
+    ax.bxp(cajas, showmeans=True)
+    ax.set_title("Boxplot longitud por sentimiento")
+    ax.set_ylabel("longitud")
+    return _guardar(fig, base / "AnovaTweets2_boxplot.png")
+
+
+def _filliben(i, n):
+    # Medianas de Filliben de los rangos i (base 0) de una muestra de tamaño n
+    u = (i + 0.6825) / (n + 0.365)
+    u = np.where(i == n - 1, 0.5 ** (1.0 / n), u)
+    return np.where(i == 0, 1 - 0.5 ** (1.0 / n), u)
+
+
+def qq_histograma(hist, puntos=QQ_PUNTOS, bloque=QQ_BLOQUE):
+    """
+    Cuantiles teóricos (medianas de Filliben, como scipy.stats.probplot) y
+    observados desde el histograma, con la recta de mínimos cuadrados
+    ajustada sobre todos los datos; se devuelven a lo sumo `puntos` pares.
+    El valor del rango i es el del primer conteo acumulado mayor que i, así
+    que nunca se reconstruyen las n observaciones: la recta se ajusta con
+    sumas tomadas por bloques de rangos.
+    """
+    from scipy.stats import norm
+
+    valores, conteos = _valores_conteos(hist)
+    acumulado = np.cumsum(conteos)
+    n = int(acumulado[-1])
+    sx = sy = sxx = sxy = 0.0
+    for a in range(0, n, bloque):
+        i = np.arange(a, min(a + bloque, n))
+        x = norm.ppf(_filliben(i, n))
+        y = valores[np.searchsorted(acumulado, i, side="right")]
+        sx += x.sum()
+        sy += y.sum()
+        sxx += x @ x
+        sxy += x @ y
+    pendiente = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    intercepto = (sy - pendiente * sx) / n
+    idx = np.unique(np.linspace(0, n - 1, min(n, puntos)).astype(np.int64))
+    osm = norm.ppf(_filliben(idx, n))
+    osr = valores[np.searchsorted(acumulado, idx, side="right")]
+    return osm, osr, float(pendiente), float(intercepto)
+
+
+def grafico_qq(t, hist, base: Path):
+    osm, osr, pendiente, intercepto = qq_histograma(hist)
+    fig = Figure(figsize=(6, 4))
+    ax = fig.add_subplot()
+    ax.plot(osm, osr, "bo")
+    ax.plot(osm, pendiente * osm + intercepto, "r-")
+    ax.set_xlabel("Theoretical quantiles")
+    ax.set_ylabel("Ordered Values")
+    ax.set_title(f"QQ plot normal – {ETIQUETAS.get(t)}")
+    return _guardar(fig, base / f"AnovaTweets2_qq_{t}.png")
+
+
+def grafico_varianzas(stats, base: Path):
+    etiquetas = [ETIQUETAS.get(t) for t in TARGETS]
+    valores = [stats[t]["var"] for t in TARGETS]
+    fig = Figure(figsize=(7, 5))
+    ax = fig.add_subplot()
+    ax.bar(etiquetas, valores, color="#F58518")
+    ax.set_title("Varianzas por grupo")
+    ax.set_ylabel("varianza")
+    return _guardar(fig, base / "AnovaTweets2_varianzas.png")
+
+
+def _ejecutar_tarea(tarea):
+    _, funcion, args = tarea
+    t0 = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - t0
+
+
+def ejecutar_tareas(tareas, workers=1):
+    """
+    Ejecuta tareas independientes (fase, función, args) en un pool de
+    procesos y devuelve [(resultado, segundos)] en el mismo orden.
+    """
+    if workers > 1 and len(tareas) > 1:
+        from multiprocessing import Pool
+        # Las más lentas primero, para que el tiempo total sea el de la más larga
+        orden = sorted(range(len(tareas)), key=lambda i: tareas[i][0] != "qq")
+        with Pool(min(workers, len(tareas))) as pool:
+            hechos = pool.map(_ejecutar_tarea, [tareas[i] for i in orden], chunksize=1)
+        resultados = [None] * len(tareas)
+        for i, r in zip(orden, hechos):
+            resultados[i] = r
+        return resultados
+    return [_ejecutar_tarea(t) for t in tareas]
 
 
 def reporte(stats, res, normal=None, kw=None, hom=None, figuras=None):
@@ -291,28 +805,199 @@ def reporte(stats, res, normal=None, kw=None, hom=None, figuras=None):
     return "\n".join(L)
 
 
+def reporte_factor(factor, stats, res, hom=None, kw=None, dos=None, excluidos=0):
+    L = []
+    L.append(f"Prueba ANOVA – Longitud promedio del tweet por {factor}")
+    L.append("")
+    L.append("Hipótesis:")
+    L.append("  H₀: Las medias son iguales.")
+    L.append("  H₁: Al menos una difiere.")
+    if factor == "hashtag":
+        L.append("Nota: un tweet con varios hashtags cuenta en cada grupo (las observaciones no son independientes).")
+    L.append("")
+    L.append(f"Estadísticos por grupo ({len(stats)} grupos, ordenados por n):")
+    for k, s in sorted(stats.items(), key=lambda kv: (-kv[1]["n"], str(kv[0]))):
+        L.append(f"  {k}: n = {s['n']}, media = {s['mean']:.6f}, var = {s['var']:.6f}")
+    if excluidos:
+        L.append(f"  ({excluidos} grupos con menos observaciones que --min-n excluidos)")
+    L.append("")
+    if res is None:
+        L.append("ANOVA no ejecutado: requieren ≥2 grupos con n>0 y SSE>0.")
+    else:
+        L.append(f"Media global: {res['grand_mean']:.6f}")
+        L.append(f"ANOVA: F({res['df1']}, {res['df2']}) = {res['F']:.6f}")
+        if res["p"] is not None:
+            L.append(f"p-value (SciPy): {res['p']:.6g}")
+        else:
+            L.append("p-value: no calculado (SciPy no disponible)")
+    if hom is not None:
+        L.append(f"Homogeneidad (Levene): estadístico = {hom['stat']:.6f}, p = {hom['p']:.6g}")
+    if kw is not None:
+        L.append(f"Kruskal–Wallis: H = {kw['H']:.6f}, p = {kw['p']:.6g}")
+    if dos is not None:
+        L.append("")
+        L.append(f"ANOVA de dos factores (sentimiento × {factor}), SS tipo II:")
+        nombres = {"A": "sentimiento", "B": factor, "AB": "interacción"}
+        for clave in ("A", "B", "AB"):
+            r = dos[clave]
+            if r["F"] is None:
+                L.append(f"  {nombres[clave]}: SS = {r['SS']:.6f}, g.l. = {r['df']} (sin prueba)")
+                continue
+            p = f", p = {r['p']:.6g}" if r["p"] is not None else ""
+            L.append(f"  {nombres[clave]}: SS = {r['SS']:.6f}, F({r['df']}, {dos['error']['df']}) = {r['F']:.6f}{p}")
+        L.append(f"  error: SS = {dos['error']['SS']:.6f}, g.l. = {dos['error']['df']}")
+    return "\n".join(L)
+
+
+def analisis_factor(celdas, factor, min_n=2):
+    """
+    ANOVA, Levene y Kruskal–Wallis de un factor (marginal de las celdas
+    sobre el sentimiento) y ANOVA de dos factores sentimiento × factor, a
+    partir de los mismos acumuladores por celda.
+    """
+    import agrupado
+
+    todos = agrupado.marginal(celdas, 1)
+    accs = {k: acc for k, acc in todos.items() if acc["n"] >= min_n}
+    stats = estadisticas(accs)
+    hists = {k: acc["hist"] for k, acc in accs.items()}
+    dos = None
+    if all(t is not None for t, _ in celdas):
+        dos = agrupado.anova_dos_factores({k: acc for k, acc in celdas.items() if k[1] in accs})
+    texto = reporte_factor(
+        factor,
+        stats,
+        anova(stats),
+        hom=homogeneidad_test(hists),
+        kw=kruskal_wallis(hists),
+        dos=dos,
+        excluidos=len(todos) - len(accs),
+    )
+    return texto
+
+
+def parse_args(base: Path):
+    parser = argparse.ArgumentParser(description="ANOVA de longitud de tweet por sentimiento")
+    parser.add_argument(
+        "--input",
+        default=str(base),
+        help="Part file CSV (también .gz/.zst o miembro de un .zip) o directorio con part-*.csv de Spark (por defecto: carpeta del script)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Procesos para leer los part files y para las pruebas y gráficos en paralelo (1 = secuencial, por defecto)",
+    )
+    parser.add_argument(
+        "--features",
+        default="",
+        help="Tabla de características (features.py) con 'length'; si se indica no se lee --input",
+    )
+    parser.add_argument(
+        "--factor",
+        choices=FACTORES,
+        default="sentimiento",
+        help="Factor de agrupación; marca usa --features o la salida de exportar_marcas_csv.py en --input, hashtag requiere --features",
+    )
+    parser.add_argument(
+        "--min-n",
+        type=int,
+        default=2,
+        help="Con --factor marca/hashtag, grupos con menos observaciones se excluyen de las pruebas",
+    )
+    parser.add_argument(
+        "--acuerdo",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="CARPETA",
+        help="Agregar al informe el acuerdo entre anotadores del corpus de 15 idiomas europeos (por defecto: su carpeta en el repositorio)",
+    )
+    return parser.parse_args()
+
+
+def agregar_acuerdo(text, carpeta):
+    """Añade al informe la sección de calidad de etiquetas de acuerdo.py."""
+    if carpeta is None:
+        return text
+    import acuerdo
+
+    carpeta = Path(carpeta) if carpeta else acuerdo.european.DEFAULT_FOLDER
+    if not carpeta.is_dir():
+        print(f"No se encuentra la carpeta: {carpeta}")
+        return text
+    return text + "\n\n" + acuerdo.seccion_acuerdo(carpeta)
+
+
+def analisis_sentimiento(accs, lengths, base: Path, etapas=None, workers=1):
+    """
+    ANOVA, pruebas y gráficos (en base) por sentimiento a partir de los
+    acumuladores y longitudes ya leídos; devuelve el texto del informe.
+    Las pruebas y cada gráfico son tareas independientes que, con
+    workers > 1, corren a la vez en un pool de procesos; reciben solo
+    histogramas, bins y cuantiles ya calculados, no las longitudes crudas.
+    Con etapas (pipeline.StageTimes) el tiempo se suma en las etapas comunes
+    (compute, plot y workers con un pool).
+    """
+    etapas = etapas or pipeline.StageTimes()
+    with etapas.measure(pipeline.COMPUTE):
+        stats = estadisticas(accs)
+        res = anova(stats)
+        hists = {t: accs[t]["hist"] for t in TARGETS}
+    with etapas.measure(pipeline.COMPUTE):
+        # Shapiro usa las primeras 5000 observaciones; el resto viaja como histograma
+        muestras = {t: _vista(xs)[:5000] for t, xs in lengths.items()}
+        tareas = [
+            ("normalidad", pruebas_normalidad, (muestras, hists)),
+            ("levene", homogeneidad_test, (hists,)),
+            ("kruskal", kruskal_wallis, (hists,)),
+        ]
+        if Figure is not None:
+            presentes = [t for t in TARGETS if hists[t]]
+            for t in presentes:
+                tareas.append(("histogramas", grafico_histograma, (t, *bins_histograma(hists[t]), base)))
+            cajas = [cajas_histograma(hists[t], ETIQUETAS[t]) for t in presentes]
+            tareas.append(("boxplot", grafico_boxplot, (cajas, base)))
+            try:
+                import scipy.stats  # noqa: F401  (importado antes de crear el pool)
+                tareas += [("qq", grafico_qq, (t, hists[t], base)) for t in presentes if sum(hists[t].values()) >= 3]
+            except Exception:
+                pass
+            tareas.append(("varianzas", grafico_varianzas, (stats, base)))
+    if workers > 1:
+        # Como en Marcas y Hashtags: la espera del pool cuenta como workers
+        with etapas.measure(pipeline.WORKERS):
+            resultados = ejecutar_tareas(tareas, workers)
+    else:
+        resultados = ejecutar_tareas(tareas, workers)
+        for i, (_, segundos) in enumerate(resultados):
+            etapas.add(pipeline.COMPUTE if i < 3 else pipeline.PLOT, segundos)
+    normal, hom, kw = (r for r, _ in resultados[:3])
+    figuras = [r for r, _ in resultados[3:] if r]
+    with etapas.measure(pipeline.COMPUTE):
+        return reporte(stats, res, normal=normal, kw=kw, hom=hom, figuras=figuras)
+
+
 def main():
     base = Path(__file__).resolve().parent
-    csv_path = base / "part-00000-d12a28b9-ec6a-47ca-b0a6-fa90cb633f14-c000.csv"
-    if not csv_path.exists():
-        print(f"No se encuentra el archivo: {csv_path}")
+    args = parse_args(base)
+    if args.factor != "sentimiento":
+        main_factor(args, base)
         return
-    stats = leer_estadisticas(csv_path)
-    res = anova(stats)
-    lengths = leer_longitudes(csv_path)
-    normal = pruebas_normalidad(lengths)
-    hom = homogeneidad_test(lengths)
-    kw = kruskal_wallis(lengths)
-    figuras = []
-    figuras += grafico_histogramas(lengths, base)
-    bp = grafico_boxplot(lengths, base)
-    if bp:
-        figuras.append(bp)
-    figuras += grafico_qq(lengths, base)
-    varb = grafico_varianzas(stats, base)
-    if varb:
-        figuras.append(varb)
-    text = reporte(stats, res, normal=normal, kw=kw, hom=hom, figuras=figuras)
+    if args.features:
+        if not Path(args.features).exists():
+            print(f"No se encuentra el archivo: {args.features}")
+            return
+        accs, lengths = acumular_caracteristicas(Path(args.features))
+    else:
+        rutas = buscar_partes(Path(args.input))
+        if not rutas:
+            print(f"No se encuentra el archivo: {args.input}")
+            return
+        accs, lengths = leer_partes(rutas, workers=args.workers)
+    text = analisis_sentimiento(accs, lengths, base, workers=args.workers)
+    text = agregar_acuerdo(text, args.acuerdo)
     out = base / "AnovaTweets2_report.txt"
     out.write_text(text, encoding="utf-8")
     print(text)
@@ -320,5 +1005,26 @@ def main():
     print(f"Informe guardado en: {out}")
 
 
+def main_factor(args, base: Path):
+    if args.features:
+        if not Path(args.features).exists():
+            print(f"No se encuentra el archivo: {args.features}")
+            return
+        filas = filas_factor_caracteristicas(Path(args.features), args.factor)
+    elif args.factor == "marca" and Path(args.input).is_file():
+        filas = filas_factor_marcas_csv(Path(args.input))
+    else:
+        print(f"--factor {args.factor} requiere --features" + (" o un CSV de exportar_marcas_csv.py en --input" if args.factor == "marca" else ""))
+        return
+    celdas = acumular_por_factor(filas)
+    text = analisis_factor(celdas, args.factor, min_n=args.min_n)
+    text = agregar_acuerdo(text, args.acuerdo)
+    out = base / f"AnovaTweets2_{args.factor}_report.txt"
+    out.write_text(text, encoding="utf-8")
+    print(text)
+    print("")
+    print(f"Informe guardado en: {out}")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
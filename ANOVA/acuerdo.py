@@ -0,0 +1,263 @@
+"""
+Acuerdo entre anotadores del corpus de sentimiento en 15 idiomas europeos.
+
+Un mismo TweetID aparece varias veces cuando fue etiquetado más de una vez,
+por el mismo anotador o por otros. Por idioma, las anotaciones se ordenan
+por TweetID (argsort estable) y cada tramo de ids iguales es un tweet; de
+ahí salen, sin diccionarios de listas:
+
+  - la matriz tweets × etiquetas de conteos (np.bincount sobre
+    tweet·3 + etiqueta), de la que salen el alfa de Krippendorff (nominal
+    y de intervalo, con la matriz de coincidencias) y el kappa de Fleiss
+    para un número variable de anotaciones por tweet;
+  - el kappa de Cohen entre la primera y la segunda anotación de cada tweet,
+    global y por par de anotadores (una matriz de confusión 3×3 por par con
+    un solo bincount);
+  - la matriz de confusión de cada anotador frente a la mayoría de las otras
+    anotaciones del mismo tweet (los empates se omiten).
+
+Las métricas se dan para todos los tweets repetidos y separando los que
+repitió el mismo anotador (consistencia) de los que etiquetaron anotadores
+distintos. El texto de reporte_acuerdo() se agrega al informe de
+AnovaTweets2 con --acuerdo.
+"""
+
+from pathlib import Path
+import argparse
+import os
+import sys
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import european  # noqa: E402
+
+
+K = len(european.LABELS)
+MIN_PAR = 50
+MAX_PARES = 10
+
+
+def _requiere_numpy():
+    if np is None:
+        raise RuntimeError("El cálculo de acuerdo requiere NumPy (pip install numpy).")
+
+
+def _kappa(conf):
+    # Kappa de Cohen de una o varias matrices de confusión (..., K, K)
+    n = conf.sum(axis=(-2, -1)).astype(float)
+    po = np.trace(conf, axis1=-2, axis2=-1) / np.where(n > 0, n, 1)
+    pe = (conf.sum(axis=-1) * conf.sum(axis=-2)).sum(axis=-1) / np.where(n > 0, n * n, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(pe < 1, (po - pe) / (1 - pe), np.nan)
+
+
+def metricas(N, pares):
+    """
+    Acuerdo observado, alfa de Krippendorff (nominal e intervalo), kappa de
+    Fleiss y de Cohen a partir de la matriz tweets × etiquetas N (solo
+    tweets con dos o más anotaciones) y de las etiquetas (primera, segunda)
+    de cada tweet. None si hay menos de dos tweets.
+    """
+    if len(N) < 2:
+        return None
+    m = N.sum(axis=1).astype(float)
+    # Matriz de coincidencias de Krippendorff
+    w = N / (m - 1)[:, None]
+    o = w.T @ N - np.diag(w.sum(axis=0))
+    n_c = o.sum(axis=1)
+    n = n_c.sum()
+    codigos = np.arange(K, dtype=float)
+    alfas = {}
+    for nombre, delta in (
+        ("nominal", 1.0 - np.eye(K)),
+        ("intervalo", (codigos[:, None] - codigos[None, :]) ** 2),
+    ):
+        esperado = (np.outer(n_c, n_c) * delta).sum()
+        alfas[nombre] = 1.0 - (n - 1) * (o * delta).sum() / esperado if esperado > 0 else float("nan")
+    # Fleiss con número variable de anotaciones por tweet
+    p_i = ((N * N).sum(axis=1) - m) / (m * (m - 1))
+    p_obs = p_i.mean()
+    p_c = N.sum(axis=0) / m.sum()
+    p_e = (p_c * p_c).sum()
+    fleiss = (p_obs - p_e) / (1 - p_e) if p_e < 1 else float("nan")
+    a, b = pares
+    conf = np.bincount(a * K + b, minlength=K * K).reshape(K, K)
+    return {
+        "tweets": int(len(N)),
+        "anotaciones": int(m.sum()),
+        "acuerdo_observado": float(p_obs),
+        "alfa_nominal": float(alfas["nominal"]),
+        "alfa_intervalo": float(alfas["intervalo"]),
+        "kappa_fleiss": float(fleiss),
+        "kappa_cohen": float(_kappa(conf)),
+    }
+
+
+def acuerdo_idioma(ids, etiquetas, anotadores):
+    """Métricas de acuerdo de un idioma a partir de sus tres columnas."""
+    _requiere_numpy()
+    validas = etiquetas >= 0
+    ids = ids[validas]
+    etiquetas = etiquetas[validas].astype(np.int64)
+    anotadores = anotadores[validas].astype(np.int64)
+
+    # Agrupación por tweet sobre el arreglo ordenado
+    orden = np.argsort(ids, kind="stable")
+    ids_o = ids[orden]
+    lab = etiquetas[orden]
+    ann = anotadores[orden]
+    nuevo = np.empty(len(ids_o), dtype=bool)
+    nuevo[:1] = True
+    np.not_equal(ids_o[1:], ids_o[:-1], out=nuevo[1:])
+    inicio = np.flatnonzero(nuevo)
+    tweet = np.cumsum(nuevo) - 1
+    m = np.diff(np.append(inicio, len(ids_o)))
+    N = np.bincount(tweet * K + lab, minlength=len(inicio) * K).reshape(len(inicio), K)
+
+    rep = m >= 2
+    ini = inicio[rep]
+    pares = (lab[ini], lab[ini + 1])
+    if len(ini):
+        mismo = np.minimum.reduceat(ann, inicio)[rep] == np.maximum.reduceat(ann, inicio)[rep]
+    else:
+        mismo = np.zeros(0, dtype=bool)
+    N_rep = N[rep]
+    resultado = {
+        "anotaciones": int(len(ids)),
+        "invalidas": int((~validas).sum()),
+        "tweets": int(len(inicio)),
+        "repetidos": int(rep.sum()),
+        "anotadores_distintos": int(len(np.unique(anotadores))),
+        "todas": metricas(N_rep, pares),
+        "mismo_anotador": metricas(N_rep[mismo], (pares[0][mismo], pares[1][mismo])),
+        "distintos": metricas(N_rep[~mismo], (pares[0][~mismo], pares[1][~mismo])),
+    }
+
+    # Kappa de Cohen por par de anotadores (primera y segunda anotación)
+    x, y = ann[ini], ann[ini + 1]
+    a, b = pares
+    cruzado = x != y
+    x, y, a, b = x[cruzado], y[cruzado], a[cruzado], b[cruzado]
+    swap = x > y
+    x, y = np.where(swap, y, x), np.where(swap, x, y)
+    a, b = np.where(swap, b, a), np.where(swap, a, b)
+    claves, inv = np.unique(x * 65536 + y, return_inverse=True)
+    conf = np.bincount(inv * K * K + a * K + b, minlength=len(claves) * K * K).reshape(len(claves), K, K)
+    n_par = conf.sum(axis=(1, 2))
+    kappas = _kappa(conf)
+    resultado["pares"] = sorted(
+        (
+            (int(c // 65536), int(c % 65536), int(n), float(k))
+            for c, n, k in zip(claves, n_par, kappas)
+            if n >= MIN_PAR
+        ),
+        key=lambda p: -p[2],
+    )
+
+    # Cada anotación repetida frente a la mayoría de las demás del mismo tweet
+    en_rep = rep[tweet]
+    t_r, lab_r, ann_r = tweet[en_rep], lab[en_rep], ann[en_rep]
+    otras = N[t_r].copy()
+    otras[np.arange(len(t_r)), lab_r] -= 1
+    ref = otras.argmax(axis=1)
+    maximo = otras.max(axis=1)
+    unica = (otras == maximo[:, None]).sum(axis=1) == 1
+    codigos, ann_c = np.unique(ann_r[unica], return_inverse=True)
+    confusion = np.bincount(
+        ann_c * K * K + lab_r[unica] * K + ref[unica], minlength=len(codigos) * K * K
+    ).reshape(len(codigos), K, K)
+    resultado["anotadores"] = [
+        (int(c), confusion[i].tolist()) for i, c in enumerate(codigos)
+    ]
+    return resultado
+
+
+def acuerdo_corpus(tabla):
+    """{idioma: acuerdo_idioma(...)} para cada idioma de un european.CorpusTable."""
+    _requiere_numpy()
+    cols = tabla.arrays()
+    return {
+        idioma: acuerdo_idioma(cols["ids"][a:b], cols["label"][a:b], cols["annotator"][a:b])
+        for idioma, (a, b) in tabla.ranges.items()
+    }
+
+
+def _f(x):
+    return "  —  " if x is None or x != x else f"{x:6.3f}"
+
+
+def reporte_acuerdo(resultados, detalle=True):
+    """Sección de texto con la calidad de las etiquetas, en el formato del informe ANOVA."""
+    etiquetas = european.LABELS
+    L = []
+    L.append("Calidad de las etiquetas – acuerdo entre anotadores (corpus de 15 idiomas europeos)")
+    L.append("")
+    L.append("Tweets etiquetados más de una vez (mismo TweetID). Acuerdo observado = proporción de pares")
+    L.append("de anotaciones coincidentes; α de Krippendorff nominal e intervalo (Negative < Neutral < Positive);")
+    L.append("κ de Fleiss (anotaciones por tweet variables); κ de Cohen entre la 1.ª y la 2.ª anotación.")
+    for clave, titulo in (
+        ("todas", "Todos los tweets repetidos"),
+        ("mismo_anotador", "Repetidos por el mismo anotador (consistencia)"),
+        ("distintos", "Repetidos por anotadores distintos"),
+    ):
+        L.append("")
+        L.append(f"{titulo}:")
+        L.append(f"  {'idioma':<12}{'tweets':>8}{'anot.':>8}{'acuerdo':>9}{'α nom':>8}{'α int':>8}{'κ Fleiss':>9}{'κ Cohen':>9}")
+        for idioma, r in resultados.items():
+            s = r[clave]
+            if s is None:
+                continue
+            L.append(
+                f"  {idioma:<12}{s['tweets']:>8}{s['anotaciones']:>8}  {_f(s['acuerdo_observado'])} {_f(s['alfa_nominal'])}"
+                f"  {_f(s['alfa_intervalo'])}   {_f(s['kappa_fleiss'])}   {_f(s['kappa_cohen'])}"
+            )
+    invalidas = sum(r["invalidas"] for r in resultados.values())
+    if invalidas:
+        L.append("")
+        L.append(f"Nota: {invalidas} anotaciones con una etiqueta desconocida excluidas.")
+    if not detalle:
+        return "\n".join(L)
+
+    L.append("")
+    L.append(f"κ de Cohen por par de anotadores (≥ {MIN_PAR} tweets en común, hasta {MAX_PARES} por idioma):")
+    for idioma, r in resultados.items():
+        for x, y, n, k in r["pares"][:MAX_PARES]:
+            L.append(f"  {idioma:<12}{x:>4} – {y:<4} n = {n:<7} κ = {_f(k).strip()}")
+    L.append("")
+    L.append("Confusión de cada anotador frente a la mayoría de las otras anotaciones del tweet")
+    L.append("(filas: etiqueta del anotador; columnas: mayoría; orden " + ", ".join(etiquetas) + "):")
+    for idioma, r in resultados.items():
+        for ann, conf in r["anotadores"]:
+            n = sum(map(sum, conf))
+            acuerdo = sum(conf[i][i] for i in range(K)) / n if n else float("nan")
+            filas = " | ".join(" ".join(f"{v:>5}" for v in fila) for fila in conf)
+            L.append(f"  {idioma:<12}{ann:>4}  n = {n:<7} acuerdo = {_f(acuerdo).strip()}  [{filas}]")
+    return "\n".join(L)
+
+
+def seccion_acuerdo(carpeta=european.DEFAULT_FOLDER, workers=None):
+    """Carga el corpus (con su caché) y devuelve la sección del informe."""
+    with european.load(Path(carpeta), workers=workers) as tabla:
+        return reporte_acuerdo(acuerdo_corpus(tabla))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acuerdo entre anotadores del corpus de 15 idiomas europeos")
+    parser.add_argument("carpeta", nargs="?", default=str(european.DEFAULT_FOLDER), help="Carpeta con los *_Twitter_sentiment.csv")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos para leer los CSV si hay que reconstruir la caché")
+    parser.add_argument("--salida", default="", help="Guardar el informe en este archivo")
+    args = parser.parse_args()
+    texto = seccion_acuerdo(args.carpeta, args.workers or None)
+    print(texto)
+    if args.salida:
+        Path(args.salida).write_text(texto + "\n", encoding="utf-8")
+        print("")
+        print(f"Informe guardado en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Agrupación en streaming para ANOVA con cualquier número de grupos.
+
+Cada etiqueta de grupo (sentimiento, marca, hashtag o una tupla de ellas)
+recibe un código entero denso la primera vez que aparece. Los valores se
+acumulan en lotes de (código, valor) y cada lote se reduce de una vez:
+conteos, sumas y sumas de cuadrados con np.bincount y los histogramas con
+np.unique sobre la clave código·2³² + valor. Sin NumPy se usa el mismo
+recorrido en Python puro. Las sumas son enteras y exactas, y el resultado
+por grupo es el acumulador (n, media, M2, histograma) definido aquí, el
+mismo que usa AnovaTweets2, así que anova(), Levene y Kruskal–Wallis se
+aplican tal cual.
+
+Con etiquetas (a, b) se obtienen las celdas de un diseño de dos factores;
+los marginales de cada factor y la ANOVA de dos vías salen de esas mismas
+celdas sin volver a leer los datos.
+"""
+
+from array import array
+from collections import Counter
+import math
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+LOTE = 1 << 16
+
+
+def acumulador(n=0, suma=0, sumsq=0, hist=None):
+    """
+    Acumulador combinable de un grupo: n, media, M2 (suma de cuadrados de las
+    desviaciones) y opcionalmente el histograma {valor: conteo}. Es un dict de
+    tipos simples, así que viaja entre procesos y se guarda en JSON.
+    Se construye desde sumas enteras exactas: n·sumsq − suma² no pierde
+    precisión, a diferencia de sumsq − suma²/n en float.
+    """
+    if n == 0:
+        return {"n": 0, "mean": 0.0, "m2": 0.0, "hist": hist}
+    return {"n": n, "mean": suma / n, "m2": (n * sumsq - suma * suma) / n, "hist": hist}
+
+
+def combinar(a, b):
+    """Combina dos acumuladores del mismo grupo (fórmula de Chan et al.)."""
+    if a["hist"] is not None and b["hist"] is not None:
+        hist = Counter(a["hist"])
+        hist.update(b["hist"])
+        hist = dict(sorted(hist.items()))
+    else:
+        hist = None
+    if a["n"] == 0:
+        return {**b, "hist": hist}
+    if b["n"] == 0:
+        return {**a, "hist": hist}
+    n = a["n"] + b["n"]
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * b["n"] / n
+    m2 = a["m2"] + b["m2"] + delta * delta * a["n"] * b["n"] / n
+    return {"n": n, "mean": mean, "m2": m2, "hist": hist}
+
+
+class AcumuladorPorGrupo:
+    """
+    n, suma y suma de cuadrados (enteros) e histograma por grupo, en una
+    sola pasada y con memoria proporcional al número de grupos.
+
+    >>> g = AcumuladorPorGrupo()
+    >>> for marca, largo in filas:
+    ...     g.agregar(marca, largo)
+    >>> accs = g.acumuladores()
+    """
+
+    def __init__(self, con_histogramas=True, lote=LOTE):
+        self.etiquetas = []
+        self._codigos = {}
+        self._n = []
+        self._suma = []
+        self._sumsq = []
+        self._hist = [] if con_histogramas else None
+        self._lote = lote
+        self._buf_c = array("I")
+        self._buf_v = array("I")
+
+    def codigo(self, etiqueta):
+        c = self._codigos.get(etiqueta)
+        if c is None:
+            c = len(self.etiquetas)
+            self._codigos[etiqueta] = c
+            self.etiquetas.append(etiqueta)
+            self._n.append(0)
+            self._suma.append(0)
+            self._sumsq.append(0)
+            if self._hist is not None:
+                self._hist.append(Counter())
+        return c
+
+    def agregar(self, etiqueta, valor):
+        """Suma un valor entero no negativo al grupo `etiqueta`."""
+        self._buf_c.append(self.codigo(etiqueta))
+        self._buf_v.append(valor)
+        if len(self._buf_c) >= self._lote:
+            self._vaciar()
+
+    def agregar_codigos(self, codigos, valores):
+        """Lote ya codificado (códigos obtenidos con codigo()), p. ej. desde un array."""
+        self._vaciar()
+        self._reducir(array("I", codigos), array("I", valores))
+
+    def _vaciar(self):
+        if self._buf_c:
+            self._reducir(self._buf_c, self._buf_v)
+            self._buf_c = array("I")
+            self._buf_v = array("I")
+
+    def _reducir(self, codigos, valores):
+        if not codigos:
+            return
+        # bincount suma en float64: exacto mientras la suma de cuadrados del lote quepa en 2⁵³
+        if np is not None and max(valores) ** 2 * len(valores) < 2 ** 53:
+            self._reducir_numpy(codigos, valores)
+            return
+        n, suma, sumsq, hist = self._n, self._suma, self._sumsq, self._hist
+        for c, v in zip(codigos, valores):
+            n[c] += 1
+            suma[c] += v
+            sumsq[c] += v * v
+            if hist is not None:
+                hist[c][v] += 1
+
+    def _reducir_numpy(self, codigos, valores):
+        c = np.frombuffer(codigos, dtype=np.uint32)
+        v = np.frombuffer(valores, dtype=np.uint32).astype(np.float64)
+        g = len(self.etiquetas)
+        n = np.bincount(c, minlength=g)
+        suma = np.bincount(c, weights=v, minlength=g)
+        sumsq = np.bincount(c, weights=v * v, minlength=g)
+        for i in np.flatnonzero(n).tolist():
+            self._n[i] += int(n[i])
+            self._suma[i] += int(suma[i])
+            self._sumsq[i] += int(sumsq[i])
+        if self._hist is not None:
+            claves = (c.astype(np.uint64) << np.uint64(32)) | v.astype(np.uint64)
+            unicas, conteos = np.unique(claves, return_counts=True)
+            hist = self._hist
+            for k, cuenta in zip(unicas.tolist(), conteos.tolist()):
+                hist[k >> 32][k & 0xFFFFFFFF] += cuenta
+
+    def acumuladores(self):
+        """{etiqueta: acumulador} en orden de primera aparición."""
+        self._vaciar()
+        accs = {}
+        for i, etiqueta in enumerate(self.etiquetas):
+            hist = dict(sorted(self._hist[i].items())) if self._hist is not None else None
+            accs[etiqueta] = acumulador(self._n[i], self._suma[i], self._sumsq[i], hist)
+        return accs
+
+
+def marginal(celdas, eje):
+    """Combina las celdas {(a, b): acc} en {a: acc} (eje 0) o {b: acc} (eje 1)."""
+    res = {}
+    for clave, acc in celdas.items():
+        k = clave[eje]
+        res[k] = combinar(res[k], acc) if k in res else acc
+    return res
+
+
+def _ajuste_aditivo(celdas, max_iter=10000, tol=1e-12):
+    """
+    Ajuste por mínimos cuadrados ponderados (peso n de cada celda) de
+    media_ab ≈ μ + α_a + β_b sobre las medias de celda, por Gauss–Seidel
+    alternando los dos factores. Devuelve la suma de cuadrados residual
+    entre celdas.
+    """
+    mu = sum(acc["n"] * acc["mean"] for acc in celdas.values()) / sum(acc["n"] for acc in celdas.values())
+    por_a = {}
+    por_b = {}
+    for (a, b), acc in celdas.items():
+        por_a.setdefault(a, []).append((b, acc["n"], acc["mean"] - mu))
+        por_b.setdefault(b, []).append((a, acc["n"], acc["mean"] - mu))
+    n_a = {a: sum(n for _, n, _ in xs) for a, xs in por_a.items()}
+    n_b = {b: sum(n for _, n, _ in xs) for b, xs in por_b.items()}
+    alfa = {a: 0.0 for a in por_a}
+    beta = {b: 0.0 for b in por_b}
+    escala = max(abs(acc["mean"] - mu) for acc in celdas.values()) or 1.0
+    for _ in range(max_iter):
+        cambio = 0.0
+        for a, xs in por_a.items():
+            nuevo = sum(n * (d - beta[b]) for b, n, d in xs) / n_a[a]
+            cambio = max(cambio, abs(nuevo - alfa[a]))
+            alfa[a] = nuevo
+        for b, xs in por_b.items():
+            nuevo = sum(n * (d - alfa[a]) for a, n, d in xs) / n_b[b]
+            cambio = max(cambio, abs(nuevo - beta[b]))
+            beta[b] = nuevo
+        if cambio <= tol * escala:
+            break
+    return math.fsum(acc["n"] * (acc["mean"] - mu - alfa[a] - beta[b]) ** 2 for (a, b), acc in celdas.items())
+
+
+def _ss_entre_celdas_y_marginal(celdas, marg, eje):
+    # Residual entre celdas del modelo con un solo factor (media de su marginal)
+    return math.fsum(acc["n"] * (acc["mean"] - marg[k[eje]]["mean"]) ** 2 for k, acc in celdas.items())
+
+
+def anova_dos_factores(celdas):
+    """
+    ANOVA de dos factores con interacción desde acumuladores por celda
+    {(a, b): acc}, con sumas de cuadrados tipo II (válidas en diseños no
+    balanceados): SS_A = RSS(B) − RSS(A+B), SS_B = RSS(A) − RSS(A+B),
+    SS_AB = RSS(A+B) − SSE. Supone que las celdas observadas conectan todos
+    los niveles. Devuelve None si no hay al menos 2 niveles por factor.
+    """
+    celdas = {k: acc for k, acc in celdas.items() if acc["n"] > 0}
+    marg_a = marginal(celdas, 0)
+    marg_b = marginal(celdas, 1)
+    ka, kb, kc = len(marg_a), len(marg_b), len(celdas)
+    N = sum(acc["n"] for acc in celdas.values())
+    sse = math.fsum(acc["m2"] for acc in celdas.values())
+    df_e = N - kc
+    if ka < 2 or kb < 2 or df_e <= 0 or sse <= 0:
+        return None
+
+    rss_ab = _ajuste_aditivo(celdas)
+    rss_a = _ss_entre_celdas_y_marginal(celdas, marg_a, 0)
+    rss_b = _ss_entre_celdas_y_marginal(celdas, marg_b, 1)
+    mse = sse / df_e
+    try:
+        from scipy.stats import f as f_dist  # type: ignore
+    except Exception:
+        f_dist = None
+
+    def fila(ss, df):
+        ss = max(ss, 0.0)
+        if df <= 0:
+            return {"SS": ss, "df": df, "F": None, "p": None}
+        F = (ss / df) / mse
+        p = float(f_dist.sf(F, df, df_e)) if f_dist is not None else None
+        return {"SS": ss, "df": df, "F": F, "p": p}
+
+    return {
+        "A": fila(rss_b - rss_ab, ka - 1),
+        "B": fila(rss_a - rss_ab, kb - 1),
+        "AB": fila(rss_ab, kc - ka - kb + 1),
+        "error": {"SS": sse, "df": df_e},
+    }
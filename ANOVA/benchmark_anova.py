@@ -0,0 +1,61 @@
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+from AnovaTweets2 import (
+    histogramas,
+    kruskal_histogramas,
+    leer_un_paso,
+    levene_histogramas,
+    _vista,
+)
+
+
+def cronometrar(fn, *args):
+    t0 = time.perf_counter()
+    r = fn(*args)
+    return r, time.perf_counter() - t0
+
+
+def comparar(nombre, ref, nuevo, t_ref, t_nuevo, tol):
+    rel = abs(nuevo - ref) / max(1.0, abs(ref))
+    ok = rel <= tol
+    print(f"{nombre:<16} SciPy {ref:.10f} ({t_ref:.3f} s)  histograma {nuevo:.10f} ({t_nuevo:.4f} s)  "
+          f"dif. rel. {rel:.2e} {'OK' if ok else 'FALLA'}")
+    return ok
+
+
+def main():
+    base = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Valida y mide Kruskal–Wallis y Levene desde histogramas contra SciPy")
+    parser.add_argument("--path", type=str,
+                        default=str(base / "part-00000-d12a28b9-ec6a-47ca-b0a6-fa90cb633f14-c000.csv"),
+                        help="Part file de Spark (target,ids,date,flag,user,text con encabezado)")
+    parser.add_argument("--tol", type=float, default=1e-9, help="Tolerancia relativa aceptada")
+    args = parser.parse_args()
+
+    from scipy.stats import kruskal, levene
+
+    (stats, lengths), t_lectura = cronometrar(leer_un_paso, Path(args.path))
+    hists, t_hist = cronometrar(histogramas, lengths)
+    print(f"Lectura: {t_lectura:.2f} s, histogramas: {t_hist:.3f} s, "
+          f"n = {sum(len(xs) for xs in lengths.values())}")
+
+    crudos = [_vista(lengths[t]) for t in (0, 2, 4) if len(lengths[t]) > 1]
+    grupos = [hists[t] for t in (0, 2, 4) if len(lengths[t]) > 1]
+
+    ok = True
+    ref, t_ref = cronometrar(kruskal, *crudos)
+    (h, _), t_h = cronometrar(kruskal_histogramas, grupos)
+    ok &= comparar("Kruskal–Wallis", ref.statistic, h, t_ref, t_h, args.tol)
+    ref, t_ref = cronometrar(levene, *crudos)
+    (w, _, _), t_w = cronometrar(levene_histogramas, grupos)
+    ok &= comparar("Levene (mediana)", ref.statistic, w, t_ref, t_w, args.tol)
+    if not ok or math.isnan(h) or math.isnan(w):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import sys
+import time
+from typing import Iterable, List, Tuple
+
+from extract_hashtags import HASHTAG_REGEX, extract_hashtags
+
+
+def regex_extract(text: str) -> List[str]:
+    if not text:
+        return []
+    return [f"#{m.group(1)}" for m in HASHTAG_REGEX.finditer(text)]
+
+
+def load_texts(input_path: str, encoding: str, limit: int) -> List[str]:
+    texts = []
+    with open(input_path, "r", encoding=encoding, newline="") as fin:
+        for row in csv.reader(fin):
+            if len(row) >= 6:
+                texts.append(row[5])
+                if limit and len(texts) >= limit:
+                    break
+    return texts
+
+
+def time_extractor(name: str, fn, texts: List[str]) -> Tuple[int, float]:
+    start = time.perf_counter()
+    emitted = 0
+    for text in texts:
+        emitted += len(fn(text))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed:8.3f} s  {len(texts) / elapsed:12,.0f} rows/s  {emitted:,} hashtags")
+    return emitted, elapsed
+
+
+def parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time extract_hashtags against the old regex (boundary cases: tests/test_hashtags.py)."
+    )
+    parser.add_argument("--input", required=True, help="Sentiment140 CSV for the microbenchmark.")
+    parser.add_argument("--encoding", default="latin-1", help="Input file encoding (default: latin-1).")
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N rows (0 = all).")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args(sys.argv[1:])
+    if args.input:
+        texts = load_texts(args.input, args.encoding, args.limit)
+        with_hash = sum(1 for t in texts if "#" in t)
+        print(f"{len(texts):,} rows, {with_hash:,} contain '#'")
+        _, t_regex = time_extractor("regex", regex_extract, texts)
+        _, t_fast = time_extractor("fast path", extract_hashtags, texts)
+        print(f"Speedup: {t_regex / t_fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,448 @@
 #!/usr/bin/env python3
 import argparse
 import csv
+import io
+import itertools
+import multiprocessing
 import os
 import re
+import string
 import sys
-from typing import Iterable, List, Tuple
+import time
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+# Shared modules live at the repository root (columnar format, mmap reader,
+# compression, checkpoints, writer thread)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import checkpoint  # noqa: E402
+import columnar  # noqa: E402
+import compressed  # noqa: E402
+import features  # noqa: E402
+import mmap_csv  # noqa: E402
+import pipeline  # noqa: E402
 
+
+# Reference pattern (the one previously used by extract_hashtags). The raw
+# string makes the lookbehind a literal backslash followed by "w", so it never
+# guards against a preceding word character: "abc#tag" yields "#tag".
 HASHTAG_REGEX = re.compile(r"(?i)(?<!\\w)#([a-z0-9_]+)")
 
+# Hashtag body: ASCII letters, digits and underscore
+_TAG_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+
 
-def extract_hashtags(text: str) -> List[str]:
-    if not text:
+def extract_hashtags(text: str, lowercase: bool = False) -> List[str]:
+    """
+    Return the hashtags in text, including the leading '#'.
+    A '#' starts a hashtag only at the beginning of the text or after a
+    non-word character (same notion of word character as regex \\w), and the
+    body is one or more of [A-Za-z0-9_]. So "a#b" yields nothing, "##b" and
+    "(#b)" yield "#b", and "#a#b" yields only "#a".
+    """
+    if not text or "#" not in text:
         return []
-    # Return hashtags including the leading '#'
-    return [f"#{m.group(1)}" for m in HASHTAG_REGEX.finditer(text)]
+    tags = []
+    find = text.find
+    n = len(text)
+    i = find("#")
+    while i >= 0:
+        if i == 0 or not (text[i - 1].isalnum() or text[i - 1] == "_"):
+            end = i + 1
+            while end < n and text[end] in _TAG_CHARS:
+                end += 1
+            if end > i + 1:
+                tags.append(text[i:end].lower() if lowercase else text[i:end])
+                i = find("#", end)
+                continue
+        i = find("#", i + 1)
+    return tags
+
+
+CHUNK_SIZE = 8 << 20
+
+
+def iter_record_chunks(
+    input_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    start: int = 0,
+    complete_only: bool = False,
+    stop: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Yield raw byte blocks of roughly chunk_size that end on a record boundary:
+    the last newline with an even number of quotes before it in the block.
+    Every block starts on a record boundary, so parity always starts at zero
+    (escaped quotes "" do not change it). `start` must be a record boundary.
+    With complete_only, a trailing record without its newline (e.g. one still
+    being appended) is not yielded. `stop`, a record boundary, ends the read
+    there instead of at EOF. A compressed input is read decompressed, and
+    offsets then count decompressed bytes.
+    """
+    pending = b""
+    with compressed.open_input(input_path) as fin:
+        if fin.seekable():
+            fin.seek(start)
+        else:
+            while start > 0:
+                skipped = len(fin.read(min(start, chunk_size)))
+                if not skipped:
+                    break
+                start -= skipped
+        remaining = None if stop is None else stop - start
+        while remaining is None or remaining > 0:
+            block = fin.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            data = pending + block
+            cut = data.rfind(b"\n")
+            while cut >= 0 and data.count(b'"', 0, cut) & 1:
+                cut = data.rfind(b"\n", 0, cut)
+            if cut < 0:
+                pending = data
+                continue
+            yield data[: cut + 1]
+            pending = data[cut + 1 :]
+    if pending and not complete_only:
+        yield pending
+
+
+def _target_code(target: str) -> Optional[int]:
+    try:
+        return int(target)
+    except ValueError:
+        return None
+
+
+def count_hashtags_in_chunk(
+    data: bytes, encoding: str, counts: "Counter[Tuple[str, int]]", lowercase: bool = False
+) -> int:
+    """Add (hashtag, target) counts for one record-aligned block; returns rows read."""
+    total_rows = 0
+    for row in csv.reader(io.StringIO(data.decode(encoding), newline="")):
+        total_rows += 1
+        if len(row) < 6:
+            continue
+        target = _target_code(row[0])
+        if target is None:
+            continue
+        for tag in extract_hashtags(row[5], lowercase):
+            counts[(tag, target)] += 1
+    return total_rows
+
+
+def _extract_chunk(
+    args: Tuple[bytes, str, bool, bool]
+) -> Tuple[str, int, int, int, "Optional[Counter[Tuple[str, int]]]"]:
+    """Worker: parse one record-aligned block; returns (csv_text, rows, emitted, bytes, counts)."""
+    data, encoding, with_counts, lowercase = args
+    reader = csv.reader(io.StringIO(data.decode(encoding), newline=""))
+    out = io.StringIO(newline="")
+    writer = csv.writer(out)
+    counts: "Optional[Counter[Tuple[str, int]]]" = Counter() if with_counts else None
+    total_rows = 0
+    total_emitted = 0
+    for row in reader:
+        total_rows += 1
+        if len(row) < 6:
+            continue
+        target = row[0]
+        tweet_id = row[1]
+        for tag in extract_hashtags(row[5], lowercase):
+            writer.writerow([tweet_id, target, tag])
+            total_emitted += 1
+            if counts is not None:
+                code = _target_code(target)
+                if code is not None:
+                    counts[(tag, code)] += 1
+    return out.getvalue(), total_rows, total_emitted, len(data), counts
+
+
+def _save_index(
+    index_path: str,
+    input_path: str,
+    counts: "Counter[Tuple[str, int]]",
+    offset: int,
+    rows: int,
+    reset: bool = True,
+) -> None:
+    # Imported here: hashtag_index itself imports this module
+    import hashtag_index
+
+    conn = hashtag_index.open_index(index_path)
+    try:
+        if reset:
+            hashtag_index.reset_index(conn)
+        hashtag_index.add_counts(conn, counts, input_path, offset, rows)
+    finally:
+        conn.close()
+    verb = "written" if reset else "updated"
+    print(f"Index {verb}: {index_path} ({len(counts):,} hashtag/target pairs).", file=sys.stderr)
+
+
+def _checkpoint_options(encoding: str, lowercase: bool) -> dict:
+    # Everything that changes the output rows; a different value forces a rebuild
+    return {"tool": "hashtags", "encoding": encoding, "lowercase": lowercase}
+
+
+class _Resume:
+    """Where an --incremental run starts and ends (see checkpoint.py)."""
+
+    def __init__(self, input_path: str, output_path: str, encoding: str, lowercase: bool) -> None:
+        self.options = _checkpoint_options(encoding, lowercase)
+        self.previous = checkpoint.resume(output_path, input_path, self.options)
+        self.start = self.previous.offset if self.previous else 0
+        # Complete records only; one still being appended is read next time
+        self.stop, self.last_start = checkpoint.scan_records(input_path, self.start)
+
+    @property
+    def append(self) -> bool:
+        return self.previous is not None
+
+    @property
+    def nothing_new(self) -> bool:
+        return self.previous is not None and self.stop == self.start
+
+    def save(self, input_path: str, output_path: str, rows: int, emitted: int) -> None:
+        prev_rows, prev_emitted = (self.previous.rows, self.previous.written) if self.previous else (0, 0)
+        cp = checkpoint.save(
+            output_path, input_path, self.stop, prev_rows + rows, prev_emitted + emitted, self.last_start, self.options
+        )
+        print(
+            f"Checkpoint: {checkpoint.checkpoint_path(output_path)} ({cp.rows:,} rows in total, offset {cp.offset:,}).",
+            file=sys.stderr,
+        )
+
+
+def process_rows_parallel(
+    input_path: str,
+    output_path: str,
+    encoding: str = "latin-1",
+    jobs: int = 2,
+    chunk_size: int = CHUNK_SIZE,
+    index_path: Optional[str] = None,
+    lowercase: bool = False,
+    incremental: bool = False,
+    times: Optional[pipeline.StageTimes] = None,
+) -> None:
+    """
+    Same output as process_rows, but record-aligned blocks of the input are
+    parsed in a process pool and written back in input order.
+    """
+    out_dir = os.path.dirname(output_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    resume = _Resume(input_path, output_path, encoding, lowercase) if incremental else None
+    if resume is None:
+        checkpoint.remove(output_path)
+    elif resume.nothing_new:
+        print("No new rows since the last checkpoint.", file=sys.stderr)
+        return
+    append = resume is not None and resume.append
+
+    counts: "Counter[Tuple[str, int]]" = Counter()
+    consumed = resume.start if resume else 0
+    times = times or pipeline.StageTimes()
+    with compressed.open_output(output_path, "utf-8", append=append) as fout, pipeline.AsyncWriter(
+        fout, times
+    ) as writer:
+        if not append:
+            writer.writerow(["id", "target", "hashtag"])
+        total_rows = 0
+        total_emitted = 0
+        if resume is not None:
+            chunks = iter_record_chunks(input_path, chunk_size, resume.start, stop=resume.stop)
+        else:
+            chunks = iter_record_chunks(input_path, chunk_size)
+        with multiprocessing.Pool(jobs) as pool:
+            tasks = ((chunk, encoding, index_path is not None, lowercase) for chunk in chunks)
+            results = times.timed(pipeline.WORKERS, pool.imap(_extract_chunk, tasks))
+            for text, rows, emitted, nbytes, chunk_counts in results:
+                writer.write(text)
+                total_rows += rows
+                total_emitted += emitted
+                consumed += nbytes
+                if chunk_counts is not None:
+                    counts.update(chunk_counts)
+                print(
+                    f"Processed {total_rows:,} rows, emitted {total_emitted:,} hashtags...",
+                    file=sys.stderr,
+                )
+
+    print(
+        f"Done. Processed {total_rows:,} rows, emitted {total_emitted:,} hashtag rows.",
+        file=sys.stderr,
+    )
+    if index_path:
+        _save_index(index_path, input_path, counts, consumed, total_rows, reset=not append)
+    if resume is not None:
+        resume.save(input_path, output_path, total_rows, total_emitted)
+
+
+def process_columnar(
+    input_path: str,
+    output_path: str,
+    lowercase: bool = False,
+    times: Optional[pipeline.StageTimes] = None,
+) -> None:
+    """
+    Same output as process_rows, reading only target, ids and text from a
+    columnar copy (<file>.cols) instead of parsing the CSV.
+    """
+    out_dir = os.path.dirname(output_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    times = times or pipeline.StageTimes()
+    with columnar.ColumnarTable(input_path) as table, compressed.open_output(
+        output_path, "utf-8"
+    ) as fout, pipeline.AsyncWriter(fout, times) as writer:
+        writer.writerow(["id", "target", "hashtag"])
+        total_rows = 0
+        total_emitted = 0
+        records = table.iter_rows(("target", "ids", "text"))
+        while True:
+            with times.measure(pipeline.READ):
+                batch = list(itertools.islice(records, columnar.BATCH_ROWS))
+            if not batch:
+                break
+            with times.measure(pipeline.COMPUTE):
+                out = [
+                    [tweet_id, target, tag]
+                    for target, tweet_id, text in batch
+                    if "#" in text
+                    for tag in extract_hashtags(text, lowercase)
+                ]
+            writer.writerows(out)
+            before = total_rows
+            total_rows += len(batch)
+            total_emitted += len(out)
+            if total_rows // 100000 > before // 100000:
+                print(
+                    f"Processed {total_rows:,} rows, emitted {total_emitted:,} hashtags...",
+                    file=sys.stderr,
+                )
+        print(
+            f"Done. Processed {total_rows:,} rows, emitted {total_emitted:,} hashtag rows.",
+            file=sys.stderr,
+        )
+
+
+def process_features(
+    db_path: str,
+    output_path: str,
+    lowercase: bool = False,
+) -> None:
+    """
+    Same output as process_rows, read from a per-tweet feature table
+    (features.py) that already holds the 'hashtags' feature.
+    """
+    import sqlite3
+
+    out_dir = os.path.dirname(output_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        features.require(conn, "hashtags")
+        rows = conn.execute(
+            "SELECT t.id, t.target, h.hashtag FROM f_hashtags h JOIN tweets t ON t.row = h.row ORDER BY h.rowid"
+        )
+        with compressed.open_output(output_path, "utf-8") as fout, pipeline.AsyncWriter(fout) as writer:
+            writer.writerow(["id", "target", "hashtag"])
+            total_emitted = 0
+            while True:
+                batch = rows.fetchmany(columnar.BATCH_ROWS)
+                if not batch:
+                    break
+                writer.writerows([[tweet_id, target, tag.lower() if lowercase else tag] for tweet_id, target, tag in batch])
+                total_emitted += len(batch)
+    finally:
+        conn.close()
+    print(f"Done. Emitted {total_emitted:,} hashtag rows.", file=sys.stderr)
 
 
 def process_rows(
     input_path: str,
     output_path: str,
     encoding: str = "latin-1",
+    index_path: Optional[str] = None,
+    lowercase: bool = False,
+    incremental: bool = False,
+    times: Optional[pipeline.StageTimes] = None,
 ) -> None:
     """
     Read Sentiment140-style CSV and write id,target,hashtag (one row per hashtag).
     Input columns (no header): target,id,date,flag,user,text
+    With index_path, hashtag -> per-target counts are also collected and the
+    SQLite index (see hashtag_index.py) is rebuilt from them.
+    With incremental, only complete records appended since the last run are
+    read and their rows appended to output_path (see checkpoint.py); the
+    index then gets their counts added instead of being rebuilt.
+    Time spent reading, extracting and writing is added to `times`.
     """
+    resume = _Resume(input_path, output_path, encoding, lowercase) if incremental else None
+    if resume is None:
+        checkpoint.remove(output_path)
+    elif resume.nothing_new:
+        print("No new rows since the last checkpoint.", file=sys.stderr)
+        return
+    append = resume is not None and resume.append
+
+    counts: "Counter[Tuple[str, int]]" = Counter()
     # Ensure output directory exists
     out_dir = os.path.dirname(output_path)
     if out_dir and not os.path.exists(out_dir):
         os.makedirs(out_dir, exist_ok=True)
 
-    # Open input and output with streaming
-    with open(input_path, "r", encoding=encoding, newline="") as fin, open(
-        output_path, "w", encoding="utf-8", newline=""
-    ) as fout:
-        reader = csv.reader(fin)
-        writer = csv.writer(fout)
-        # Write header
-        writer.writerow(["id", "target", "hashtag"])
+    times = times or pipeline.StageTimes()
+    # Memory-mapped (or decompressed) input, decoded in record-aligned batches;
+    # output rows go out a batch at a time through the writer thread
+    with mmap_csv.open_csv(input_path, encoding=encoding) as fin, compressed.open_output(
+        output_path, "utf-8", append=append
+    ) as fout, pipeline.AsyncWriter(fout, times) as writer:
+        # Write header (an incremental run appends below the existing one)
+        if not append:
+            writer.writerow(["id", "target", "hashtag"])
 
         total_rows = 0
         total_emitted = 0
 
-        for row in reader:
-            total_rows += 1
-            # Expect at least 6 fields
-            if len(row) < 6:
-                continue
-            target = row[0]
-            tweet_id = row[1]
-            text = row[5]
+        start, stop = (resume.start, resume.stop) if resume is not None else (0, None)
+        for text_batch, _ in times.timed(pipeline.READ, fin.batches(start, stop=stop)):
+            with times.measure(pipeline.READ):
+                rows = list(csv.reader(io.StringIO(text_batch, newline="")))
+            with times.measure(pipeline.COMPUTE):
+                out = []
+                for row in rows:
+                    # Expect at least 6 fields
+                    if len(row) < 6:
+                        continue
+                    target = row[0]
+                    tweet_id = row[1]
 
-            hashtags = extract_hashtags(text)
-            if not hashtags:
-                continue
+                    hashtags = extract_hashtags(row[5], lowercase)
+                    if not hashtags:
+                        continue
 
-            for tag in hashtags:
-                writer.writerow([tweet_id, target, tag])
-                total_emitted += 1
+                    for tag in hashtags:
+                        out.append([tweet_id, target, tag])
 
-            if total_rows % 100000 == 0:
+                    if index_path:
+                        code = _target_code(target)
+                        if code is not None:
+                            for tag in hashtags:
+                                counts[(tag, code)] += 1
+            writer.writerows(out)
+
+            before = total_rows
+            total_rows += len(rows)
+            total_emitted += len(out)
+            if total_rows // 100000 > before // 100000:
                 # Progress to stderr to avoid polluting CSV
                 print(
                     f"Processed {total_rows:,} rows, emitted {total_emitted:,} hashtags...",
@@ -71,6 +453,13 @@ def process_rows(
             f"Done. Processed {total_rows:,} rows, emitted {total_emitted:,} hashtag rows.",
             file=sys.stderr,
         )
+        # Bytes actually consumed, so a later incremental update starts right after them
+        consumed = fin.size if resume is None else resume.stop
+
+    if index_path:
+        _save_index(index_path, input_path, counts, consumed, total_rows, reset=not append)
+    if resume is not None:
+        resume.save(input_path, output_path, total_rows, total_emitted)
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -79,28 +468,103 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     )
     parser.add_argument(
         "--input",
-        required=True,
-        help="Path to input CSV (Sentiment140 format: target,id,date,flag,user,text).",
+        default="",
+        help=(
+            "Path to input CSV (Sentiment140 format: target,id,date,flag,user,text), optionally "
+            "gzip/zstd/zip-compressed (zip members as archive.zip/member.csv), or its columnar copy (.cols)."
+        ),
+    )
+    parser.add_argument(
+        "--features",
+        default="",
+        help="Read hashtags from a feature table built by features.py instead of --input.",
     )
     parser.add_argument(
         "--output",
         required=True,
-        help="Path to output CSV with columns: id,target,hashtag.",
+        help="Path to output CSV with columns: id,target,hashtag (.gz/.zst/.zip to compress it).",
     )
     parser.add_argument(
         "--encoding",
         default="latin-1",
         help="Input file encoding (default: latin-1).",
     )
+    parser.add_argument(
+        "--index",
+        default=None,
+        help="Also build a SQLite hashtag -> per-target count index at this path.",
+    )
+    parser.add_argument(
+        "--lowercase",
+        action="store_true",
+        help="Normalize hashtags to lowercase (#FollowFriday -> #followfriday).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Only read records appended since the last run and append their rows to --output; "
+            "progress is kept in <output>.checkpoint.json and a rewritten input starts over."
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print the time spent reading, extracting and writing (stderr).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for extraction; output keeps input order (default: 1).",
+    )
     return parser.parse_args(argv)
 
 
 def main() -> None:
     args = parse_args(sys.argv[1:])
-    process_rows(args.input, args.output, encoding=args.encoding)
+    times = pipeline.StageTimes()
+    started = time.perf_counter()
+    if args.features:
+        if args.index or args.incremental:
+            print("--index and --incremental need the CSV input (they record byte offsets).", file=sys.stderr)
+            sys.exit(2)
+        process_features(args.features, args.output, lowercase=args.lowercase)
+    elif not args.input:
+        print("One of --input or --features is required.", file=sys.stderr)
+        sys.exit(2)
+    elif args.incremental and (columnar.is_columnar(args.input) or compressed.is_compressed(args.input)):
+        print("--incremental needs an uncompressed CSV input (it records byte offsets).", file=sys.stderr)
+        sys.exit(2)
+    elif columnar.is_columnar(args.input):
+        if args.index:
+            print("--index needs the CSV input (it records byte offsets).", file=sys.stderr)
+            sys.exit(2)
+        process_columnar(args.input, args.output, lowercase=args.lowercase, times=times)
+    elif args.jobs > 1:
+        process_rows_parallel(
+            args.input,
+            args.output,
+            encoding=args.encoding,
+            jobs=args.jobs,
+            index_path=args.index,
+            lowercase=args.lowercase,
+            incremental=args.incremental,
+            times=times,
+        )
+    else:
+        process_rows(
+            args.input,
+            args.output,
+            encoding=args.encoding,
+            index_path=args.index,
+            lowercase=args.lowercase,
+            incremental=args.incremental,
+            times=times,
+        )
+    if args.timings:
+        print(f"Time per stage:\n{times.report(time.perf_counter() - started)}", file=sys.stderr)
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from extract_hashtags import count_hashtags_in_chunk, iter_record_chunks
+
+import compressed  # repository root, put on sys.path by extract_hashtags
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashtag_counts (
+    hashtag TEXT NOT NULL,
+    target INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hashtag, target)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashtag_counts_by_target ON hashtag_counts (target, count DESC);
+CREATE TABLE IF NOT EXISTS hashtag_totals (
+    hashtag TEXT PRIMARY KEY,
+    total INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashtag_totals_by_total ON hashtag_totals (total DESC);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    last_start INTEGER NOT NULL DEFAULT 0,
+    last_hash TEXT NOT NULL DEFAULT ''
+);
+"""
+# Bytes before the indexed offset whose sha256 is kept, so a rewritten input
+# is noticed even when it is not shorter (a few records' worth)
+TAIL_BYTES = 1 << 16
+
+
+def open_index(index_path: str) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite hashtag index."""
+    out_dir = os.path.dirname(index_path)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sources)")}
+    if "last_hash" not in columns:
+        # Index from before the tail hash: its sources never match and get rebuilt
+        with conn:
+            conn.execute("ALTER TABLE sources ADD COLUMN last_start INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE sources ADD COLUMN last_hash TEXT NOT NULL DEFAULT ''")
+    return conn
+
+
+def reset_index(conn: sqlite3.Connection) -> None:
+    """Drop all counts; used when the index is rebuilt from a full extraction."""
+    with conn:
+        conn.execute("DELETE FROM hashtag_counts")
+        conn.execute("DELETE FROM hashtag_totals")
+        conn.execute("DELETE FROM sources")
+
+
+def tail_hash(source: str, start: int, end: int) -> str:
+    """sha256 of bytes [start, end) of source, decompressed; fewer if it ends earlier."""
+    digest = hashlib.sha256()
+    with compressed.open_input(source) as fin:
+        if fin.seekable():
+            fin.seek(start)
+        else:
+            while start > 0:
+                skipped = len(fin.read(min(start, 1 << 20)))
+                if not skipped:
+                    break
+                start -= skipped
+        remaining = end - start
+        while remaining > 0:
+            block = fin.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def add_counts(
+    conn: sqlite3.Connection,
+    counts: "Counter[Tuple[str, int]]",
+    source: str,
+    offset: int,
+    rows: int,
+) -> None:
+    """
+    Add (hashtag, target) -> count deltas and record how far `source` has been
+    read, in one transaction so counts and offset never disagree. The hash
+    of the TAIL_BYTES before the offset is recorded with it.
+    """
+    last_start = max(0, offset - TAIL_BYTES)
+    last_hash = tail_hash(source, last_start, offset)
+    totals: "Counter[str]" = Counter()
+    for (tag, _), c in counts.items():
+        totals[tag] += c
+    with conn:
+        conn.executemany(
+            "INSERT INTO hashtag_counts (hashtag, target, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (hashtag, target) DO UPDATE SET count = count + excluded.count",
+            ((tag, target, c) for (tag, target), c in counts.items()),
+        )
+        conn.executemany(
+            "INSERT INTO hashtag_totals (hashtag, total) VALUES (?, ?) "
+            "ON CONFLICT (hashtag) DO UPDATE SET total = total + excluded.total",
+            totals.items(),
+        )
+        conn.execute(
+            "INSERT INTO sources (path, offset, rows, last_start, last_hash) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET offset = excluded.offset, rows = sources.rows + excluded.rows, "
+            "last_start = excluded.last_start, last_hash = excluded.last_hash",
+            (os.path.abspath(source), offset, rows, last_start, last_hash),
+        )
+
+
+def source_offset(conn: sqlite3.Connection, source: str) -> Tuple[int, int]:
+    row = conn.execute(
+        "SELECT offset, rows FROM sources WHERE path = ?", (os.path.abspath(source),)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def source_unchanged(conn: sqlite3.Connection, source: str) -> bool:
+    """True when the bytes before the recorded offset still hash the same."""
+    row = conn.execute(
+        "SELECT offset, last_start, last_hash FROM sources WHERE path = ?", (os.path.abspath(source),)
+    ).fetchone()
+    if row is None:
+        return True
+    offset, last_start, last_hash = row
+    return tail_hash(source, last_start, offset) == last_hash
+
+
+def update_from_csv(
+    conn: sqlite3.Connection,
+    input_path: str,
+    encoding: str = "latin-1",
+    lowercase: bool = False,
+) -> Tuple[int, int]:
+    """
+    Count hashtags only in the complete records appended to input_path since
+    the last update. If the bytes before the recorded offset no longer hash
+    the same (the file was truncated or rewritten, whatever its size), the
+    index is rebuilt from the start. For a compressed input the offset counts
+    decompressed bytes. Returns (rows, hashtags) processed in this call.
+    """
+    offset, _ = source_offset(conn, input_path)
+    if not source_unchanged(conn, input_path):
+        print("Input changed before the indexed offset; rebuilding index.", file=sys.stderr)
+        reset_index(conn)
+        offset = 0
+    counts: "Counter[Tuple[str, int]]" = Counter()
+    total_rows = 0
+    for chunk in iter_record_chunks(input_path, start=offset, complete_only=True):
+        total_rows += count_hashtags_in_chunk(chunk, encoding, counts, lowercase)
+        offset += len(chunk)
+    add_counts(conn, counts, input_path, offset, total_rows)
+    return total_rows, sum(counts.values())
+
+
+def top_k(
+    conn: sqlite3.Connection, k: int = 10, target: Optional[int] = None
+) -> List[Tuple[str, int]]:
+    """Most frequent hashtags overall, or within one sentiment target."""
+    if target is None:
+        cur = conn.execute(
+            "SELECT hashtag, total FROM hashtag_totals ORDER BY total DESC, hashtag LIMIT ?", (k,)
+        )
+    else:
+        cur = conn.execute(
+            "SELECT hashtag, count FROM hashtag_counts WHERE target = ? "
+            "ORDER BY count DESC, hashtag LIMIT ?",
+            (target, k),
+        )
+    return cur.fetchall()
+
+
+def lookup(conn: sqlite3.Connection, hashtag: str) -> List[Tuple[int, int]]:
+    """Per-target counts for one hashtag: [(target, count), ...]."""
+    return conn.execute(
+        "SELECT target, count FROM hashtag_counts WHERE hashtag = ? ORDER BY target", (hashtag,)
+    ).fetchall()
+
+
+def parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Query or incrementally update the hashtag -> per-target count index."
+    )
+    parser.add_argument("--index", required=True, help="Path to the SQLite index file.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    upd = sub.add_parser("update", help="Count hashtags in rows appended since the last update.")
+    upd.add_argument("--input", required=True, help="Sentiment140-format CSV.")
+    upd.add_argument("--encoding", default="latin-1", help="Input file encoding (default: latin-1).")
+    upd.add_argument(
+        "--lowercase",
+        action="store_true",
+        help="Normalize hashtags to lowercase; use the same setting as the original extraction.",
+    )
+
+    top = sub.add_parser("top", help="Print the K most frequent hashtags.")
+    top.add_argument("-k", type=int, default=10, help="Number of hashtags (default: 10).")
+    top.add_argument("--target", type=int, default=None, help="Restrict to one target (0, 2 or 4).")
+
+    look = sub.add_parser("lookup", help="Print per-target counts for hashtags.")
+    look.add_argument("hashtags", nargs="+", help="Hashtags including the leading '#'.")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args(sys.argv[1:])
+    conn = open_index(args.index)
+    try:
+        if args.command == "update":
+            rows, tags = update_from_csv(
+                conn, args.input, encoding=args.encoding, lowercase=args.lowercase
+            )
+            print(f"Done. Processed {rows:,} new rows, counted {tags:,} hashtags.", file=sys.stderr)
+        elif args.command == "top":
+            for tag, count in top_k(conn, args.k, args.target):
+                print(f"{tag},{count}")
+        else:
+            for tag in args.hashtags:
+                for target, count in lookup(conn, tag):
+                    print(f"{tag},{target},{count}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import csv
+import random
+import sys
+import time
+
+from exportar_marcas_csv import (
+    LOTE_FILAS,
+    brand_labels,
+    build_brand_matcher,
+    build_brand_patterns,
+    classify_brand,
+    load_brand_matcher,
+    classify_brand_secuencial,
+    classify_brands,
+)
+
+
+PALABRAS = (
+    "i", "the", "to", "my", "a", "and", "is", "in", "it", "for", "you", "of", "me",
+    "so", "have", "but", "on", "just", "day", "now", "work", "today", "good", "new",
+    "love", "going", "miss", "back", "home", "night", "lol", "sad", "got", "can't",
+)
+ALIAS_MUESTRA = (
+    "iphone", "Galaxy", "windows", "xbox 360", "PS3", "google", "kindle", "Tom Ford",
+    "ford", "apple music", "HBO max", "twitter", "facebook", "Starbucks", "nike",
+    "T-Mobile", "disney+", "Citroën", "mcdonald's", "best buy", "core i7",
+)
+
+
+def leer_textos(path, limite):
+    textos = []
+    with open(path, "r", encoding="ISO-8859-1", newline="") as fin:
+        for row in csv.reader(fin):
+            if len(row) < 6:
+                continue
+            textos.append(row[5])
+            if limite and len(textos) >= limite:
+                break
+    return textos
+
+
+def textos_sinteticos(n, semilla=140):
+    # ~1 de cada 8 tweets menciona alguna marca, como en Sentiment140
+    rnd = random.Random(semilla)
+    textos = []
+    for _ in range(n):
+        palabras = [rnd.choice(PALABRAS) for _ in range(rnd.randint(3, 22))]
+        if rnd.random() < 0.125:
+            palabras.insert(rnd.randrange(len(palabras) + 1), rnd.choice(ALIAS_MUESTRA))
+        textos.append(" ".join(palabras))
+    return textos
+
+
+def medir(nombre, fn, textos, arg):
+    t0 = time.perf_counter()
+    etiquetas = [fn(t, arg) for t in textos]
+    dt = time.perf_counter() - t0
+    print(f"{nombre:<12} {dt:8.3f} s  {len(textos) / dt:12,.0f} filas/s")
+    return etiquetas, dt
+
+
+def medir_lotes(nombre, textos, matcher):
+    t0 = time.perf_counter()
+    etiquetas = brand_labels(matcher)
+    res = []
+    for i in range(0, len(textos), LOTE_FILAS):
+        res.extend(etiquetas[c] for c in classify_brands(textos[i:i + LOTE_FILAS], matcher))
+    dt = time.perf_counter() - t0
+    print(f"{nombre:<12} {dt:8.3f} s  {len(textos) / dt:12,.0f} filas/s")
+    return res, dt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara classify_brand (una pasada) contra el bucle secuencial de regex")
+    parser.add_argument("--path", type=str, default="", help="CSV Sentiment140 (si se omite se usan textos sintéticos)")
+    parser.add_argument("--rows", type=int, default=200000, help="Número máximo de filas a medir")
+    args = parser.parse_args()
+
+    textos = leer_textos(args.path, args.rows) if args.path else textos_sinteticos(args.rows)
+    patterns = build_brand_patterns()
+    t0 = time.perf_counter()
+    matcher = build_brand_matcher(patterns)
+    print(f"Construcción del matcher: {time.perf_counter() - t0:.3f} s, {len(textos)} textos")
+    load_brand_matcher()
+    t0 = time.perf_counter()
+    load_brand_matcher()
+    print(f"Carga desde la caché: {time.perf_counter() - t0:.4f} s")
+
+    ref, dt_ref = medir("secuencial", classify_brand_secuencial, textos, patterns)
+    nuevo, dt_nuevo = medir("una pasada", classify_brand, textos, matcher)
+    lotes, dt_lotes = medir_lotes("por lotes", textos, matcher)
+
+    diferencias = [(t, a, b) for t, a, b in zip(textos, ref, nuevo) if a != b]
+    diferencias += [(t, a, b) for t, a, b in zip(textos, ref, lotes) if a != b]
+    for t, a, b in diferencias[:10]:
+        print(f"  DIFERENCIA: {a!r} != {b!r} en {t!r}")
+    print(f"Aceleración: {dt_ref / dt_nuevo:.1f}x (por lotes {dt_ref / dt_lotes:.1f}x), diferencias: {len(diferencias)}")
+    if diferencias:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,292 +1,467 @@
 import csv
+import hashlib
+import io
+import itertools
+import json
 import re
 import argparse
+import multiprocessing
 import os
 import sys
+import time
+from array import array
+from collections import Counter
 
+# Módulos compartidos en la raíz del repositorio (formato columnar, lector mmap,
+# compresión, checkpoints, escritura en otro hilo)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import checkpoint  # noqa: E402
+import columnar  # noqa: E402
+import compressed  # noqa: E402
+import features  # noqa: E402
+import mmap_csv  # noqa: E402
+import pipeline  # noqa: E402
 
-def build_brand_patterns():
-    patterns = []
-    def p(label, regex):
-        patterns.append((label, re.compile(regex, re.IGNORECASE)))
-
-    # Principales
-    p("Apple", r"(^|\W)(APPLE|IPHONE|IPAD|IPOD|IMAC|MACBOOK|MAC\s?OS|MACOS)(\W|$)")
-    p("Samsung", r"(^|\W)(SAMSUNG|GALAXY)(\W|$)")
-    p("Microsoft", r"(^|\W)(MICROSOFT|MSFT|WINDOWS|WIN7|WINXP|VISTA)(\W|$)")
-    p("Nvidia", r"(^|\W)(NVIDIA|NVDA|GEFORCE|GTX|RTX)(\W|$)")
-    p("Nintendo", r"(^|\W)(NINTENDO|SWITCH|WIIU|WII|3DS|DS)(\W|$)")
-    p("Xbox", r"(^|\W)(XBOX|X\-BOX|XBOX360|X360)(\W|$)")
-
-    # Adicionales
-    p("PlayStation", r"(^|\W)(PLAYSTATION|PS1|PS2|PS3|PS4|PS5|PSP|VITA)(\W|$)")
-    p("Sony", r"(^|\W)(SONY)(\W|$)")
-    p("Google", r"(^|\W)(GOOGLE|ANDROID|PIXEL|NEXUS|CHROME|CHROMEOS)(\W|$)")
-    p("Amazon", r"(^|\W)(AMAZON|KINDLE|FIRE\s?TV|FIRE\s?STICK|ECHO|ALEXA)(\W|$)")
-    p("Intel", r"(^|\W)(INTEL|PENTIUM|CELERON|CORE\s?I[3579])(\W|$)")
-    p("AMD", r"(^|\W)(AMD|RADEON|RYZEN|THREADRIPPER)(\W|$)")
-    p("Lenovo", r"(^|\W)(LENOVO|THINKPAD|IDEAPAD)(\W|$)")
-    p("Dell", r"(^|\W)(DELL|ALIENWARE|XPS|INSPIRON)(\W|$)")
-    p("HP", r"(^|\W)(HP|HEWLETT\s?PACKARD|PAVILION|ELITEBOOK|SPECTRE)(\W|$)")
-    p("ASUS", r"(^|\W)(ASUS|ROG|ZENBOOK|VIVOBOOK)(\W|$)")
-    p("Acer", r"(^|\W)(ACER|PREDATOR|ASPIRE)(\W|$)")
-    p("MSI", r"(^|\W)(MSI|STEALTH|TITAN|RAIDER)(\W|$)")
-    p("Huawei", r"(^|\W)(HUAWEI|HONOR)(\W|$)")
-    p("Xiaomi", r"(^|\W)(XIAOMI|REDMI|POCO)(\W|$)")
-    p("OnePlus", r"(^|\W)(ONEPLUS)(\W|$)")
-    p("Oppo", r"(^|\W)(OPPO)(\W|$)")
-    p("Vivo", r"(^|\W)(VIVO)(\W|$)")
-    p("Motorola", r"(^|\W)(MOTOROLA|MOTO\s?G|MOTO\s?E)(\W|$)")
-    p("LG", r"(^|\W)(LG)(\W|$)")
-    p("HTC", r"(^|\W)(HTC)(\W|$)")
-    p("Nokia", r"(^|\W)(NOKIA|LUMIA)(\W|$)")
-    p("BlackBerry", r"(^|\W)(BLACKBERRY|BB10|BOLD|CURVE)(\W|$)")
-    # Audio / periféricos
-    p("Bose", r"(^|\W)(BOSE)(\W|$)")
-    p("JBL", r"(^|\W)(JBL)(\W|$)")
-    p("Beats", r"(^|\W)(BEATS)(\W|$)")
-    p("Sennheiser", r"(^|\W)(SENNHEISER)(\W|$)")
-    p("Logitech", r"(^|\W)(LOGITECH)(\W|$)")
-    p("Razer", r"(^|\W)(RAZER)(\W|$)")
-    p("Corsair", r"(^|\W)(CORSAIR)(\W|$)")
-    p("SteelSeries", r"(^|\W)(STEELSERIES)(\W|$)")
-    p("HyperX", r"(^|\W)(HYPERX)(\W|$)")
-    p("Elgato", r"(^|\W)(ELGATO)(\W|$)")
-    p("Turtle Beach", r"(^|\W)(TURTLE\s?BEACH)(\W|$)")
-    # Almacenamiento
-    p("Seagate", r"(^|\W)(SEAGATE)(\W|$)")
-    p("Western Digital", r"(^|\W)(WESTERN\s?DIGITAL|WD)(\W|$)")
-    p("SanDisk", r"(^|\W)(SANDISK)(\W|$)")
-    p("Kingston", r"(^|\W)(KINGSTON)(\W|$)")
-    p("Crucial", r"(^|\W)(CRUCIAL)(\W|$)")
-    p("Transcend", r"(^|\W)(TRANSCEND)(\W|$)")
-    # Componentes PC / GPU partners
-    p("EVGA", r"(^|\W)(EVGA)(\W|$)")
-    p("Zotac", r"(^|\W)(ZOTAC)(\W|$)")
-    p("Sapphire", r"(^|\W)(SAPPHIRE)(\W|$)")
-    p("PowerColor", r"(^|\W)(POWER\s?COLOR)(\W|$)")
-    p("Gigabyte", r"(^|\W)(GIGABYTE)(\W|$)")
-    p("ASRock", r"(^|\W)(ASROCK)(\W|$)")
-    p("XFX", r"(^|\W)(XFX)(\W|$)")
-    # Cámaras / drones
-    p("Canon", r"(^|\W)(CANON)(\W|$)")
-    p("Nikon", r"(^|\W)(NIKON)(\W|$)")
-    p("Fujifilm", r"(^|\W)(FUJIFILM|FUJI\s?FILM)(\W|$)")
-    p("Olympus", r"(^|\W)(OLYMPUS)(\W|$)")
-    p("GoPro", r"(^|\W)(GOPRO)(\W|$)")
-    p("DJI", r"(^|\W)(DJI)(\W|$)")
-    # Televisores / AV
-    p("Philips", r"(^|\W)(PHILIPS)(\W|$)")
-    p("Panasonic", r"(^|\W)(PANASONIC)(\W|$)")
-    p("Sharp", r"(^|\W)(SHARP)(\W|$)")
-    p("TCL", r"(^|\W)(TCL)(\W|$)")
-    p("Hisense", r"(^|\W)(HISENSE)(\W|$)")
-    p("Vizio", r"(^|\W)(VIZIO)(\W|$)")
-    # Streaming / media
-    p("Netflix", r"(^|\W)(NETFLIX)(\W|$)")
-    p("Disney+", r"(^|\W)(DISNEY\+|DISNEY\s?PLUS)(\W|$)")
-    p("Hulu", r"(^|\W)(HULU)(\W|$)")
-    p("HBO", r"(^|\W)(HBO|HBO\s?MAX|MAX)(\W|$)")
-    p("Prime Video", r"(^|\W)(PRIME\s?VIDEO)(\W|$)")
-    p("Paramount+", r"(^|\W)(PARAMOUNT\+)(\W|$)")
-    p("Peacock", r"(^|\W)(PEACOCK)(\W|$)")
-    p("YouTube", r"(^|\W)(YOUTUBE)(\W|$)")
-    p("Spotify", r"(^|\W)(SPOTIFY)(\W|$)")
-    p("Apple Music", r"(^|\W)(APPLE\s?MUSIC)(\W|$)")
-    p("Amazon Music", r"(^|\W)(AMAZON\s?MUSIC)(\W|$)")
-    p("Tidal", r"(^|\W)(TIDAL)(\W|$)")
-    p("Deezer", r"(^|\W)(DEEZER)(\W|$)")
-    p("Warner Bros", r"(^|\W)(WARNER\s?BROS)(\W|$)")
-    p("Universal", r"(^|\W)(UNIVERSAL\s?PICTURES|UNIVERSAL)(\W|$)")
-    p("20th Century", r"(^|\W)(20TH\s?CENTURY\s?STUDIOS|20TH\s?CENTURY\s?FOX)(\W|$)")
-    p("Sony Pictures", r"(^|\W)(SONY\s?PICTURES)(\W|$)")
-    # Social / tech
-    p("Facebook", r"(^|\W)(FACEBOOK|FB)(\W|$)")
-    p("Instagram", r"(^|\W)(INSTAGRAM|IG)(\W|$)")
-    p("WhatsApp", r"(^|\W)(WHATSAPP)(\W|$)")
-    p("Messenger", r"(^|\W)(MESSENGER)(\W|$)")
-    p("TikTok", r"(^|\W)(TIKTOK)(\W|$)")
-    p("Snapchat", r"(^|\W)(SNAPCHAT)(\W|$)")
-    p("Twitter", r"(^|\W)(TWITTER)(\W|$)")
-    p("Meta", r"(^|\W)(META)(\W|$)")
-    # Pagos / fintech
-    p("PayPal", r"(^|\W)(PAYPAL)(\W|$)")
-    p("Visa", r"(^|\W)(VISA)(\W|$)")
-    p("Mastercard", r"(^|\W)(MASTERCARD)(\W|$)")
-    p("Stripe", r"(^|\W)(STRIPE)(\W|$)")
-    p("Square", r"(^|\W)(SQUARE)(\W|$)")
-    p("Apple Pay", r"(^|\W)(APPLE\s?PAY)(\W|$)")
-    p("Google Pay", r"(^|\W)(GOOGLE\s?PAY)(\W|$)")
-    # Cloud / enterprise
-    p("AWS", r"(^|\W)(AWS|AMAZON\s?WEB\s?SERVICES)(\W|$)")
-    p("Azure", r"(^|\W)(AZURE)(\W|$)")
-    p("Google Cloud", r"(^|\W)(GOOGLE\s?CLOUD|GCP)(\W|$)")
-    p("IBM", r"(^|\W)(IBM)(\W|$)")
-    p("Oracle", r"(^|\W)(ORACLE)(\W|$)")
-    p("Salesforce", r"(^|\W)(SALESFORCE)(\W|$)")
-    p("SAP", r"(^|\W)(SAP)(\W|$)")
-    p("VMware", r"(^|\W)(VMWARE)(\W|$)")
-    p("Docker", r"(^|\W)(DOCKER)(\W|$)")
-    p("Kubernetes", r"(^|\W)(KUBERNETES|K8S)(\W|$)")
-    # Retail / e-commerce
-    p("eBay", r"(^|\W)(EBAY)(\W|$)")
-    p("Walmart", r"(^|\W)(WALMART)(\W|$)")
-    p("Target", r"(^|\W)(TARGET)(\W|$)")
-    p("Best Buy", r"(^|\W)(BEST\s?BUY)(\W|$)")
-    p("Costco", r"(^|\W)(COSTCO)(\W|$)")
-    p("Ikea", r"(^|\W)(IKEA)(\W|$)")
-    p("AliExpress", r"(^|\W)(ALIEXPRESS)(\W|$)")
-    p("Shopify", r"(^|\W)(SHOPIFY)(\W|$)")
-    # Automotriz
-    p("Tesla", r"(^|\W)(TESLA)(\W|$)")
-    p("Ford", r"(^|\W)(FORD)(\W|$)")
-    p("Toyota", r"(^|\W)(TOYOTA)(\W|$)")
-    p("BMW", r"(^|\W)(BMW)(\W|$)")
-    p("Mercedes", r"(^|\W)(MERCEDES|MERCEDES\-BENZ)(\W|$)")
-    p("Audi", r"(^|\W)(AUDI)(\W|$)")
-    p("Volkswagen", r"(^|\W)(VOLKSWAGEN|VW)(\W|$)")
-    p("Nissan", r"(^|\W)(NISSAN)(\W|$)")
-    p("Honda", r"(^|\W)(HONDA)(\W|$)")
-    p("Hyundai", r"(^|\W)(HYUNDAI)(\W|$)")
-    p("Kia", r"(^|\W)(KIA)(\W|$)")
-    p("Chevrolet", r"(^|\W)(CHEVROLET|CHEVY)(\W|$)")
-    p("Porsche", r"(^|\W)(PORSCHE)(\W|$)")
-    p("Ferrari", r"(^|\W)(FERRARI)(\W|$)")
-    p("Lamborghini", r"(^|\W)(LAMBORGHINI)(\W|$)")
-    p("Maserati", r"(^|\W)(MASERATI)(\W|$)")
-    p("Bugatti", r"(^|\W)(BUGATTI)(\W|$)")
-    p("McLaren", r"(^|\W)(MC\s?LAREN|MCLAREN)(\W|$)")
-    p("Bentley", r"(^|\W)(BENTLEY)(\W|$)")
-    p("Rolls-Royce", r"(^|\W)(ROLLS\-ROYCE|ROLLS\s?ROYCE)(\W|$)")
-    p("Citroen", r"(^|\W)(CITROEN|CITROËN)(\W|$)")
-    p("Peugeot", r"(^|\W)(PEUGEOT)(\W|$)")
-    p("Renault", r"(^|\W)(RENAULT)(\W|$)")
-    p("Alfa Romeo", r"(^|\W)(ALFA\s?ROMEO)(\W|$)")
-    p("Skoda", r"(^|\W)(SKODA|ŠKODA)(\W|$)")
-    p("Seat", r"(^|\W)(SEAT)(\W|$)")
-    p("Fiat", r"(^|\W)(FIAT)(\W|$)")
-    p("Subaru", r"(^|\W)(SUBARU)(\W|$)")
-    p("Mazda", r"(^|\W)(MAZDA)(\W|$)")
-    p("Mini", r"(^|\W)(MINI)(\W|$)")
-    p("Land Rover", r"(^|\W)(LAND\s?ROVER)(\W|$)")
-    p("Jaguar", r"(^|\W)(JAGUAR)(\W|$)")
-    p("Infiniti", r"(^|\W)(INFINITI)(\W|$)")
-    p("Lexus", r"(^|\W)(LEXUS)(\W|$)")
-    p("Ram", r"(^|\W)(RAM)(\W|$)")
-    p("Dodge", r"(^|\W)(DODGE)(\W|$)")
-    p("Jeep", r"(^|\W)(JEEP)(\W|$)")
-    p("Cadillac", r"(^|\W)(CADILLAC)(\W|$)")
-    p("Lincoln", r"(^|\W)(LINCOLN)(\W|$)")
-    p("Yamaha", r"(^|\W)(YAMAHA)(\W|$)")
-    p("Suzuki", r"(^|\W)(SUZUKI)(\W|$)")
-    p("Kawasaki", r"(^|\W)(KAWASAKI)(\W|$)")
-    p("Ducati", r"(^|\W)(DUCATI)(\W|$)")
-    p("Harley-Davidson", r"(^|\W)(HARLEY\-DAVIDSON)(\W|$)")
-    p("KTM", r"(^|\W)(KTM)(\W|$)")
-    p("Triumph", r"(^|\W)(TRIUMPH)(\W|$)")
-    p("Aprilia", r"(^|\W)(APRILIA)(\W|$)")
-    p("Piaggio", r"(^|\W)(PIAGGIO)(\W|$)")
-    p("Vespa", r"(^|\W)(VESPA)(\W|$)")
-    p("Husqvarna", r"(^|\W)(HUSQVARNA)(\W|$)")
-    p("Royal Enfield", r"(^|\W)(ROYAL\s?ENFIELD)(\W|$)")
-    p("Benelli", r"(^|\W)(BENELLI)(\W|$)")
-    # Ropa / calzado
-    p("Nike", r"(^|\W)(NIKE)(\W|$)")
-    p("Adidas", r"(^|\W)(ADIDAS)(\W|$)")
-    p("Puma", r"(^|\W)(PUMA)(\W|$)")
-    p("Under Armour", r"(^|\W)(UNDER\s?ARMOUR)(\W|$)")
-    p("Reebok", r"(^|\W)(REEBOK)(\W|$)")
-    p("New Balance", r"(^|\W)(NEW\s?BALANCE)(\W|$)")
-    p("Zara", r"(^|\W)(ZARA)(\W|$)")
-    p("H&M", r"(^|\W)(H\&M)(\W|$)")
-    p("Uniqlo", r"(^|\W)(UNIQLO)(\W|$)")
-    p("Pull&Bear", r"(^|\W)(PULL\&BEAR)(\W|$)")
-    p("Bershka", r"(^|\W)(BERSHKA)(\W|$)")
-    p("Stradivarius", r"(^|\W)(STRADIVARIUS)(\W|$)")
-    p("Massimo Dutti", r"(^|\W)(MASSIMO\s?DUTTI)(\W|$)")
-    p("Shein", r"(^|\W)(SHEIN)(\W|$)")
-    p("Levi's", r"(^|\W)(LEVI\'S|LEVIS)(\W|$)")
-    p("Converse", r"(^|\W)(CONVERSE)(\W|$)")
-    p("Vans", r"(^|\W)(VANS)(\W|$)")
-    p("Crocs", r"(^|\W)(CROCS)(\W|$)")
-    p("Tommy Hilfiger", r"(^|\W)(TOMMY\s?HILFIGER)(\W|$)")
-    p("Ralph Lauren", r"(^|\W)(RALPH\s?LAUREN)(\W|$)")
-    p("Gucci", r"(^|\W)(GUCCI)(\W|$)")
-    p("Prada", r"(^|\W)(PRADA)(\W|$)")
-    p("Balenciaga", r"(^|\W)(BALENCIAGA)(\W|$)")
-    p("Louis Vuitton", r"(^|\W)(LOUIS\s?VUITTON)(\W|$)")
-    p("Off-White", r"(^|\W)(OFF\-WHITE)(\W|$)")
-    p("Moncler", r"(^|\W)(MONCLER)(\W|$)")
-    p("Stone Island", r"(^|\W)(STONE\s?ISLAND)(\W|$)")
-    p("The North Face", r"(^|\W)(THE\s?NORTH\s?FACE)(\W|$)")
-    p("Patagonia", r"(^|\W)(PATAGONIA)(\W|$)")
-    p("Columbia", r"(^|\W)(COLUMBIA)(\W|$)")
-    p("Lacoste", r"(^|\W)(LACOSTE)(\W|$)")
-    p("Chanel", r"(^|\W)(CHANEL)(\W|$)")
-    p("Dior", r"(^|\W)(DIOR)(\W|$)")
-    p("Yves Saint Laurent", r"(^|\W)(YVES\s?SAINT\s?LAURENT|YSL)(\W|$)")
-    p("Paco Rabanne", r"(^|\W)(PACO\s?RABANNE)(\W|$)")
-    p("Calvin Klein", r"(^|\W)(CALVIN\s?KLEIN|CK)(\W|$)")
-    p("Armani", r"(^|\W)(ARMANI|GIORGIO\s?ARMANI)(\W|$)")
-    p("Versace", r"(^|\W)(VERSACE)(\W|$)")
-    p("Carolina Herrera", r"(^|\W)(CAROLINA\s?HERRERA)(\W|$)")
-    p("Jean Paul Gaultier", r"(^|\W)(JEAN\s?PAUL\s?GAULTIER)(\W|$)")
-    p("Tom Ford", r"(^|\W)(TOM\s?FORD)(\W|$)")
-    p("Hugo Boss", r"(^|\W)(HUGO\s?BOSS)(\W|$)")
-    p("Givenchy", r"(^|\W)(GIVENCHY)(\W|$)")
-    p("Burberry", r"(^|\W)(BURBERRY)(\W|$)")
-    p("Lancome", r"(^|\W)(LANCOME|LANCÔME)(\W|$)")
-    p("Hermes", r"(^|\W)(HERMES|HERMÈS)(\W|$)")
-    p("Montblanc", r"(^|\W)(MONTBLANC)(\W|$)")
-    p("Victoria's Secret", r"(^|\W)(VICTORIA\'S\s?SECRET|VICTORIAS\s?SECRET)(\W|$)")
-    p("LOreal", r"(^|\W)(L\'OREAL|LOREAL)(\W|$)")
-    p("Nivea", r"(^|\W)(NIVEA)(\W|$)")
-    p("Dove", r"(^|\W)(DOVE)(\W|$)")
-    p("Axe", r"(^|\W)(AXE)(\W|$)")
-    p("Old Spice", r"(^|\W)(OLD\s?SPICE)(\W|$)")
-    # Comida / bebidas / cadenas
-    p("McDonald's", r"(^|\W)(MCDONALD\'S|MCDONALDS)(\W|$)")
-    p("Burger King", r"(^|\W)(BURGER\s?KING)(\W|$)")
-    p("KFC", r"(^|\W)(KFC|KENTUCKY\s?FRIED\s?CHICKEN)(\W|$)")
-    p("Subway", r"(^|\W)(SUBWAY)(\W|$)")
-    p("Starbucks", r"(^|\W)(STARBUCKS)(\W|$)")
-    p("Domino's", r"(^|\W)(DOMINO\'S|DOMINOS)(\W|$)")
-    p("Pizza Hut", r"(^|\W)(PIZZA\s?HUT)(\W|$)")
-    p("Taco Bell", r"(^|\W)(TACO\s?BELL)(\W|$)")
-    p("Coca-Cola", r"(^|\W)(COCA\-COLA|COCACOLA|COKE)(\W|$)")
-    p("Pepsi", r"(^|\W)(PEPSI)(\W|$)")
-    # Consolas / gaming plataformas
-    p("Sega", r"(^|\W)(SEGA)(\W|$)")
-    p("Atari", r"(^|\W)(ATARI)(\W|$)")
-    p("GameCube", r"(^|\W)(GAMECUBE)(\W|$)")
-    p("Game Boy", r"(^|\W)(GAME\s?BOY|GBA)(\W|$)")
-    p("Steam", r"(^|\W)(STEAM)(\W|$)")
-    p("Epic Games", r"(^|\W)(EPIC\s?GAMES|EPIC\s?STORE)(\W|$)")
-    p("EA", r"(^|\W)(ELECTRONIC\s?ARTS|EA\s?GAMES)(\W|$)")
-    p("Ubisoft", r"(^|\W)(UBISOFT)(\W|$)")
-    p("Rockstar", r"(^|\W)(ROCKSTAR\s?GAMES)(\W|$)")
-    p("Bethesda", r"(^|\W)(BETHESDA)(\W|$)")
-    p("PSN", r"(^|\W)(PSN|PLAYSTATION\s?NETWORK)(\W|$)")
-    # Operadores móviles
-    p("Verizon", r"(^|\W)(VERIZON)(\W|$)")
-    p("AT&T", r"(^|\W)(AT\&T|ATT)(\W|$)")
-    p("T-Mobile", r"(^|\W)(T\-?MOBILE)(\W|$)")
-    p("Sprint", r"(^|\W)(SPRINT)(\W|$)")
-    p("Vodafone", r"(^|\W)(VODAFONE)(\W|$)")
-    p("Orange", r"(^|\W)(ORANGE)(\W|$)")
-    p("Movistar", r"(^|\W)(MOVISTAR)(\W|$)")
-    p("Claro", r"(^|\W)(CLARO)(\W|$)")
-    p("Telcel", r"(^|\W)(TELCEL)(\W|$)")
-    # Sistemas operativos
-    p("Ubuntu", r"(^|\W)(UBUNTU)(\W|$)")
-    p("Debian", r"(^|\W)(DEBIAN)(\W|$)")
-    p("Fedora", r"(^|\W)(FEDORA)(\W|$)")
-    p("Red Hat", r"(^|\W)(RED\s?HAT)(\W|$)")
-    p("CentOS", r"(^|\W)(CENTOS)(\W|$)")
-    return patterns
-
-
-def classify_brand(text, patterns):
+
+CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "marcas.csv")
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "marcas")
+# Subir al cambiar el formato del índice guardado en caché
+VERSION_MATCHER = 2
+
+
+def cargar_catalogo(path=CATALOGO):
+    """
+    Catálogo de marcas (CSV: prioridad,categoria,marca,alias) como
+    [(marca, [alias, ...])] en orden de prioridad. Los alias son fragmentos
+    de regex separados por '|'; ante varias marcas en un texto gana la de
+    menor prioridad.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        filas = list(csv.DictReader(f))
+    prioridades = [int(r["prioridad"]) for r in filas]
+    if len(set(prioridades)) != len(prioridades):
+        raise ValueError(f"Prioridades repetidas en el catálogo: {path}")
+    filas = [r for _, r in sorted(zip(prioridades, filas), key=lambda x: x[0])]
+    return [(r["marca"], r["alias"].split("|")) for r in filas]
+
+
+def build_brand_patterns(catalogo=CATALOGO):
+    return [
+        (marca, re.compile(PREFIJO_PATRON + "|".join(alias) + SUFIJO_PATRON, re.IGNORECASE))
+        for marca, alias in cargar_catalogo(catalogo)
+    ]
+
+
+# Cada patrón de build_brand_patterns() tiene la forma (^|\W)(ALIAS|...)(\W|$)
+PREFIJO_PATRON = r"(^|\W)("
+SUFIJO_PATRON = r")(\W|$)"
+
+
+def _fuente_alternancia(grupos):
+    # grupos: [(indice_patron, [alias, ...]), ...] en orden de prioridad.
+    # (?!\w) equivale al borde (\W|$) pero sin consumir caracteres.
+    partes = [f"({'|'.join(alias)})" for _, alias in grupos]
+    return r"(?:" + "|".join(partes) + r")(?!\w)"
+
+
+_PALABRA = re.compile(r"\w+")
+
+
+def _expandir_alias(alias):
+    r"""
+    Todas las cadenas que puede reconocer un alias de build_brand_patterns()
+    (literales, escapes, clases [..] y '?'), con \s como un espacio.
+    None si el alias usa otra sintaxis.
+    """
+    atomos = []
+    i = 0
+    while i < len(alias):
+        c = alias[i]
+        if c == "\\":
+            e = alias[i + 1:i + 2]
+            if e == "s":
+                atomos.append([" "])
+            elif e and not e.isalnum():
+                atomos.append([e])
+            else:
+                return None
+            i += 2
+        elif c == "[":
+            j = alias.find("]", i)
+            clase = alias[i + 1:j]
+            if j < 0 or not clase.isalnum():
+                return None
+            atomos.append(list(clase))
+            i = j + 1
+        elif c == "?" and atomos:
+            atomos[-1] = atomos[-1] + [""]
+            i += 1
+        elif c.isalnum() or c in "_'&-":
+            atomos.append([c])
+            i += 1
+        else:
+            return None
+    return {"".join(p) for p in itertools.product(*atomos)}
+
+
+def _requisitos_palabras(alias_por_patron):
+    r"""
+    Filtro previo por palabras: un alias solo puede aparecer si todas sus
+    palabras (\w+, en minúsculas) están entre las palabras del texto, porque
+    el alias va entre bordes de palabra. Devuelve {palabra clave: [conjuntos
+    de palabras requeridos]} indexado por la palabra más larga de cada
+    variante, o None si algún alias no se puede expandir.
+    """
+    requisitos = {}
+    for alias in alias_por_patron:
+        for a in alias:
+            variantes = _expandir_alias(a)
+            if variantes is None:
+                return None
+            for v in variantes:
+                palabras = frozenset(_PALABRA.findall(v.lower()))
+                if not palabras:
+                    return None
+                requisitos.setdefault(max(palabras, key=len), []).append(palabras)
+    return requisitos
+
+
+def _indice_alias(marcas):
+    """
+    Índice de una sola pasada sobre los alias de [(marca, [alias, ...])],
+    solo con tipos JSON (se guarda en caché). Los alias se agrupan por su
+    primer carácter; al recorrer el texto solo se prueban, en cada inicio de
+    palabra, los alias que empiezan por esa letra.
+    """
+    labels = []
+    por_inicial = {}
+    todos = []
+    for i, (label, alias) in enumerate(marcas):
+        for a in alias:
+            if not a[:1].isalnum():
+                raise ValueError(f"Alias sin inicial literal para '{label}': {a}")
+            grupo = por_inicial.setdefault(a[0].lower(), [])
+            if grupo and grupo[-1][0] == i:
+                grupo[-1][1].append(a)
+            else:
+                grupo.append((i, [a]))
+        todos.append((i, alias))
+        labels.append(label)
+    requisitos = _requisitos_palabras(alias for _, alias in todos)
+    return {
+        "labels": labels,
+        # Todos los alias empiezan por un carácter de palabra, así que el
+        # borde (^|\W) equivale a un inicio de palabra: (?<!\w)\w
+        "iniciales": "".join(sorted(por_inicial)),
+        "por_inicial": por_inicial,
+        # Para iniciales no ASCII cuyo plegado de mayúsculas no coincide con lower()
+        "completo": todos,
+        "requisitos": (
+            None if requisitos is None
+            else {k: [sorted(req) for req in reqs] for k, reqs in requisitos.items()}
+        ),
+    }
+
+
+def _matcher_desde_indice(indice):
+    # Las alternancias por inicial se compilan la primera vez que se usan
+    # (_cubo), así que un archivo pequeño solo paga las que necesita
+    requisitos = indice["requisitos"]
+    if requisitos is not None:
+        requisitos = {k: [frozenset(req) for req in reqs] for k, reqs in requisitos.items()}
+    iniciales = "".join(re.escape(c) for c in indice["iniciales"])
+    return {
+        "labels": indice["labels"],
+        "inicios": re.compile(r"(?<!\w)[" + iniciales + "]", re.IGNORECASE),
+        "grupos": {**indice["por_inicial"], None: indice["completo"]},
+        "por_inicial": {},
+        "restos": {},
+        "requisitos": requisitos,
+        "claves": frozenset(requisitos) if requisitos is not None else None,
+    }
+
+
+def _cubo(matcher, clave):
+    # (regex compilada, índices de patrón) de la inicial clave (None: todos los alias)
+    grupos = matcher["grupos"].get(clave)
+    if grupos is None:
+        return None
+    cubo = (re.compile(_fuente_alternancia(grupos), re.IGNORECASE), [i for i, _ in grupos])
+    matcher["por_inicial"][clave] = cubo
+    return cubo
+
+
+def _resto(matcher, clave, desde):
+    # Alternancia de los grupos desde..fin de un cubo: las marcas de menor
+    # prioridad que aún pueden empezar en la misma posición
+    rx = matcher["restos"].get((clave, desde))
+    if rx is None:
+        rx = re.compile(_fuente_alternancia(matcher["grupos"][clave][desde:]), re.IGNORECASE)
+        matcher["restos"][(clave, desde)] = rx
+    return rx
+
+
+def build_brand_matcher(patterns):
+    """Matcher a partir de patrones compilados (build_brand_patterns()), sin caché."""
+    marcas = []
+    for label, rx in patterns:
+        fuente = rx.pattern
+        if not (fuente.startswith(PREFIJO_PATRON) and fuente.endswith(SUFIJO_PATRON)):
+            raise ValueError(f"Patrón con formato inesperado para '{label}': {fuente}")
+        marcas.append((label, fuente[len(PREFIJO_PATRON):-len(SUFIJO_PATRON)].split("|")))
+    return _matcher_desde_indice(_indice_alias(marcas))
+
+
+def load_brand_matcher(catalogo=CATALOGO, cache_dir=CACHE_DIR):
+    """
+    Matcher del catálogo usando el índice guardado en cache_dir. El archivo
+    lleva en el nombre el sha256 del catálogo y VERSION_MATCHER, así que
+    solo se reconstruye cuando cambia alguno de los dos. Si la caché no se
+    puede escribir se trabaja igual, solo en memoria.
+    """
+    with open(catalogo, "rb") as f:
+        huella = hashlib.sha256(f.read()).hexdigest()
+    ruta = os.path.join(cache_dir, f"matcher-v{VERSION_MATCHER}-{huella[:24]}.json") if cache_dir else None
+    if ruta:
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                indice = json.load(f)
+            if indice.get("version") == VERSION_MATCHER and indice.get("catalogo") == huella:
+                return _matcher_desde_indice(indice)
+        except (OSError, ValueError, KeyError):
+            pass
+    indice = _indice_alias(cargar_catalogo(catalogo))
+    indice.update(version=VERSION_MATCHER, catalogo=huella)
+    if ruta:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{ruta}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(indice, f, ensure_ascii=False)
+            os.replace(tmp, ruta)
+        except OSError:
+            pass
+    return _matcher_desde_indice(indice)
+
+
+def _puede_tener_marca(text, matcher):
+    # Falso solo si ninguna variante de alias tiene todas sus palabras en el
+    # texto. Con caracteres no ASCII se clasifica siempre (IGNORECASE pliega
+    # algunos, p. ej. "K" de Kelvin, a letras ASCII).
+    claves = matcher["claves"]
+    if claves is None or not text.isascii():
+        return True
+    palabras = set(_PALABRA.findall(text.lower()))
+    requisitos = matcher["requisitos"]
+    for clave in claves.intersection(palabras):
+        for req in requisitos[clave]:
+            if req <= palabras:
+                return True
+    return False
+
+
+def _indice_marca(text, matcher):
+    # Índice del patrón de mayor prioridad presente en text (len(labels) si ninguno)
+    labels = matcher["labels"]
+    por_inicial = matcher["por_inicial"]
+    # En cada inicio de palabra la alternancia devuelve la marca de mayor
+    # prioridad que empieza ahí; el mínimo sobre todas las posiciones es la
+    # misma etiqueta que da el orden secuencial (incluye alias solapados,
+    # p. ej. "Ford" dentro de "Tom Ford").
+    mejor = len(labels)
+    for m in matcher["inicios"].finditer(text):
+        c = m.group()
+        clave = c.lower() if c.isascii() else None
+        cubo = por_inicial.get(clave)
+        if cubo is None:
+            cubo = _cubo(matcher, clave)
+            if cubo is None:
+                continue
+        rx, indices = cubo
+        hit = rx.match(text, m.start())
+        if hit is not None:
+            idx = indices[hit.lastindex - 1]
+            if idx < mejor:
+                mejor = idx
+                if idx == 0:
+                    break
+    return mejor
+
+
+# Matchers construidos para listas de patrones (llamadas con la firma original)
+_MATCHERS_DE_PATRONES = {}
+
+
+def _como_matcher(matcher):
+    """
+    El matcher tal cual, o el equivalente a una lista de patrones de
+    build_brand_patterns() (None si los patrones no tienen esa forma y hay
+    que probarlos uno tras otro).
+    """
+    if isinstance(matcher, dict):
+        return matcher
+    clave = tuple((label, rx.pattern, rx.flags) for label, rx in matcher)
+    if clave not in _MATCHERS_DE_PATRONES:
+        try:
+            if not all(rx.flags & re.IGNORECASE for _, rx in matcher):
+                raise ValueError("patrones sin IGNORECASE")
+            _MATCHERS_DE_PATRONES[clave] = build_brand_matcher(matcher)
+        except ValueError:
+            _MATCHERS_DE_PATRONES[clave] = None
+    return _MATCHERS_DE_PATRONES[clave]
+
+
+def classify_brand(text, matcher):
+    """
+    Marca de mayor prioridad en text, o "sin marca". matcher es el de
+    load_brand_matcher()/build_brand_matcher(); también se acepta, como
+    antes, la lista de patrones de build_brand_patterns().
+    """
+    if not isinstance(matcher, dict):
+        patrones = matcher
+        matcher = _como_matcher(patrones)
+        if matcher is None:
+            return classify_brand_secuencial(text, patrones)
+    if not text or not _puede_tener_marca(text, matcher):
+        return "sin marca"
+    mejor = _indice_marca(text, matcher)
+    labels = matcher["labels"]
+    if mejor < len(labels):
+        return labels[mejor]
+    return "sin marca"
+
+
+def find_brands(text, matcher):
+    """
+    Todas las marcas del texto con su posición: [(código, inicio, fin), ...]
+    en orden de aparición, con código = índice en brand_labels(matcher).
+    Una marca está presente cuando su patrón de build_brand_patterns()
+    aparece en el texto (como en la búsqueda secuencial, pero sin parar en
+    la primera); cada aparición es una mención. En un mismo inicio de
+    palabra pueden empezar varias marcas ("HBO Max" también es "HBO").
+    """
+    if not text or not _puede_tener_marca(text, matcher):
+        return []
+    por_inicial = matcher["por_inicial"]
+    encontradas = []
+    for m in matcher["inicios"].finditer(text):
+        c = m.group()
+        clave = c.lower() if c.isascii() else None
+        cubo = por_inicial.get(clave)
+        if cubo is None:
+            cubo = _cubo(matcher, clave)
+            if cubo is None:
+                continue
+        rx, indices = cubo
+        pos = m.start()
+        hit = rx.match(text, pos)
+        base = 0
+        while hit is not None:
+            g = base + hit.lastindex - 1
+            encontradas.append((indices[g], pos, hit.end()))
+            base = g + 1
+            if base == len(indices):
+                break
+            hit = _resto(matcher, clave, base).match(text, pos)
+    return encontradas
+
+
+class ConteoMarcas:
+    """
+    Conteos acumulados por marca (tweets que la mencionan y menciones) y por
+    par de marcas en el mismo tweet. Las marcas son códigos enteros y los
+    pares un Counter disperso con clave a·n + b (a < b), así que la memoria
+    depende del catálogo y de los pares vistos, no del número de tweets.
+    Se combinan con combinar() (p. ej. los resultados de cada proceso).
+    """
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.tweets_total = 0
+        self.tweets_con_marca = 0
+        self.tweets = array("Q", [0]) * len(self.labels)
+        self.menciones = array("Q", [0]) * len(self.labels)
+        self.pares = Counter()
+
+    def agregar(self, encontradas):
+        self.tweets_total += 1
+        if not encontradas:
+            return
+        self.tweets_con_marca += 1
+        for codigo, _, _ in encontradas:
+            self.menciones[codigo] += 1
+        codigos = sorted({codigo for codigo, _, _ in encontradas})
+        for codigo in codigos:
+            self.tweets[codigo] += 1
+        n = len(self.labels)
+        for i, a in enumerate(codigos):
+            for b in codigos[i + 1:]:
+                self.pares[a * n + b] += 1
+
+    def combinar(self, otro):
+        self.tweets_total += otro.tweets_total
+        self.tweets_con_marca += otro.tweets_con_marca
+        for i in range(len(self.labels)):
+            self.tweets[i] += otro.tweets[i]
+            self.menciones[i] += otro.menciones[i]
+        self.pares.update(otro.pares)
+
+    def escribir(self, path):
+        """marca,tweets,menciones,porcentaje en path y marca_a,marca_b,tweets en <path>_pares.csv."""
+        base, ext = os.path.splitext(path)
+        ruta_pares = f"{base}_pares{ext or '.csv'}"
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["marca", "tweets", "menciones", "porcentaje"])
+            orden = sorted(range(len(self.labels)), key=lambda i: (-self.tweets[i], i))
+            for i in orden:
+                if self.menciones[i]:
+                    pct = 100.0 * self.tweets[i] / self.tweets_total if self.tweets_total else 0.0
+                    writer.writerow([self.labels[i], self.tweets[i], self.menciones[i], f"{pct:.4f}"])
+        n = len(self.labels)
+        with open(ruta_pares, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["marca_a", "marca_b", "tweets"])
+            for clave, cuenta in sorted(self.pares.items(), key=lambda kv: (-kv[1], kv[0])):
+                writer.writerow([self.labels[clave // n], self.labels[clave % n], cuenta])
+        return ruta_pares
+
+
+def brand_labels(matcher):
+    """Etiquetas por código de classify_brands; el último código es "sin marca"."""
+    return matcher["labels"] + ["sin marca"]
+
+
+def classify_brands(texts, matcher):
+    """
+    Clasifica un lote de textos y devuelve un array('H') de códigos
+    (índices en brand_labels(matcher)), con la misma etiqueta que
+    classify_brand para cada texto. El filtro por palabras descarta en
+    bloque los textos sin ninguna marca posible; solo el resto pasa por el
+    recorrido por inicios de palabra.
+    """
+    sin_marca = len(matcher["labels"])
+    codigos = array("H", [sin_marca]) * len(texts)
+    claves = matcher["claves"]
+    requisitos = matcher["requisitos"]
+    palabras_de = _PALABRA.findall
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        if claves is not None and text.isascii():
+            palabras = set(palabras_de(text.lower()))
+            comunes = claves.intersection(palabras)
+            if not comunes:
+                continue
+            if not any(req <= palabras for clave in comunes for req in requisitos[clave]):
+                continue
+        codigos[i] = _indice_marca(text, matcher)
+    return codigos
+
+
+def classify_brand_secuencial(text, patterns):
+    # Implementación original (un regex tras otro); se conserva como referencia
+    # para validar y comparar con classify_brand.
     if not text:
         return "sin marca"
     for label, rx in patterns:
@@ -329,8 +504,300 @@ def detect_header_and_indices(header_row):
         return False, 1, 4, 5
 
 
-def process_csv(path, output, preserve_all_columns=False, inplace=False):
-    patterns = build_brand_patterns()
+COLUMNAS_MULTIMARCA = ["Marcas", "Posiciones"]
+
+
+def _columnas_multimarca(encontradas, etiquetas):
+    # "Apple|Samsung" (sin repetir, en orden de aparición) y "Apple:0-6;Samsung:10-16"
+    marcas = "|".join(dict.fromkeys(etiquetas[c] for c, _, _ in encontradas))
+    posiciones = ";".join(f"{etiquetas[c]}:{a}-{b}" for c, a, b in encontradas)
+    return [marcas, posiciones]
+
+
+def filas_salida(rows, matcher, ids_idx, user_idx, text_idx, preserve_all_columns, multimarca=False, conteo=None):
+    # Filas a escribir para un lote; se omiten las que no tienen las columnas necesarias.
+    # Con multimarca se agregan Marcas y Posiciones; con conteo (ConteoMarcas)
+    # se acumulan las menciones del lote.
+    minimo = max(ids_idx, user_idx, text_idx)
+    validas = [row for row in rows if len(row) > minimo]
+    etiquetas = brand_labels(matcher)
+    textos = [row[text_idx] for row in validas]
+    if not multimarca and conteo is None:
+        codigos = classify_brands(textos, matcher)
+        extras = [[etiquetas[c]] for c in codigos]
+    else:
+        sin_marca = len(etiquetas) - 1
+        extras = []
+        for text in textos:
+            encontradas = find_brands(text, matcher)
+            if conteo is not None:
+                conteo.agregar(encontradas)
+            # Marca sigue siendo la de mayor prioridad, como en classify_brand
+            marca = etiquetas[min((c for c, _, _ in encontradas), default=sin_marca)]
+            extras.append([marca] + _columnas_multimarca(encontradas, etiquetas) if multimarca else [marca])
+    if preserve_all_columns:
+        return [row + extra for row, extra in zip(validas, extras)]
+    return [[row[ids_idx], row[user_idx], row[text_idx]] + extra for row, extra in zip(validas, extras)]
+
+
+def _progreso(antes, despues):
+    if despues // 100000 > antes // 100000:
+        print(f"Progreso: {despues} filas escritas...")
+
+
+def fin_de_registro(f, pos):
+    """
+    Devuelve el offset justo después del primer salto de línea, a partir de
+    pos, que no está dentro de un campo entre comillas (pos debe ser inicio de registro).
+    """
+    f.seek(pos)
+    dentro = 0
+    while True:
+        buf = f.read(1 << 16)
+        if not buf:
+            return pos
+        j = 0
+        while True:
+            k = buf.find(b"\n", j)
+            if k < 0:
+                dentro ^= buf.count(b'"', j) & 1
+                pos += len(buf)
+                break
+            dentro ^= buf.count(b'"', j, k) & 1
+            j = k + 1
+            if not dentro:
+                return pos + j
+
+
+def dividir_en_rangos(path, inicio, tam_bloque, hasta=None):
+    """
+    Divide [inicio, EOF) en rangos de ~tam_bloque bytes alineados a registros.
+    Cada corte se hace en el primer salto de línea fuera de comillas tras el
+    objetivo; la paridad de comillas se arrastra desde inicio (las comillas
+    escapadas "" no la alteran). Con hasta (un fin de registro) se corta ahí.
+    """
+    rangos = []
+    with open(path, "rb") as f:
+        f.seek(inicio)
+        base = inicio   # offset absoluto de buf[0]
+        corte = inicio  # inicio del rango en curso
+        dentro = 0
+        while True:
+            buf = f.read(1 << 22)
+            if not buf:
+                break
+            j = 0
+            while True:
+                objetivo = corte + tam_bloque - base
+                if objetivo >= len(buf):
+                    dentro ^= buf.count(b'"', j) & 1
+                    break
+                if objetivo > j:
+                    dentro ^= buf.count(b'"', j, objetivo) & 1
+                    j = objetivo
+                k = buf.find(b"\n", j)
+                if k < 0:
+                    dentro ^= buf.count(b'"', j) & 1
+                    break
+                dentro ^= buf.count(b'"', j, k) & 1
+                j = k + 1
+                if not dentro:
+                    rangos.append((corte, base + j))
+                    corte = base + j
+            base += len(buf)
+        if base > corte:
+            rangos.append((corte, base))
+    if hasta is not None:
+        rangos = [(a, min(b, hasta)) for a, b in rangos if a < hasta]
+    return rangos
+
+
+_MATCHER_WORKER = None
+LOTE_FILAS = 1 << 15
+
+
+def _init_worker(catalogo):
+    global _MATCHER_WORKER
+    _MATCHER_WORKER = load_brand_matcher(catalogo)
+
+
+def _clasificar_rango(tarea):
+    path, inicio, fin, indices, preserve_all_columns, multimarca, con_conteo = tarea
+    with open(path, "rb") as f:
+        f.seek(inicio)
+        datos = f.read(fin - inicio).decode("ISO-8859-1")
+    reader = csv.reader(io.StringIO(datos, newline=""), delimiter=",", quotechar='"')
+    salida = io.StringIO(newline="")
+    writer = csv.writer(salida, delimiter=",", quotechar='"')
+    conteo = ConteoMarcas(_MATCHER_WORKER["labels"]) if con_conteo else None
+    leidas = 0
+    escritas = 0
+    while True:
+        rows = list(itertools.islice(reader, LOTE_FILAS))
+        if not rows:
+            break
+        leidas += len(rows)
+        out = filas_salida(rows, _MATCHER_WORKER, *indices, preserve_all_columns, multimarca, conteo)
+        writer.writerows(out)
+        escritas += len(out)
+    return salida.getvalue(), leidas, escritas, conteo
+
+
+def _process_csv_paralelo(
+    path,
+    writer,
+    preserve_all_columns,
+    workers,
+    catalogo=CATALOGO,
+    multimarca=False,
+    conteo=None,
+    desde=None,
+    hasta=None,
+    etapas=None,
+):
+    # La primera fila se resuelve aquí (detección de encabezado) y el resto
+    # del archivo se reparte en rangos de bytes entre los procesos. Con desde
+    # (retomando un checkpoint) solo se procesa [desde, hasta) y no se
+    # escribe encabezado.
+    with open(path, "rb") as fb:
+        fin_primera = fin_de_registro(fb, 0)
+        fb.seek(0)
+        primera = fb.read(fin_primera).decode("ISO-8859-1")
+    rows = list(csv.reader(io.StringIO(primera, newline=""), delimiter=",", quotechar='"'))
+    if not rows:
+        return 0, 0
+    row = rows[0]
+    header_detected, ids_idx, user_idx, text_idx = detect_header_and_indices(row)
+    inicio = 0
+    if desde is not None:
+        inicio = desde
+    elif header_detected:
+        inicio = fin_primera
+        if preserve_all_columns:
+            writer.writerow(row + ["Marca"] + (COLUMNAS_MULTIMARCA if multimarca else []))
+
+    tamano = os.path.getsize(path) if hasta is None else hasta
+    tam_bloque = min(32 << 20, max(1 << 20, (tamano - inicio) // (workers * 4) + 1))
+    indices = (ids_idx, user_idx, text_idx)
+    tareas = [
+        (path, a, b, indices, preserve_all_columns, multimarca, conteo is not None)
+        for a, b in dividir_en_rangos(path, inicio, tam_bloque, hasta)
+    ]
+
+    total = 1 if header_detected and desde is None else 0
+    written = 0
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(catalogo,)) as pool:
+        # imap conserva el orden original de los rangos
+        resultados = pool.imap(_clasificar_rango, tareas)
+        if etapas is not None:
+            resultados = etapas.timed(pipeline.WORKERS, resultados)
+        for texto, leidas, escritas, conteo_rango in resultados:
+            writer.write(texto)
+            total += leidas
+            _progreso(written, written + escritas)
+            written += escritas
+            if conteo is not None:
+                conteo.combinar(conteo_rango)
+    return total, written
+
+
+def _process_columnar(path, writer, preserve_all_columns, catalogo=CATALOGO, multimarca=False, conteo=None, etapas=None):
+    # Lee solo las columnas necesarias del formato columnar (.cols)
+    matcher = load_brand_matcher(catalogo)
+    written = 0
+    with columnar.ColumnarTable(path) as table:
+        total = table.rows
+        if table.header:
+            total += 1
+        if preserve_all_columns:
+            columnas = list(columnar.COLUMNS)
+            if table.header:
+                writer.writerow(columnas + ["Marca"] + (COLUMNAS_MULTIMARCA if multimarca else []))
+            indices = (columnas.index("ids"), columnas.index("user"), columnas.index("text"))
+        else:
+            columnas = ["ids", "user", "text"]
+            indices = (0, 1, 2)
+        filas = table.iter_rows(columnas)
+        etapas = etapas or pipeline.StageTimes()
+        while True:
+            with etapas.measure(pipeline.READ):
+                rows = [list(r) for r in itertools.islice(filas, LOTE_FILAS)]
+            if not rows:
+                break
+            with etapas.measure(pipeline.COMPUTE):
+                out = filas_salida(rows, matcher, *indices, preserve_all_columns, multimarca, conteo)
+            writer.writerows(out)
+            _progreso(written, written + len(out))
+            written += len(out)
+    return total, written
+
+
+def _process_features(path, db_path, writer, etapas=None):
+    # La marca ya está en la tabla de características (features.py); del
+    # archivo solo se leen ids, usuario y texto, sin clasificar de nuevo
+    import sqlite3
+
+    written = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        features.require(conn, "brand")
+        if not features.matches_source(conn, path):
+            print(f"ERROR: {db_path} no se calculó sobre {path} (o el archivo cambió)", file=sys.stderr)
+            sys.exit(1)
+        marcas = conn.execute("SELECT row, brand FROM f_brand ORDER BY row")
+        # zip_longest: una tabla con filas de más o de menos es un error, no un corte
+        pares = itertools.zip_longest(features.iter_tweets(path, "ISO-8859-1"), marcas)
+        if etapas is not None:
+            pares = etapas.timed(pipeline.READ, pares)
+        lote = []
+        for tweet, par in pares:
+            if tweet is None:
+                print(f"ERROR: {db_path} tiene marcas para filas que {path} no tiene (fila {par[0]})", file=sys.stderr)
+                sys.exit(1)
+            if par is None or par[0] != tweet.row:
+                print(f"ERROR: {db_path} no tiene marca para la fila {tweet.row}", file=sys.stderr)
+                sys.exit(1)
+            marca = par[1]
+            lote.append([tweet.id, tweet.user, tweet.text, marca])
+            if len(lote) == LOTE_FILAS:
+                writer.writerows(lote)
+                _progreso(written, written + len(lote))
+                written += len(lote)
+                lote = []
+        writer.writerows(lote)
+        written += len(lote)
+    finally:
+        conn.close()
+    return written, written
+
+
+def _opciones_checkpoint(preserve_all_columns, multimarca, catalogo):
+    # Todo lo que cambia las filas de salida; otro valor obliga a reprocesar
+    with open(catalogo, "rb") as f:
+        huella = hashlib.sha256(f.read()).hexdigest()
+    return {
+        "herramienta": "marcas",
+        "preserve_all_columns": preserve_all_columns,
+        "multimarca": multimarca,
+        "catalogo": huella,
+        "version_matcher": VERSION_MATCHER,
+    }
+
+
+def process_csv(
+    path,
+    output,
+    preserve_all_columns=False,
+    inplace=False,
+    workers=1,
+    features_db=None,
+    catalogo=CATALOGO,
+    multimarca=False,
+    conteos=None,
+    incremental=False,
+    tiempos=False,
+    etapas=None,
+):
     total = 0
     written = 0
     header_detected = False
@@ -338,7 +805,7 @@ def process_csv(path, output, preserve_all_columns=False, inplace=False):
     user_idx = 4
     text_idx = 5
 
-    if not os.path.exists(path):
+    if not os.path.exists(compressed.split_zip_member(path)[0]):
         print(f"ERROR: no existe el archivo de entrada: {path}", file=sys.stderr)
         sys.exit(1)
 
@@ -350,52 +817,128 @@ def process_csv(path, output, preserve_all_columns=False, inplace=False):
     # Si vamos a preservar todas las columnas y modificar in-place, usamos la misma codificación del archivo fuente
     out_encoding = "ISO-8859-1" if preserve_all_columns else "UTF-8"
 
+    if features_db and (inplace or preserve_all_columns or multimarca or conteos):
+        print("ERROR: --features solo produce ids,user,text,Marca (sin --inplace, --preserve_all_columns, --multimarca ni --conteos)", file=sys.stderr)
+        sys.exit(1)
+
+    encabezado = ["ids", "user", "text", "Marca"] + (COLUMNAS_MULTIMARCA if multimarca else [])
+    conteo = ConteoMarcas(load_brand_matcher(catalogo)["labels"]) if conteos else None
+
+    es_columnar = columnar.is_columnar(path)
+    if es_columnar and inplace:
+        print("ERROR: --inplace no aplica a una entrada columnar (.cols)", file=sys.stderr)
+        sys.exit(1)
+    comprimido = not es_columnar and compressed.is_compressed(path)
+    if comprimido and inplace:
+        print("ERROR: --inplace no aplica a una entrada comprimida; use --output", file=sys.stderr)
+        sys.exit(1)
+    if comprimido and workers > 1:
+        # Los rangos de bytes solo existen en el archivo sin comprimir
+        print("Entrada comprimida: se procesa en un solo proceso (la descompresión va en otro hilo)", file=sys.stderr)
+        workers = 1
+
+    retomado = None
+    if incremental:
+        if inplace or features_db or conteos or es_columnar or comprimido:
+            print(
+                "ERROR: --incremental necesita un CSV sin comprimir como entrada "
+                "(sin --inplace, --features ni --conteos)",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        opciones = _opciones_checkpoint(preserve_all_columns, multimarca, catalogo)
+        retomado = checkpoint.resume(output, path, opciones)
+        # Solo registros completos: uno a medio agregar se toma en la próxima pasada
+        hasta, ultimo = checkpoint.scan_records(path, retomado.offset if retomado else 0)
+        if retomado is not None and hasta == retomado.offset:
+            print(f"Sin filas nuevas desde el último checkpoint ({retomado.rows} filas leídas). Salida: {output}")
+            return
+    else:
+        hasta = None
+        checkpoint.remove(output)
+    desde = retomado.offset if retomado else None
+    agregar = retomado is not None
+
     tmp_output = output
     if inplace:
         base_dir = os.path.dirname(path)
         base_name = os.path.basename(path)
         tmp_output = os.path.join(base_dir, f".{base_name}.tmp")
 
-    with open(path, "r", encoding="ISO-8859-1", newline="") as fin, \
-         open(tmp_output, "w", encoding=out_encoding, newline="") as fout:
-        reader = csv.reader(fin, delimiter=",", quotechar='"')
-        writer = csv.writer(fout, delimiter=",", quotechar='"')
-
-        first = True
-        # header de salida
-        if not preserve_all_columns:
+    # Lectura y clasificación en este hilo; el formateo CSV y la escritura en
+    # el hilo de AsyncWriter, con una cola acotada de lotes entre ambos
+    # etapas (pipeline.StageTimes) permite leer los tiempos desde otro script
+    if etapas is None:
+        etapas = pipeline.StageTimes()
+    t_inicio = time.perf_counter()
+    with compressed.open_output(tmp_output, out_encoding, append=agregar) as fout, \
+         pipeline.AsyncWriter(fout, etapas, delimiter=",", quotechar='"') as writer:
+        if features_db:
             writer.writerow(["ids", "user", "text", "Marca"])
+            total, written = _process_features(path, features_db, writer, etapas)
+        elif es_columnar:
+            if not preserve_all_columns:
+                writer.writerow(encabezado)
+            total, written = _process_columnar(path, writer, preserve_all_columns, catalogo, multimarca, conteo, etapas)
+        elif workers > 1:
+            if not preserve_all_columns and not agregar:
+                writer.writerow(encabezado)
+            total, written = _process_csv_paralelo(
+                path, writer, preserve_all_columns, workers, catalogo, multimarca, conteo, desde, hasta, etapas
+            )
+        else:
+            matcher = load_brand_matcher(catalogo)
+            with mmap_csv.open_csv(path, encoding="ISO-8859-1") as fin:
+                # header de salida
+                if not preserve_all_columns and not agregar:
+                    writer.writerow(encabezado)
 
-        for row in reader:
-            total += 1
-            if first:
-                first = False
-                header_detected, ids_idx, user_idx, text_idx = detect_header_and_indices(row)
-                if header_detected:
-                    # escribir encabezado preservado + Marca si se preservan todas las columnas
-                    if preserve_all_columns:
-                        writer.writerow(row + ["Marca"])
-                        continue
-                    # si no preservamos todo, no escribir la fila de encabezado de entrada como dato
-                    continue
-
-            if len(row) <= max(ids_idx, user_idx, text_idx):
-                continue
-            text = row[text_idx]
-            marca = classify_brand(text, patterns)
-            if preserve_all_columns:
-                writer.writerow(row + [marca])
-            else:
-                ids = row[ids_idx]
-                user = row[user_idx]
-                writer.writerow([ids, user, text, marca])
-            written += 1
+                inicio = 0
+                primera, fin_primera = fin.first_record()
+                if primera:
+                    header_detected, ids_idx, user_idx, text_idx = detect_header_and_indices(primera)
+                    if agregar:
+                        inicio = desde
+                    elif header_detected:
+                        total += 1
+                        inicio = fin_primera
+                        # escribir encabezado preservado + Marca si se preservan todas las columnas
+                        if preserve_all_columns:
+                            writer.writerow(primera + encabezado[3:])
 
-            if written % 100000 == 0:
-                print(f"Progreso: {written} filas escritas...")
+                # Lotes de registros completos (~1 MB) clasificados de una vez
+                for texto, _ in etapas.timed(pipeline.READ, fin.batches(inicio, stop=hasta)):
+                    with etapas.measure(pipeline.READ):
+                        rows = list(csv.reader(io.StringIO(texto, newline=""), delimiter=",", quotechar='"'))
+                    total += len(rows)
+                    with etapas.measure(pipeline.COMPUTE):
+                        out = filas_salida(rows, matcher, ids_idx, user_idx, text_idx, preserve_all_columns, multimarca, conteo)
+                    writer.writerows(out)
+                    _progreso(written, written + len(out))
+                    written += len(out)
+    duracion = time.perf_counter() - t_inicio
 
     print(f"Terminado. Filas leídas: {total}, filas escritas: {written}")
     print(f"Salida: {tmp_output}")
+    if tiempos:
+        print(f"Tiempo por etapa:\n{etapas.report(duracion)}")
+    if incremental:
+        cp = checkpoint.save(
+            output,
+            path,
+            hasta,
+            total + (retomado.rows if agregar else 0),
+            written + (retomado.written if agregar else 0),
+            ultimo,
+            opciones,
+        )
+        print(f"Checkpoint: {checkpoint.checkpoint_path(output)} ({cp.rows} filas leídas en total, offset {cp.offset})")
+    if conteo is not None:
+        ruta_pares = conteo.escribir(conteos)
+        print(
+            f"Conteos por marca: {conteos} ({conteo.tweets_con_marca} de {conteo.tweets_total} tweets con marca), "
+            f"pares: {ruta_pares}"
+        )
 
     # Reemplazo in-place si se especifica
     if inplace:
@@ -408,16 +951,40 @@ def process_csv(path, output, preserve_all_columns=False, inplace=False):
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Exportar columnas y agregar Marca desde CSV (sin Spark)")
-    parser.add_argument("--path", type=str, required=True, help="Ruta del CSV de entrada")
-    parser.add_argument("--output", type=str, default="usuarios_texto_marca.csv", help="Ruta del CSV de salida")
+    parser.add_argument("--path", type=str, required=True, help="Ruta del CSV de entrada (también .gz/.zst o miembro de un .zip) o de su copia columnar (.cols)")
+    parser.add_argument("--output", type=str, default="usuarios_texto_marca.csv", help="Ruta del CSV de salida (.gz/.zst/.zip para comprimirlo)")
     parser.add_argument("--inplace", action="store_true", default=False, help="Modificar el archivo de entrada in-place")
     parser.add_argument("--preserve_all_columns", action="store_true", default=False, help="Preservar todas las columnas y agregar 'Marca' al final")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para clasificar rangos del archivo en paralelo (1 = secuencial)")
+    parser.add_argument("--catalogo", type=str, default=CATALOGO, help="CSV del catálogo de marcas (prioridad,categoria,marca,alias)")
+    parser.add_argument("--multimarca", action="store_true", default=False, help="Agregar columnas Marcas y Posiciones con todas las marcas de cada tweet")
+    parser.add_argument("--conteos", type=str, default="", help="CSV de menciones por marca (y <conteos>_pares.csv con los pares en el mismo tweet)")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Procesar solo las filas agregadas desde la última ejecución y añadirlas a --output (checkpoint en <output>.checkpoint.json)",
+    )
+    parser.add_argument("--tiempos", action="store_true", default=False, help="Mostrar el tiempo de lectura, clasificación y escritura")
+    parser.add_argument("--features", type=str, default="", help="Tabla de características (features.py) con 'brand'; evita volver a clasificar")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    process_csv(args.path, args.output, preserve_all_columns=args.preserve_all_columns, inplace=args.inplace)
+    process_csv(
+        args.path,
+        args.output,
+        preserve_all_columns=args.preserve_all_columns,
+        inplace=args.inplace,
+        workers=args.workers,
+        features_db=args.features or None,
+        catalogo=args.catalogo,
+        multimarca=args.multimarca,
+        conteos=args.conteos or None,
+        incremental=args.incremental,
+        tiempos=args.tiempos,
+    )
 
 
 if __name__ == "__main__":
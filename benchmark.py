@@ -0,0 +1,373 @@
+"""
+Benchmark suite for the tweet tools on synthetic Sentiment140 data.
+
+  benchmark.py generate --rows 100k --output synth.csv
+  benchmark.py run [--sizes 10k,100k,1.6M,16M] [--tools hashtags,marcas,anova] --output results.json
+  benchmark.py compare old.json new.json
+
+The generator is deterministic for a given (rows, seed) and writes the same
+layout as the Kaggle file (every field quoted, latin-1) plus the header of
+the Spark part files the ANOVA reads. Text lengths follow a gamma-shaped
+distribution around 74 characters with a bump near the 140 limit, and
+@mentions, links, hashtags and brand names appear at rates close to the
+real corpus. Generated files are kept in --data-dir and reused.
+
+Each benchmark runs in a fresh process so its peak RSS is its own. The
+results file records rows/s, wall time, peak RSS and the per-phase times
+each tool reports, together with the commit, so two runs can be compared.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+
+ROOT = Path(__file__).resolve().parent
+GENERATOR_VERSION = 1
+RESULTS_VERSION = 1
+DEFAULT_SIZES = "10k,100k"
+TOOLS = ("hashtags", "marcas", "anova")
+HEADER = ["target", "ids", "date", "flag", "user", "text"]
+
+# Rates per tweet, close to Sentiment140
+MENTION_RATE = 0.46
+URL_RATE = 0.05
+HASHTAG_RATE = 0.025
+BRAND_RATE = 0.04
+QUOTE_RATE = 0.01
+LIMIT_RATE = 0.05  # tweets that run into the 140-character limit
+USERS = 660_000
+
+WORDS = (
+    "i", "the", "to", "a", "my", "and", "you", "is", "it", "in", "for", "of", "me", "so", "on",
+    "have", "that", "but", "just", "day", "be", "at", "not", "with", "now", "was", "good", "all",
+    "get", "this", "are", "up", "out", "today", "go", "no", "work", "like", "going", "got", "love",
+    "do", "lol", "can't", "too", "back", "time", "what", "u", "know", "one", "im", "from",
+    "about", "really", "see", "still", "new", "well", "home", "want", "night", "think", "sad", "miss",
+    "oh", "more", "much", "some", "need", "had", "tomorrow", "last", "morning", "haha", "hope", "feel",
+    "off", "sleep", "fun", "great", "there", "again", "tired", "when", "bed", "happy", "wish", "thanks",
+    "why", "how", "sorry", "school", "week", "right", "make", "only", "weekend", "never", "come", "ugh",
+    "gonna", "did", "wait", "hate", "better", "nice", "watching", "already", "tonight", "yeah", "way",
+    "man", "bad", "best", "sick", "everyone", "hey", "awesome", "amazing", "life", "long", "early",
+    "first", "can", "will", "would", "should", "could", "done", "very", "ready", "excited", "bored",
+)
+HASHTAGS = (
+    "#followfriday", "#FF", "#squarespace", "#iranelection", "#musicmonday", "#fb", "#tcot",
+    "#jobs", "#f1", "#apple", "#iphone", "#twitter", "#news", "#mileycyrus", "#3hotwords",
+    "#asot400", "#tweetdeck", "#gr88", "#spymaster", "#lost", "#e3", "#wwdc", "#mcfly", "#fail",
+)
+BRAND_MENTIONS = (
+    "iPhone", "Apple", "Galaxy", "Windows", "Xbox 360", "PS3", "Google", "Kindle", "Twitter",
+    "Facebook", "Starbucks", "Nike", "McDonald's", "Best Buy", "Ford", "HBO", "Disney", "Sony",
+    "Nintendo Wii", "BlackBerry", "YouTube", "Coca-Cola", "Target", "Amazon", "Netflix",
+)
+_WORD_CUM = list(itertools.accumulate(1.0 / (i + 1.5) for i in range(len(WORDS))))
+_TAG_CUM = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(HASHTAGS))))
+
+
+def parse_rows(text: str) -> int:
+    """'10k' -> 10000, '1.6M' -> 1600000, '250' -> 250."""
+    text = text.strip()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:].lower(), 1)
+    number = text[:-1] if scale != 1 else text
+    return int(round(float(number) * scale))
+
+
+def _text_length(rng: random.Random, target: int) -> int:
+    if rng.random() < LIMIT_RATE:
+        return rng.randint(128, 140)
+    # Negative tweets run a little longer, as in the corpus
+    scale = 30.4 if target == 0 else 30.0
+    return min(138, max(6, int(rng.gammavariate(2.2, scale)) + 8))
+
+
+def _tweet_text(rng: random.Random, target: int) -> str:
+    length = _text_length(rng, target)
+    extras: List[str] = []
+    if rng.random() < BRAND_RATE:
+        extras.append(rng.choice(BRAND_MENTIONS))
+    if rng.random() < HASHTAG_RATE:
+        for _ in range(1 + (rng.random() < 0.3) + (rng.random() < 0.1)):
+            extras.append(rng.choices(HASHTAGS, cum_weights=_TAG_CUM)[0])
+    if rng.random() < URL_RATE:
+        extras.append(f"http://bit.ly/{rng.getrandbits(24):06x}")
+    budget = length - sum(len(e) + 1 for e in extras)
+    words: List[str] = []
+    size = 0
+    for w in rng.choices(WORDS, cum_weights=_WORD_CUM, k=length // 3 + 2):
+        if words and size + len(w) > budget:
+            break
+        words.append(w)
+        size += len(w) + 1
+    if rng.random() < QUOTE_RATE:
+        i = rng.randrange(len(words))
+        words[i] = f'"{words[i]}",'
+    for e in extras:
+        words.insert(rng.randrange(len(words) + 1), e)
+    if rng.random() < MENTION_RATE:
+        words.insert(0, f"@user{rng.randrange(USERS)}")
+    return " ".join(words)[:140]
+
+
+def iter_synthetic(rows: int, seed: int = 0) -> Iterator[List[str]]:
+    """Deterministic Sentiment140 records (without header) for (rows, seed)."""
+    rng = random.Random(seed)
+    tweet_id = 1467810369
+    # Mon Apr 06 22:19:45 PDT 2009
+    stamp = 1239081585
+    for _ in range(rows):
+        target = 0 if rng.random() < 0.5 else 4
+        tweet_id += rng.randint(1, 60)
+        stamp += rng.randint(0, 3)
+        date = time.strftime("%a %b %d %H:%M:%S PDT %Y", time.gmtime(stamp))
+        user = f"user{int(USERS * rng.random() ** 2.5)}"
+        yield [str(target), str(tweet_id), date, "NO_QUERY", user, _tweet_text(rng, target)]
+
+
+def generate(path: Path, rows: int, seed: int = 0, header: bool = True) -> Path:
+    """Write the synthetic CSV atomically (a partial file is never left behind)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="latin-1", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        if header:
+            writer.writerow(HEADER)
+        batch: List[List[str]] = []
+        for record in iter_synthetic(rows, seed):
+            batch.append(record)
+            if len(batch) == 65536:
+                writer.writerows(batch)
+                batch = []
+        writer.writerows(batch)
+    os.replace(tmp, path)
+    return path
+
+
+def synthetic_path(data_dir: Path, rows: int, seed: int) -> Path:
+    return data_dir / f"sentiment140_synth_{rows}_s{seed}_v{GENERATOR_VERSION}.csv"
+
+
+def ensure_synthetic(data_dir: Path, rows: int, seed: int) -> Path:
+    path = synthetic_path(data_dir, rows, seed)
+    if not path.exists():
+        t0 = time.perf_counter()
+        generate(path, rows, seed)
+        print(f"Generated {path} ({rows:,} rows) in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    return path
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _import_tool(folder: str, module: str):
+    sys.path.insert(0, str(ROOT / folder))
+    return __import__(module)
+
+
+def run_one(tool: str, source: str, workdir: str, workers: int) -> Dict[str, object]:
+    """Run one tool on source in this process and measure it."""
+    sys.path.insert(0, str(ROOT))
+    import pipeline
+
+    times = pipeline.StageTimes()
+    started = time.perf_counter()
+    # The tools report progress on stdout; keep it for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        if tool == "hashtags":
+            mod = _import_tool("Hashtags", "extract_hashtags")
+            out = os.path.join(workdir, "hashtags.csv")
+            if workers > 1:
+                mod.process_rows_parallel(source, out, jobs=workers, times=times)
+            else:
+                mod.process_rows(source, out, times=times)
+        elif tool == "marcas":
+            mod = _import_tool("Marcas", "exportar_marcas_csv")
+            out = os.path.join(workdir, "marcas.csv")
+            mod.process_csv(source, out, workers=workers, etapas=times)
+        elif tool == "anova":
+            mod = _import_tool("ANOVA", "AnovaTweets2")
+            with times.measure(pipeline.READ):
+                accs, lengths = mod.leer_partes([Path(source)], workers=1)
+            mod.analisis_sentimiento(accs, lengths, Path(workdir), times, workers=workers)
+        else:
+            raise ValueError(f"Unknown tool: {tool}")
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": seconds,
+        "peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        "peak_rss_children_mb": round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        "phases": {k: round(v, 4) for k, v in times.seconds.items()},
+    }
+
+
+def _run_child(tool: str, source: Path, workers: int, verbose: bool) -> Dict[str, object]:
+    workdir = tempfile.mkdtemp(prefix=f"bench_{tool}_")
+    try:
+        env = dict(os.environ, MPLBACKEND="Agg")
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "_one", tool, str(source), workdir, str(workers)],
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL,
+            env=env,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{tool} exited with code {proc.returncode}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_suite(
+    sizes: Sequence[int],
+    tools: Sequence[str],
+    data_dir: Path,
+    seed: int = 0,
+    repeat: int = 1,
+    workers: int = 1,
+    verbose: bool = False,
+) -> Dict[str, object]:
+    results = []
+    for rows in sizes:
+        source = ensure_synthetic(data_dir, rows, seed)
+        for tool in tools:
+            runs = [_run_child(tool, source, workers, verbose) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r["seconds"])
+            seconds = float(best["seconds"])  # type: ignore[arg-type]
+            result = {
+                "benchmark": tool,
+                "rows": rows,
+                "bytes": source.stat().st_size,
+                "workers": workers,
+                "seconds": round(seconds, 4),
+                "rows_per_s": round(rows / seconds, 1) if seconds > 0 else None,
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),  # type: ignore[type-var]
+                "peak_rss_children_mb": max(r["peak_rss_children_mb"] for r in runs),  # type: ignore[type-var]
+                "phases": best["phases"],
+                "runs": [round(float(r["seconds"]), 4) for r in runs],  # type: ignore[arg-type]
+            }
+            results.append(result)
+            print(
+                f"{tool:<9}{rows:>12,} rows {seconds:9.3f} s {result['rows_per_s'] or 0:>14,.0f} rows/s "
+                f"RSS {result['peak_rss_mb']:.0f} MB"
+            )
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "version": RESULTS_VERSION,
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "generator_version": GENERATOR_VERSION,
+        "results": results,
+    }
+
+
+def compare(old: Dict[str, object], new: Dict[str, object], threshold: float) -> int:
+    """Print new vs old rows/s per (benchmark, rows, workers); returns the number of regressions."""
+
+    def key(r: Dict[str, object]):
+        return (r["benchmark"], r["rows"], r.get("workers", 1))
+
+    before = {key(r): r for r in old["results"]}  # type: ignore[union-attr]
+    regressions = 0
+    if old.get("generator_version") != new.get("generator_version"):
+        print("Warning: the synthetic data was made by another version of the generator")
+    for r in new["results"]:  # type: ignore[union-attr]
+        o = before.get(key(r))
+        if o is None or not o.get("rows_per_s") or not r.get("rows_per_s"):
+            continue
+        ratio = r["rows_per_s"] / o["rows_per_s"]
+        mark = ""
+        if ratio < 1 - threshold:
+            mark = "  REGRESSION"
+            regressions += 1
+        elif ratio > 1 + threshold:
+            mark = "  faster"
+        print(
+            f"{r['benchmark']:<9}{r['rows']:>12,} rows {o['rows_per_s']:>14,.0f} -> {r['rows_per_s']:>14,.0f} rows/s "
+            f"({ratio:5.2f}x){mark}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the tools on synthetic Sentiment140 data.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    g = sub.add_parser("generate", help="Generate a synthetic Sentiment140 CSV")
+    g.add_argument("--rows", required=True, help="Rows, e.g. 10k, 100k, 1.6M, 16M")
+    g.add_argument("--output", required=True, help="Output CSV")
+    g.add_argument("--seed", type=int, default=0)
+    g.add_argument("--no-header", action="store_true", help="No header, like the Kaggle file")
+    r = sub.add_parser("run", help="Measure the tools and save the results as JSON")
+    r.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated sizes (default: {DEFAULT_SIZES})")
+    r.add_argument("--tools", default=",".join(TOOLS), help=f"Tools (default: {','.join(TOOLS)})")
+    r.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "sentiment140_bench"), help="Where the synthetic CSVs are kept")
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--repeat", type=int, default=1, help="Repetitions per measurement; the fastest is kept")
+    r.add_argument("--workers", type=int, default=1, help="Processes for hashtags and marcas (1 = sequential)")
+    r.add_argument("--output", default="benchmark_results.json", help="Results JSON file")
+    r.add_argument("--verbose", action="store_true", help="Show the output of the tools")
+    c = sub.add_parser("compare", help="Compare two results files")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.10, help="Relative change in rows/s that is flagged (default: 0.10)")
+    one = sub.add_parser("_one")  # internal: one measurement in a fresh process
+    one.add_argument("tool")
+    one.add_argument("source")
+    one.add_argument("workdir")
+    one.add_argument("workers", type=int)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate(Path(args.output), parse_rows(args.rows), args.seed, header=not args.no_header)
+        print(f"Synthetic CSV: {args.output}")
+    elif args.command == "run":
+        tools = [t.strip() for t in args.tools.split(",") if t.strip()]
+        unknown = [t for t in tools if t not in TOOLS]
+        if unknown:
+            parser.error(f"unknown tool: {', '.join(unknown)}")
+        sizes = [parse_rows(s) for s in args.sizes.split(",") if s.strip()]
+        report = run_suite(sizes, tools, Path(args.data_dir), args.seed, args.repeat, args.workers, args.verbose)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Results: {args.output}")
+    elif args.command == "compare":
+        old = json.loads(Path(args.old).read_text(encoding="utf-8"))
+        new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+        return 1 if compare(old, new, args.threshold) else 0
+    else:
+        print(json.dumps(run_one(args.tool, args.source, args.workdir, args.workers)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Checkpoints for incremental processing of append-only CSV feeds.
+
+A checkpoint is a JSON file next to the output (<output>.checkpoint.json)
+recording how far the input was processed: the byte offset after the last
+processed record, rows read and written so far, where the last record
+starts and its sha256, the size of the output after writing, and the
+options that shape the output. The next run resumes at that offset and
+appends to the output when
+
+  - the input is still at least that long and its last processed record
+    hashes the same (a truncated or rewritten input fails this check),
+  - the output still has the recorded size,
+  - the options are the same;
+
+otherwise it starts over. Only complete records (ending in a newline
+outside quotes) are processed, so a record that is still being appended is
+picked up whole by the next run. Offsets are byte positions in a plain
+(uncompressed) file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+SUFFIX = ".checkpoint.json"
+VERSION = 1
+SCAN_BYTES = 1 << 22
+
+
+class Checkpoint(NamedTuple):
+    source: str
+    offset: int
+    rows: int
+    written: int
+    last_start: int
+    last_hash: str
+    output_size: int
+    options: Dict[str, Any]
+
+
+def checkpoint_path(output: str) -> str:
+    return output + SUFFIX
+
+
+def scan_records(path: str, start: int = 0) -> Tuple[int, int]:
+    """
+    (end, last_start) for the complete records from `start` (a record
+    boundary): end is the offset after the last one and last_start where it
+    begins. Both are `start` when there is no complete record.
+    """
+    end = last_start = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        base = start
+        inside = 0
+        while True:
+            buf = f.read(SCAN_BYTES)
+            if not buf:
+                break
+            j = 0
+            while True:
+                k = buf.find(b"\n", j)
+                if k < 0:
+                    inside ^= buf.count(b'"', j) & 1
+                    break
+                inside ^= buf.count(b'"', j, k) & 1
+                j = k + 1
+                if not inside:
+                    last_start, end = end, base + j
+            base += len(buf)
+    return end, last_start
+
+
+def record_hash(path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def load(output: str) -> Optional[Checkpoint]:
+    try:
+        with open(checkpoint_path(output), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.pop("version", None) != VERSION:
+        return None
+    try:
+        return Checkpoint(**data)
+    except TypeError:
+        return None
+
+
+def resume(output: str, source: str, options: Dict[str, Any]) -> Optional[Checkpoint]:
+    """
+    The checkpoint of `output` if processing of `source` can continue from
+    it, else None (after saying why on stderr when there was one).
+    """
+    cp = load(output)
+    if cp is None:
+        return None
+    reason = None
+    if cp.source != os.path.abspath(source):
+        reason = "different input"
+    elif cp.options != options:
+        reason = "different options"
+    elif not os.path.exists(output) or os.path.getsize(output) != cp.output_size:
+        reason = "the output changed"
+    elif os.path.getsize(source) < cp.offset:
+        reason = "the input is shorter, truncated or rewritten"
+    elif record_hash(source, cp.last_start, cp.offset) != cp.last_hash:
+        reason = "the last processed record changed, the input was rewritten"
+    if reason is not None:
+        print(f"Checkpoint discarded: {reason}; processing everything again.", file=sys.stderr)
+        return None
+    return cp
+
+
+def save(
+    output: str,
+    source: str,
+    offset: int,
+    rows: int,
+    written: int,
+    last_start: int,
+    options: Dict[str, Any],
+) -> Checkpoint:
+    """Write the checkpoint after the output has been closed (its size is recorded)."""
+    cp = Checkpoint(
+        source=os.path.abspath(source),
+        offset=offset,
+        rows=rows,
+        written=written,
+        last_start=last_start,
+        last_hash=record_hash(source, last_start, offset),
+        output_size=os.path.getsize(output),
+        options=options,
+    )
+    path = checkpoint_path(output)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION, **cp._asdict()}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return cp
+
+
+def remove(output: str) -> None:
+    try:
+        os.remove(checkpoint_path(output))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,266 @@
+"""
+Columnar on-disk copy of a Sentiment140-style CSV (target,ids,date,flag,user,text).
+
+Layout of <file>.cols/:
+  meta.json          rows, encoding, source size/mtime, byte order
+  <col>.off          uint64 offsets, rows + 1 entries, into <col>.heap
+  <col>.heap         raw field bytes in the source encoding, back to back
+  target.u8          target as a small integer (255 when not numeric)
+
+Every file is memory-mapped on open; callers only touch the columns they ask for.
+For single-byte encodings (latin-1) the length of a field in characters equals
+its length in bytes, so text lengths come straight from the offsets; for
+UTF-8 they are the count of bytes that do not continue a character. With
+numpy both are computed over whole columns without decoding.
+"""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import csv
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import compressed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+COLUMNS = ("target", "ids", "date", "flag", "user", "text")
+FORMAT_VERSION = 1
+SUFFIX = ".cols"
+SINGLE_BYTE_ENCODINGS = {"latin-1", "latin1", "iso-8859-1", "iso8859-1", "l1", "cp819"}
+FLUSH_ROWS = 1 << 16
+BATCH_ROWS = 1 << 16
+
+
+def columnar_path_for(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.name + SUFFIX)
+
+
+def is_columnar(path: Path | str) -> bool:
+    return (Path(path) / "meta.json").is_file()
+
+
+def _source_signature(csv_path: Path) -> Dict[str, int]:
+    # A zip member is represented by its archive
+    st = Path(compressed.split_zip_member(str(csv_path))[0]).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def is_up_to_date(csv_path: Path, out_dir: Path) -> bool:
+    meta_path = out_dir / "meta.json"
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    return meta.get("version") == FORMAT_VERSION and meta.get("source") == _source_signature(csv_path)
+
+
+def ingest_csv(csv_path: Path, out_dir: Optional[Path] = None, encoding: str = "latin-1") -> Path:
+    """
+    Convert csv_path into the columnar layout (streaming, bounded memory).
+    A first row whose target field is literally 'target' is treated as a
+    header and skipped; rows with fewer than six fields are dropped.
+    """
+    if out_dir is None:
+        out_dir = columnar_path_for(csv_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = out_dir / "meta.json"
+    if meta_path.exists():
+        # Invalidate first so a crash never leaves a stale meta next to new data
+        meta_path.unlink()
+
+    heaps = {c: (out_dir / f"{c}.heap").open("wb") for c in COLUMNS}
+    offs = {c: (out_dir / f"{c}.off").open("wb") for c in COLUMNS}
+    codes_file = (out_dir / "target.u8").open("wb")
+    pos = {c: 0 for c in COLUMNS}
+    pending = {c: array("Q", [0]) for c in COLUMNS}
+    codes = array("B")
+    rows = 0
+    skipped = 0
+    header = False
+    try:
+        with compressed.open_text(str(csv_path), encoding) as fin:
+            for i, row in enumerate(csv.reader(fin)):
+                if len(row) < 6:
+                    skipped += 1
+                    continue
+                if i == 0 and row[0].strip().lower() == "target":
+                    header = True
+                    continue
+                for c, value in zip(COLUMNS, row):
+                    data = value.encode(encoding)
+                    heaps[c].write(data)
+                    pos[c] += len(data)
+                    pending[c].append(pos[c])
+                try:
+                    code = int(row[0])
+                except ValueError:
+                    code = 255
+                codes.append(code if 0 <= code < 255 else 255)
+                rows += 1
+                if rows % FLUSH_ROWS == 0:
+                    for c in COLUMNS:
+                        pending[c].tofile(offs[c])
+                        pending[c] = array("Q")
+                    codes.tofile(codes_file)
+                    codes = array("B")
+        for c in COLUMNS:
+            pending[c].tofile(offs[c])
+        codes.tofile(codes_file)
+    finally:
+        for f in (*heaps.values(), *offs.values(), codes_file):
+            f.close()
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "skipped": skipped,
+        "header": header,
+        "columns": list(COLUMNS),
+        "encoding": encoding,
+        "byteorder": sys.byteorder,
+        "source": _source_signature(csv_path),
+    }
+    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return out_dir
+
+
+def ensure_columnar(csv_path: Path, encoding: str = "latin-1") -> Path:
+    """Ingest csv_path unless its columnar copy already matches the source."""
+    out_dir = columnar_path_for(csv_path)
+    if not is_up_to_date(csv_path, out_dir):
+        ingest_csv(csv_path, out_dir, encoding=encoding)
+    return out_dir
+
+
+class ColumnarTable:
+    """Read-only, memory-mapped view of a columnar directory."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version: {meta.get('version')}")
+        if meta.get("byteorder") != sys.byteorder:
+            raise ValueError("The columnar file was written with another byte order.")
+        self.rows: int = meta["rows"]
+        self.encoding: str = meta["encoding"]
+        self.columns: List[str] = meta["columns"]
+        self.header: bool = meta.get("header", False)
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def __enter__(self) -> "ColumnarTable":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for m in self._maps.values():
+            try:
+                m.close()
+            except BufferError:
+                # A caller still holds a view; the map is released with it
+                pass
+        self._maps.clear()
+
+    def _map(self, file_name: str) -> memoryview:
+        if file_name not in self._maps:
+            with (self.path / file_name).open("rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                self._maps[file_name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._maps[file_name])
+
+    @property
+    def single_byte(self) -> bool:
+        return self.encoding.lower() in SINGLE_BYTE_ENCODINGS
+
+    def offsets(self, column: str) -> memoryview:
+        return self._map(f"{column}.off").cast("Q")
+
+    def heap(self, column: str) -> memoryview:
+        return self._map(f"{column}.heap")
+
+    def target_codes(self) -> memoryview:
+        """uint8 target per row (255 when the source value was not numeric)."""
+        return self._map("target.u8")
+
+    def char_lengths(self, column: str) -> Sequence[int]:
+        """
+        Length in characters of every field of column, without decoding for
+        latin-1 and UTF-8 (a numpy array when numpy is installed).
+        """
+        off = self.offsets(column)
+        utf8 = codecs.lookup(self.encoding).name == "utf-8"
+        if np is None or not (self.single_byte or utf8):
+            return self._char_lengths_decoded(off, column)
+        o = np.frombuffer(off, dtype=np.uint64)
+        nbytes = np.diff(o)
+        if self.single_byte:
+            return nbytes
+        # UTF-8: one lead byte per character, continuation bytes are 10xxxxxx
+        lead = (np.frombuffer(self.heap(column), dtype=np.uint8) & 0xC0) != 0x80
+        lengths = np.zeros(len(nbytes), dtype=np.uint64)
+        full = nbytes > 0
+        if full.any():
+            # Empty fields take no bytes, so each non-empty one ends where the next starts
+            lengths[full] = np.add.reduceat(lead, o[:-1][full].astype(np.intp), dtype=np.uint64)
+        return lengths
+
+    def _char_lengths_decoded(self, off: memoryview, column: str) -> Sequence[int]:
+        if self.single_byte:
+            return array("Q", [off[i + 1] - off[i] for i in range(self.rows)])
+        heap = self.heap(column)
+        enc = self.encoding
+        return array("Q", [len(bytes(heap[off[i]:off[i + 1]]).decode(enc)) for i in range(self.rows)])
+
+    def iter_rows(
+        self, columns: Sequence[str], start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Tuple[str, ...]]:
+        """Yield tuples with only the requested columns, decoded in batches."""
+        if stop is None or stop > self.rows:
+            stop = self.rows
+        cols = [(self.offsets(c), self.heap(c)) for c in columns]
+        enc = self.encoding
+        for a in range(start, stop, BATCH_ROWS):
+            b = min(a + BATCH_ROWS, stop)
+            values = [self._decode_batch(off, heap, a, b, enc) for off, heap in cols]
+            yield from zip(*values)
+
+    def _decode_batch(self, off: memoryview, heap: memoryview, a: int, b: int, enc: str) -> List[str]:
+        base = off[a]
+        if self.single_byte:
+            # One decode per batch; character offsets equal byte offsets
+            text = bytes(heap[base:off[b]]).decode(enc)
+            return [text[off[i] - base:off[i + 1] - base] for i in range(a, b)]
+        return [bytes(heap[off[i]:off[i + 1]]).decode(enc) for i in range(a, b)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convert a Sentiment140 CSV to the columnar format (.cols).")
+    parser.add_argument("input", help="Input CSV (target,ids,date,flag,user,text), also .gz/.zst/.zip")
+    parser.add_argument("--output", default="", help="Output directory (default: <input>.cols)")
+    parser.add_argument("--encoding", default="latin-1", help="CSV encoding (default: latin-1)")
+    args = parser.parse_args()
+
+    csv_path = Path(args.input)
+    out_dir = Path(args.output) if args.output else columnar_path_for(csv_path)
+    ingest_csv(csv_path, out_dir, encoding=args.encoding)
+    with ColumnarTable(out_dir) as table:
+        print(f"Columnar copy: {out_dir} ({table.rows} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
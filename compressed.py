@@ -0,0 +1,256 @@
+"""
+Transparent compressed input and output for the tweet tools.
+
+Inputs are recognised by their magic bytes, not their name: gzip (also
+multi-member, e.g. several gzip files concatenated), zstd and zip. A zip
+member is named by continuing the path inside the archive
+("tweets.zip/training.csv"); an archive with a single CSV member can be
+given by itself. Decompression runs in a background thread that fills a
+small bounded queue of blocks, so it overlaps with CSV parsing in the
+caller (zlib and zstd release the GIL while they work).
+
+Outputs are compressed according to their suffix: .gz, .zst or .zip (one
+member named like the archive without .zip). zstd needs the optional
+`zstandard` package; without it zstd files fail with a clear message.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import os
+import queue
+import threading
+import time
+import zipfile
+from typing import BinaryIO, Optional, TextIO, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZIP_MAGIC = b"PK\x03\x04"
+OUTPUT_SUFFIXES = {".gz": "gzip", ".zst": "zstd", ".zip": "zip"}
+READ_BLOCK = 1 << 20
+QUEUE_BLOCKS = 8
+GZIP_LEVEL = 6
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise RuntimeError(".zst files need the 'zstandard' package (pip install zstandard).")
+
+
+def split_zip_member(path: str) -> Tuple[str, Optional[str]]:
+    """
+    ("a.zip", "dir/b.csv") for "a.zip/dir/b.csv"; (path, None) when path
+    exists as a file or no parent of it is a zip archive.
+    """
+    if os.path.isfile(path):
+        return path, None
+    head, tail = os.path.split(path)
+    member = [tail]
+    while head and head != os.path.dirname(head):
+        if os.path.isfile(head):
+            return (head, "/".join(reversed(member))) if zipfile.is_zipfile(head) else (path, None)
+        head, tail = os.path.split(head)
+        member.append(tail)
+    return path, None
+
+
+def detect(path: str) -> Optional[str]:
+    """'gzip', 'zstd' or 'zip' from the first bytes of path (or of its zip archive); None for plain files."""
+    archive, member = split_zip_member(path)
+    if member is not None:
+        return "zip"
+    with open(archive, "rb") as f:
+        head = f.read(4)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    if head == ZIP_MAGIC:
+        return "zip"
+    return None
+
+
+def is_compressed(path: str) -> bool:
+    return detect(path) is not None
+
+
+def _zip_member(zf: zipfile.ZipFile, member: Optional[str]) -> str:
+    if member is not None:
+        return member
+    names = [i.filename for i in zf.infolist() if not i.is_dir()]
+    csvs = [n for n in names if n.lower().endswith(".csv")]
+    if len(csvs) == 1 or len(names) == 1:
+        return (csvs or names)[0]
+    raise ValueError(f"The zip {zf.filename} has several files; name one as {zf.filename}/<file>: {', '.join(names)}")
+
+
+def _open_decompressed(path: str) -> BinaryIO:
+    kind = detect(path)
+    archive, member = split_zip_member(path)
+    if kind == "gzip":
+        return gzip.open(archive, "rb")
+    if kind == "zstd":
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(archive, "rb"), closefd=True, read_across_frames=True)
+    if kind == "zip":
+        zf = zipfile.ZipFile(archive)
+        try:
+            src = zf.open(_zip_member(zf, member))
+        except BaseException:
+            zf.close()
+            raise
+        # ZipExtFile does not close its archive
+        src._zip_archive = zf  # type: ignore[attr-defined]
+        return src
+    return open(archive, "rb")
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Read-only byte stream whose blocks are produced by a background thread.
+    Each read returns what is left of the current block (at most n bytes).
+    """
+
+    def __init__(self, src: BinaryIO, block_size: int = READ_BLOCK, max_blocks: int = QUEUE_BLOCKS) -> None:
+        super().__init__()
+        self._src = src
+        self._block_size = block_size
+        self._blocks: "queue.Queue[object]" = queue.Queue(max_blocks)
+        self._current = memoryview(b"")
+        self._done = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, name="decompress", daemon=True)
+        self._thread.start()
+
+    def _fill(self) -> None:
+        try:
+            while not self._stop.is_set():
+                block = self._src.read(self._block_size)
+                self._put(block)
+                if not block:
+                    return
+        except BaseException as exc:  # re-raised in the reading thread
+            self._put(exc)
+
+    def _put(self, item: object) -> None:
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:  # type: ignore[override]
+        if not self._current:
+            if self._done:
+                return 0
+            item = self._blocks.get()
+            if isinstance(item, BaseException):
+                self._done = True
+                raise item
+            if not item:
+                self._done = True
+                return 0
+            self._current = memoryview(item)  # type: ignore[arg-type]
+        n = min(len(b), len(self._current))
+        b[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            return self.readall()
+        if not self._current and not self._done:
+            # Hand over the whole block without copying it into a buffer
+            item = self._blocks.get()
+            if isinstance(item, BaseException):
+                self._done = True
+                raise item
+            if not item:
+                self._done = True
+                return b""
+            self._current = memoryview(item)  # type: ignore[arg-type]
+        out = bytes(self._current[:n])
+        self._current = self._current[n:]
+        return out
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            zf = getattr(self._src, "_zip_archive", None)
+            self._src.close()
+            if zf is not None:
+                zf.close()
+        super().close()
+
+
+def open_input(path: str, threaded: bool = True) -> BinaryIO:
+    """
+    Decompressed bytes of path (plain files are returned as they are). With
+    threaded, a compressed source is decompressed in a background thread.
+    """
+    src = _open_decompressed(path)
+    if threaded and detect(path) is not None:
+        # Buffered so read(n) returns n bytes until EOF, like a plain file
+        return io.BufferedReader(ThreadedReader(src), buffer_size=READ_BLOCK)  # type: ignore[return-value]
+    return src
+
+
+def open_text(path: str, encoding: str) -> TextIO:
+    """open_input() decoded as text with newline='' (what csv.reader expects)."""
+    return io.TextIOWrapper(open_input(path), encoding=encoding, newline="")
+
+
+def output_compression(path: str) -> Optional[str]:
+    return OUTPUT_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def open_output(path: str, encoding: str, append: bool = False) -> TextIO:
+    """
+    Text file for writing (newline=''), compressed when path ends in .gz,
+    .zst or .zip. Closing it finishes the compressed stream. With append,
+    gzip and zstd add a new member/frame after the existing ones (readers
+    see one continuous stream); a zip cannot be appended to.
+    """
+    kind = output_compression(path)
+    if kind == "gzip":
+        mode = "at" if append else "wt"
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL, encoding=encoding, newline="")  # type: ignore[return-value]
+    if kind == "zstd":
+        _require_zstandard()
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, "ab" if append else "wb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding=encoding, newline="")
+    if kind == "zip":
+        if append:
+            raise ValueError(f"Cannot append to an existing .zip: {path}")
+        zf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=GZIP_LEVEL)
+        member = zipfile.ZipInfo(os.path.basename(path)[: -len(".zip")], time.localtime()[:6])
+        member.compress_type = zipfile.ZIP_DEFLATED
+        return _ZipMemberWriter(zf, zf.open(member, "w", force_zip64=True), encoding)
+    return open(path, "a" if append else "w", encoding=encoding, newline="")
+
+
+class _ZipMemberWriter(io.TextIOWrapper):
+    # Closes the archive (writing its central directory) after the member
+    def __init__(self, zf: zipfile.ZipFile, member: BinaryIO, encoding: str) -> None:
+        super().__init__(member, encoding=encoding, newline="")  # type: ignore[arg-type]
+        self._zf = zf
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                super().close()
+            finally:
+                self._zf.close()
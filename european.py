@@ -0,0 +1,269 @@
+"""
+Compact table of the "Twitter sentiment for 15 European languages" corpus.
+
+The folder holds one <Language>_Twitter_sentiment.csv per language with
+TweetID,HandLabel,AnnotatorID rows. load() parses the files in a process
+pool (one file per worker) into four parallel columns and keeps them in a
+cache directory under the user cache (~/.cache/european/<folder>-<hash>/,
+one per corpus folder):
+
+  meta.json          rows, languages, labels, row range per language, size/mtime of every CSV
+  ids.i64            int64 tweet id
+  label.i8           int8 index into LABELS (-1 for an unknown label)
+  annotator.i16      int16 annotator id
+  lang.i8            int8 index into the languages of meta.json
+
+Rows keep the order of the files, so each language is one contiguous range.
+The cache is memory-mapped on load and rebuilt when a CSV is added, removed
+or changes size or mtime, so reloading costs milliseconds instead of
+parsing the CSVs again.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+DEFAULT_FOLDER = Path(__file__).resolve().parent / "Twitter sentiment for 15 European languages"
+FILE_SUFFIX = "_Twitter_sentiment.csv"
+CACHE_DIR = Path.home() / ".cache" / "european"
+FORMAT_VERSION = 1
+# Fixed order, so a language keeps its code whichever files are present
+LANGUAGES = (
+    "Albanian", "Bosnian", "Bulgarian", "Croatian", "English", "German", "Hungarian", "Polish",
+    "Portuguese", "Russian", "Serbian", "Slovak", "Slovenian", "Spanish", "Swedish",
+)
+LABELS = ("Negative", "Neutral", "Positive")
+# file name -> (typecode, itemsize); itemsize is checked against the platform
+COLUMNS = {"ids": ("q", 8), "label": ("b", 1), "annotator": ("h", 2), "lang": ("b", 1)}
+_LABEL_CODES = {name.encode(): code for code, name in enumerate(LABELS)}
+
+
+def cache_path_for(folder: Path, cache_dir: Path = CACHE_DIR) -> Path:
+    # Outside the repository; the hash keeps two folders with the same name apart
+    key = hashlib.sha256(str(folder.resolve()).encode("utf-8")).hexdigest()[:12]
+    return cache_dir / f"{folder.name}-{key}"
+
+
+def corpus_files(folder: Path) -> List[Tuple[str, Path]]:
+    """(language, csv) of every corpus file in folder, in language-code order."""
+    found = {p.name[: -len(FILE_SUFFIX)]: p for p in folder.glob("*" + FILE_SUFFIX) if p.is_file()}
+    order = [lang for lang in LANGUAGES if lang in found] + sorted(set(found) - set(LANGUAGES))
+    return [(lang, found[lang]) for lang in order]
+
+
+def _language_codes(languages: Sequence[str]) -> List[str]:
+    return list(LANGUAGES) + sorted(set(languages) - set(LANGUAGES))
+
+
+def _signature(files: Sequence[Tuple[str, Path]]) -> Dict[str, Dict[str, int]]:
+    sig = {}
+    for _, path in files:
+        st = path.stat()
+        sig[path.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return sig
+
+
+def is_up_to_date(folder: Path, cache: Path) -> bool:
+    meta_path = cache / "meta.json"
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    return (
+        meta.get("version") == FORMAT_VERSION
+        and meta.get("byteorder") == sys.byteorder
+        and meta.get("sources") == _signature(corpus_files(folder))
+    )
+
+
+def parse_file(path: str) -> Tuple[int, int, bytes, bytes, bytes]:
+    """
+    Worker: (rows, skipped, ids, labels, annotators) of one CSV, the columns
+    as raw array bytes. The header and malformed lines are skipped.
+    """
+    ids = array("q")
+    labels = array("b")
+    annotators = array("h")
+    skipped = 0
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+    if lines and lines[0].lower().startswith(b"tweetid"):
+        lines = lines[1:]
+    for line in lines:
+        parts = line.split(b",")
+        try:
+            tweet_id, label, annotator = int(parts[0]), parts[1].strip(), int(parts[2])
+        except (ValueError, IndexError):
+            if line.strip():
+                skipped += 1
+            continue
+        if len(parts) != 3:
+            skipped += 1
+            continue
+        ids.append(tweet_id)
+        labels.append(_LABEL_CODES.get(label, -1))
+        annotators.append(annotator)
+    return len(ids), skipped, ids.tobytes(), labels.tobytes(), annotators.tobytes()
+
+
+def build_cache(folder: Path, cache: Optional[Path] = None, workers: Optional[int] = None) -> Path:
+    """Parse every CSV of folder (one per worker) and write the cache."""
+    if cache is None:
+        cache = cache_path_for(folder)
+    files = corpus_files(folder)
+    if not files:
+        raise FileNotFoundError(f"No *{FILE_SUFFIX} files in {folder}")
+    languages = _language_codes([lang for lang, _ in files])
+    tasks = [str(path) for _, path in files]
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            parsed = pool.map(parse_file, tasks, chunksize=1)
+    else:
+        parsed = [parse_file(t) for t in tasks]
+
+    cache.mkdir(parents=True, exist_ok=True)
+    meta_path = cache / "meta.json"
+    if meta_path.exists():
+        # Invalidate first so a crash never leaves a stale meta next to new data
+        meta_path.unlink()
+    ranges = {}
+    rows = skipped = 0
+    with (cache / "ids.i64").open("wb") as f_ids, (cache / "label.i8").open("wb") as f_labels, (
+        cache / "annotator.i16"
+    ).open("wb") as f_ann, (cache / "lang.i8").open("wb") as f_lang:
+        for (lang, _), (n, bad, ids, labels, annotators) in zip(files, parsed):
+            f_ids.write(ids)
+            f_labels.write(labels)
+            f_ann.write(annotators)
+            f_lang.write(bytes([languages.index(lang)]) * n)
+            ranges[lang] = [rows, rows + n]
+            rows += n
+            skipped += bad
+    meta = {
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "skipped": skipped,
+        "languages": languages,
+        "labels": list(LABELS),
+        "ranges": ranges,
+        "byteorder": sys.byteorder,
+        "sources": _signature(files),
+    }
+    meta_path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    return cache
+
+
+class CorpusTable:
+    """Read-only, memory-mapped view of the cache; columns are typed memoryviews."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported cache version: {meta.get('version')}")
+        if meta.get("byteorder") != sys.byteorder:
+            raise ValueError("The cache was written with another byte order.")
+        self.rows: int = meta["rows"]
+        self.languages: List[str] = meta["languages"]
+        self.labels: List[str] = meta["labels"]
+        self.ranges: Dict[str, Tuple[int, int]] = {k: (a, b) for k, (a, b) in meta["ranges"].items()}
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def __enter__(self) -> "CorpusTable":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for m in self._maps.values():
+            try:
+                m.close()
+            except BufferError:
+                # A caller still holds a view; the map is released with it
+                pass
+        self._maps.clear()
+
+    def _column(self, name: str, suffix: str) -> memoryview:
+        typecode, size = COLUMNS[name]
+        if array(typecode).itemsize != size:
+            raise ValueError(f"No {size}-byte type '{typecode}' on this platform.")
+        file_name = f"{name}.{suffix}"
+        if file_name not in self._maps:
+            with (self.path / file_name).open("rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(array(typecode))
+                self._maps[file_name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._maps[file_name]).cast(typecode)
+
+    @property
+    def ids(self) -> memoryview:
+        return self._column("ids", "i64")
+
+    @property
+    def label(self) -> memoryview:
+        return self._column("label", "i8")
+
+    @property
+    def annotator(self) -> memoryview:
+        return self._column("annotator", "i16")
+
+    @property
+    def lang(self) -> memoryview:
+        return self._column("lang", "i8")
+
+    def arrays(self):
+        """The four columns as numpy arrays over the maps (no copy); needs numpy."""
+        import numpy as np
+
+        return {
+            "ids": np.frombuffer(self.ids, dtype=np.int64),
+            "label": np.frombuffer(self.label, dtype=np.int8),
+            "annotator": np.frombuffer(self.annotator, dtype=np.int16),
+            "lang": np.frombuffer(self.lang, dtype=np.int8),
+        }
+
+
+def load(folder: Path | str = DEFAULT_FOLDER, cache: Optional[Path | str] = None, workers: Optional[int] = None) -> CorpusTable:
+    """The corpus table, rebuilding the cache first when a CSV changed."""
+    folder = Path(folder)
+    cache = Path(cache) if cache else cache_path_for(folder)
+    if not is_up_to_date(folder, cache):
+        build_cache(folder, cache, workers)
+    return CorpusTable(cache)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load the sentiment corpus in 15 European languages into a compact table.")
+    parser.add_argument("folder", nargs="?", default=str(DEFAULT_FOLDER), help="Folder with the *_Twitter_sentiment.csv files")
+    parser.add_argument("--cache", default="", help="Cache directory (default: ~/.cache/european/<folder>-<hash>)")
+    parser.add_argument("--workers", type=int, default=0, help="Processes that read the CSVs (default: one per CPU)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cache even when it is up to date")
+    args = parser.parse_args()
+
+    folder = Path(args.folder)
+    cache = Path(args.cache) if args.cache else cache_path_for(folder)
+    t0 = time.perf_counter()
+    if args.rebuild:
+        build_cache(folder, cache, args.workers or None)
+    with load(folder, cache, args.workers or None) as table:
+        elapsed = time.perf_counter() - t0
+        print(f"Corpus: {table.rows} annotations in {len(table.ranges)} languages ({cache}), {elapsed * 1000:.1f} ms")
+        for lang, (a, b) in table.ranges.items():
+            print(f"  {lang:<12}{b - a:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,17 +8,21 @@ Expected .env content:
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import os
 import sys
 import shutil
-import tempfile
 import zipfile
 from pathlib import Path
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, Optional, Protocol, Tuple
+
+import columnar
 
 
 DEFAULT_DATASET = "kazanova/sentiment140"
 DEFAULT_FILE = "training.1600000.processed.noemoticon.csv"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "kaggle_datasets"
 
 
 def load_env_file_if_present(env_file: Path) -> Dict[str, str]:
@@ -78,59 +82,274 @@ def maybe_write_kaggle_json_from_env() -> Path | None:
     return None
 
 
-def download_single_file(dataset: str, file_name: str, output_dir: Path) -> Path:
-    try:
-        from kaggle.api.kaggle_api_extended import KaggleApi  # type: ignore
-    except Exception as exc:  # pragma: no cover
-        raise RuntimeError(
-            "El paquete 'kaggle' no está instalado. Instálelo con: pip install kaggle"
-        ) from exc
-
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    tmp_dir_path = Path(tempfile.mkdtemp(prefix="kaggle_dl_", dir=str(output_dir)))
-    try:
-        api = KaggleApi()
-        api.authenticate()
-
-        api.dataset_download_file(
+class DatasetSource(Protocol):
+    """Remote side of the download: Kaggle in production, a local stand-in in tests."""
+
+    def remote_version(self, dataset: str, file_name: str) -> str:
+        """Opaque string that changes whenever the remote file changes."""
+        ...
+
+    def download(self, dataset: str, file_name: str, dest_dir: Path) -> Path:
+        """Download the file (possibly zipped) into dest_dir and return its path."""
+        ...
+
+
+class KaggleSource:
+    def __init__(self) -> None:
+        try:
+            from kaggle.api.kaggle_api_extended import KaggleApi  # type: ignore
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(
+                "El paquete 'kaggle' no está instalado. Instálelo con: pip install kaggle"
+            ) from exc
+        self.api = KaggleApi()
+        self.api.authenticate()
+
+    def remote_version(self, dataset: str, file_name: str) -> str:
+        listing = self.api.dataset_list_files(dataset)
+        for f in getattr(listing, "files", None) or []:
+            if getattr(f, "name", None) == file_name:
+                created = getattr(f, "creationDate", "") or getattr(f, "creation_date", "")
+                size = getattr(f, "totalBytes", None) or getattr(f, "total_bytes", None) or getattr(f, "size", "")
+                return f"{created}|{size}"
+        raise RuntimeError(f"El archivo '{file_name}' no existe en el dataset '{dataset}'.")
+
+    def download(self, dataset: str, file_name: str, dest_dir: Path) -> Path:
+        self.api.dataset_download_file(
             dataset=dataset,
             file_name=file_name,
-            path=str(tmp_dir_path),
+            path=str(dest_dir),
             force=True,
             quiet=False,
         )
+        return _locate_download(dest_dir, file_name)
+
+
+class LocalSource:
+    """
+    Stand-in for Kaggle that serves files from a local directory laid out as
+    <root>/<owner>/<dataset>/<file> (or <file>.zip). The version is the file's
+    size and mtime.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def _path(self, dataset: str, file_name: str) -> Path:
+        base = self.root / dataset
+        for candidate in (base / file_name, base / f"{file_name}.zip"):
+            if candidate.exists():
+                return candidate
+        raise RuntimeError(f"El archivo '{file_name}' no existe en el dataset '{dataset}'.")
+
+    def remote_version(self, dataset: str, file_name: str) -> str:
+        st = self._path(dataset, file_name).stat()
+        return f"{st.st_mtime_ns}|{st.st_size}"
+
+    def download(self, dataset: str, file_name: str, dest_dir: Path) -> Path:
+        src = self._path(dataset, file_name)
+        dest = dest_dir / src.name
+        shutil.copyfile(src, dest)
+        return dest
+
+
+def _locate_download(download_dir: Path, file_name: str) -> Path:
+    # Direct file path (most common case), a zip delivered by Kaggle, or any match by name
+    direct_candidate = download_dir / file_name
+    if direct_candidate.exists():
+        return direct_candidate
+    zipped = download_dir / f"{file_name}.zip"
+    if zipped.exists():
+        return zipped
+    zips = list(download_dir.rglob("*.zip"))
+    if zips:
+        return zips[0]
+    matches = list(download_dir.rglob(file_name))
+    if matches:
+        return matches[0]
+    raise RuntimeError(
+        f"No se pudo localizar el archivo '{file_name}' luego de la descarga."
+    )
 
-        destination = output_dir / file_name
 
-        # Direct file path (most common case)
-        direct_candidate = tmp_dir_path / file_name
-        if direct_candidate.exists():
-            shutil.move(str(direct_candidate), str(destination))
-            return destination
+HASH_BLOCK = 1 << 20
 
-        # If Kaggle delivered a zip, extract then move the exact file
-        for zip_path in tmp_dir_path.rglob("*.zip"):
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                zf.extractall(tmp_dir_path)
 
-        # Try again after extraction
-        extracted_candidate = tmp_dir_path / file_name
-        if extracted_candidate.exists():
-            shutil.move(str(extracted_candidate), str(destination))
-            return destination
+def _copy_hashing(src: BinaryIO, dest: Path) -> Tuple[int, str]:
+    """Stream src into dest (via a .part file) and return (size, sha256)."""
+    digest = hashlib.sha256()
+    size = 0
+    part = dest.with_name(dest.name + ".part")
+    with part.open("wb") as out:
+        while True:
+            block = src.read(HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    os.replace(part, dest)
+    return size, digest.hexdigest()
 
-        # Fallback: any match by name within tmp dir
-        matches = list(tmp_dir_path.rglob(file_name))
-        if matches:
-            shutil.move(str(matches[0]), str(destination))
-            return destination
 
+def file_digest(path: Path) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with path.open("rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def _is_valid(path: Path, manifest: Dict[str, object]) -> bool:
+    # The size check is free; only hash when it matches
+    if not path.exists() or path.stat().st_size != manifest.get("size"):
+        return False
+    return file_digest(path)[1] == manifest.get("sha256")
+
+
+def cache_entry_dir(cache_dir: Path, dataset: str, file_name: str, version: str) -> Path:
+    key = hashlib.sha256(f"{dataset}\n{file_name}\n{version}".encode("utf-8")).hexdigest()[:24]
+    return cache_dir / key
+
+
+def _remote_size(version: str) -> Optional[int]:
+    # Both sources end the version with "|<size>"; an empty size means unknown
+    try:
+        return int(version.rsplit("|", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _usable_download(downloaded: Path, file_name: str, expected: Optional[int]) -> bool:
+    """A finished download from an earlier run that can be extracted again."""
+    if zipfile.is_zipfile(downloaded):
+        with zipfile.ZipFile(downloaded, "r") as zf:
+            try:
+                _zip_member(zf, file_name)
+            except RuntimeError:
+                return False
+        return True
+    return downloaded.name == file_name and (expected is None or downloaded.stat().st_size == expected)
+
+
+def fetch_into_cache(
+    source: DatasetSource, dataset: str, file_name: str, cache_dir: Path
+) -> Tuple[Path, Dict[str, object]]:
+    """
+    Return (cached_path, manifest) for the current remote version, downloading
+    and extracting only when the cache entry is missing or fails verification.
+    The download goes to download.part/ and is renamed to download/ only once
+    it finished, so a leftover file is never mistaken for a complete one. A
+    zip is kept in the entry until its member has been extracted (the member
+    CRC is checked while reading), so an interrupted extraction does not
+    trigger a new download. The manifest is written only when the size
+    matches the one reported by the source.
+    """
+    version = source.remote_version(dataset, file_name)
+    expected = _remote_size(version)
+    entry = cache_entry_dir(cache_dir, dataset, file_name, version)
+    cached = entry / file_name
+    manifest_path = entry / "manifest.json"
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if _is_valid(cached, manifest):
+            print(f"En caché y verificado: {cached}")
+            return cached, manifest
+        manifest_path.unlink()
+
+    entry.mkdir(parents=True, exist_ok=True)
+    download_dir = entry / "download"
+    downloaded = next(download_dir.glob("*"), None) if download_dir.exists() else None
+    if downloaded is None or not _usable_download(downloaded, file_name, expected):
+        shutil.rmtree(download_dir, ignore_errors=True)
+        part_dir = entry / "download.part"
+        shutil.rmtree(part_dir, ignore_errors=True)
+        part_dir.mkdir(parents=True)
+        downloaded = source.download(dataset, file_name, part_dir)
+        os.replace(part_dir, download_dir)
+        downloaded = download_dir / downloaded.relative_to(part_dir)
+
+    if zipfile.is_zipfile(downloaded):
+        with zipfile.ZipFile(downloaded, "r") as zf:
+            member = _zip_member(zf, file_name)
+            with zf.open(member, "r") as src:
+                size, sha256 = _copy_hashing(src, cached)
+    else:
+        with downloaded.open("rb") as src:
+            size, sha256 = _copy_hashing(src, cached)
+
+    # The source reports either the CSV or the zip that was served
+    if expected is not None and expected not in (size, downloaded.stat().st_size):
+        cached.unlink()
+        shutil.rmtree(download_dir, ignore_errors=True)
         raise RuntimeError(
-            f"No se pudo localizar el archivo '{file_name}' luego de la descarga."
+            f"La descarga de '{file_name}' no coincide con el tamaño remoto "
+            f"({size} bytes, se esperaban {expected})."
         )
-    finally:
-        shutil.rmtree(tmp_dir_path, ignore_errors=True)
+
+    manifest = {
+        "dataset": dataset,
+        "file": file_name,
+        "version": version,
+        "size": size,
+        "sha256": sha256,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    shutil.rmtree(download_dir, ignore_errors=True)
+    return cached, manifest
+
+
+def _zip_member(zf: zipfile.ZipFile, file_name: str) -> str:
+    names = zf.namelist()
+    if file_name in names:
+        return file_name
+    for name in names:
+        if Path(name).name == file_name:
+            return name
+    raise RuntimeError(f"El zip descargado no contiene '{file_name}'.")
+
+
+def download_single_file(
+    dataset: str,
+    file_name: str,
+    output_dir: Path,
+    cache_dir: Optional[Path] = None,
+    source: Optional[DatasetSource] = None,
+) -> Path:
+    """
+    Make output_dir/file_name the verified current version of the remote file.
+    Nothing is downloaded or copied when the cache and the output already match.
+    """
+    if source is None:
+        source = KaggleSource()
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cached, manifest = fetch_into_cache(source, dataset, file_name, cache_dir)
+
+    destination = output_dir / file_name
+    if destination.exists() and destination.samefile(cached):
+        return destination
+    if _is_valid(destination, manifest):
+        print(f"Archivo ya presente y verificado: {destination}")
+        return destination
+
+    tmp = destination.with_name(destination.name + ".part")
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        # Same filesystem: hard link, no second copy of the CSV
+        os.link(cached, tmp)
+    except OSError:
+        shutil.copyfile(cached, tmp)
+    os.replace(tmp, destination)
+    return destination
 
 
 def parse_args() -> argparse.Namespace:
@@ -151,6 +370,21 @@ def parse_args() -> argparse.Namespace:
         default=str(script_dir),
         help="Directorio de salida donde guardar el CSV descargado.",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help=f"Caché local de descargas verificadas (por defecto: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--source-dir",
+        default="",
+        help="Servir el dataset desde un directorio local <dir>/<owner>/<dataset>/ en lugar de Kaggle.",
+    )
+    parser.add_argument(
+        "--no-columnar",
+        action="store_true",
+        help="No generar la copia columnar (<archivo>.cols) que leen Marcas, Hashtags y ANOVA.",
+    )
     parser.add_argument(
         "--create-kaggle-json",
         action="store_true",
@@ -176,15 +410,28 @@ def main() -> int:
         if created:
             print(f"Archivo creado: {created}")
 
-    ensure_kaggle_credentials_present()
+    if args.source_dir:
+        source: DatasetSource = LocalSource(Path(args.source_dir))
+    else:
+        ensure_kaggle_credentials_present()
+        source = KaggleSource()
 
     output_dir = Path(args.output_dir).resolve()
 
     print(f"Descargando archivo '{args.file}' del dataset '{args.dataset}' en: {output_dir}")
-    downloaded_path = download_single_file(dataset=args.dataset, file_name=args.file, output_dir=output_dir)
+    downloaded_path = download_single_file(
+        dataset=args.dataset,
+        file_name=args.file,
+        output_dir=output_dir,
+        cache_dir=Path(args.cache_dir),
+        source=source,
+    )
 
     if downloaded_path.exists():
         print(f"CSV disponible: {downloaded_path}")
+        if not args.no_columnar:
+            cols_path = columnar.ensure_columnar(downloaded_path)
+            print(f"Columnar disponible: {cols_path}")
     else:
         print("Descarga finalizada, pero no se encontró el archivo esperado.")
 
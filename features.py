@@ -0,0 +1,324 @@
+"""
+Per-tweet feature table built in one streaming pass.
+
+Every registered extractor (text length, brand, hashtags, ...) sees each
+tweet once while the source is read a single time, and writes its values to
+its own table in a SQLite file keyed by tweet:
+
+  tweets(row, id, target, user)   one row per tweet, row = position in the source
+  f_<name>(row, <columns>)        zero or more rows per tweet for feature <name>
+  computed(name, rows)            features present in the file
+  meta(key, value)                size/mtime of the source CSV
+
+The scripts then query this file instead of re-parsing the CSV. Adding an
+extractor later only runs that extractor: the file is read once more (from
+its columnar copy when given one) but existing features are not recomputed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Tuple
+
+import columnar
+import compressed
+import mmap_csv
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INSERT_BATCH = 50_000
+
+
+class Tweet(NamedTuple):
+    row: int
+    id: str
+    target: str
+    user: str
+    text: str
+
+
+class FeatureExtractor(Protocol):
+    name: str
+    # (column name, SQL type) of the rows extract() returns
+    columns: Tuple[Tuple[str, str], ...]
+
+    def extract(self, tweet: Tweet) -> Iterable[tuple]:
+        ...
+
+
+EXTRACTORS: Dict[str, Callable[[], FeatureExtractor]] = {}
+
+
+def register(name: str):
+    """Class decorator: make an extractor available under `name`."""
+
+    def wrap(factory):
+        EXTRACTORS[name] = factory
+        return factory
+
+    return wrap
+
+
+def _import_tool(folder: str, module: str):
+    # The tools are scripts in their own folders, not packages
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return __import__(module)
+
+
+@register("length")
+class LengthFeature:
+    name = "length"
+    columns = (("length", "INTEGER"),)
+
+    def extract(self, tweet: Tweet) -> Iterable[tuple]:
+        return ((len(tweet.text),),)
+
+
+@register("brand")
+class BrandFeature:
+    name = "brand"
+    columns = (("brand", "TEXT"),)
+
+    def __init__(self) -> None:
+        marcas = _import_tool("Marcas", "exportar_marcas_csv")
+        self._matcher = marcas.load_brand_matcher()
+        self._classify = marcas.classify_brand
+
+    def extract(self, tweet: Tweet) -> Iterable[tuple]:
+        return ((self._classify(tweet.text, self._matcher),),)
+
+
+@register("brands")
+class BrandsFeature:
+    """Every brand mention in the tweet with its character span."""
+
+    name = "brands"
+    columns = (("brand", "TEXT"), ("start", "INTEGER"), ("end", "INTEGER"))
+
+    def __init__(self) -> None:
+        marcas = _import_tool("Marcas", "exportar_marcas_csv")
+        self._matcher = marcas.load_brand_matcher()
+        self._labels = self._matcher["labels"]
+        self._find = marcas.find_brands
+
+    def extract(self, tweet: Tweet) -> Iterable[tuple]:
+        return [(self._labels[c], a, b) for c, a, b in self._find(tweet.text, self._matcher)]
+
+
+@register("hashtags")
+class HashtagsFeature:
+    """Hashtags with their original case; queries lowercase them when asked."""
+
+    name = "hashtags"
+    columns = (("hashtag", "TEXT"),)
+
+    def __init__(self) -> None:
+        self._extract = _import_tool("Hashtags", "extract_hashtags").extract_hashtags
+
+    def extract(self, tweet: Tweet) -> Iterable[tuple]:
+        return [(tag,) for tag in self._extract(tweet.text)]
+
+
+def _header_indices(row: Sequence[str]) -> Optional[Tuple[int, int, int, int]]:
+    # (target, id, user, text) positions when the first record is a header
+    lowered = [c.strip().lower() for c in row]
+    if "text" not in lowered or "target" not in lowered:
+        return None
+    id_name = "ids" if "ids" in lowered else "id"
+    if id_name not in lowered or "user" not in lowered:
+        return None
+    return (lowered.index("target"), lowered.index(id_name), lowered.index("user"), lowered.index("text"))
+
+
+def iter_tweets(source: str, encoding: str = "latin-1") -> Iterator[Tweet]:
+    """
+    Tweets of a Sentiment140-style CSV (with or without header) or of its
+    columnar copy, numbered in order. Records missing any of the four
+    fields are skipped, so both kinds of source give the same rows. The CSV
+    may be compressed (see compressed.py).
+    """
+    if columnar.is_columnar(source):
+        with columnar.ColumnarTable(source) as table:
+            for row, (target, tweet_id, user, text) in enumerate(
+                table.iter_rows(("target", "ids", "user", "text"))
+            ):
+                yield Tweet(row, tweet_id, target, user, text)
+        return
+    with mmap_csv.open_csv(source, encoding=encoding) as f:
+        first, after = f.first_record()
+        idx = _header_indices(first)
+        start = after if idx is not None else 0
+        t_idx, id_idx, user_idx, text_idx = idx or (0, 1, 4, 5)
+        need = max(t_idx, id_idx, user_idx, text_idx)
+        row = 0
+        for fields in f.iter_rows(start):
+            if len(fields) <= need:
+                continue
+            yield Tweet(row, fields[id_idx], fields[t_idx], fields[user_idx], fields[text_idx])
+            row += 1
+
+
+def _signature(source: str) -> str:
+    # Size and mtime of the CSV; a columnar copy carries those of its CSV, so
+    # a table built from one can be extended from the other
+    path = Path(source)
+    if columnar.is_columnar(path):
+        sig = json.loads((path / "meta.json").read_text(encoding="utf-8"))["source"]
+    else:
+        st = Path(compressed.split_zip_member(source)[0]).stat()
+        sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return json.dumps(sig, sort_keys=True)
+
+
+def open_features(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS computed (name TEXT PRIMARY KEY, rows INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS tweets (
+            row INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            target TEXT NOT NULL,
+            user TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tweets_by_id ON tweets (id);
+        """
+    )
+    return conn
+
+
+def computed_features(conn: sqlite3.Connection) -> Dict[str, int]:
+    return dict(conn.execute("SELECT name, rows FROM computed"))
+
+
+def _reset(conn: sqlite3.Connection) -> None:
+    with conn:
+        for (name,) in conn.execute("SELECT name FROM computed").fetchall():
+            conn.execute(f'DROP TABLE IF EXISTS "f_{name}"')
+        conn.execute("DELETE FROM computed")
+        conn.execute("DELETE FROM tweets")
+        conn.execute("DELETE FROM meta")
+
+
+def build_features(
+    source: str,
+    db_path: str,
+    names: Optional[Sequence[str]] = None,
+    encoding: str = "latin-1",
+) -> List[str]:
+    """
+    Compute the requested features (all registered ones by default) for
+    source into db_path, in one pass. Features already in the file for the
+    same source are kept; a different or modified source starts over.
+    Returns the names computed in this call.
+    """
+    names = list(EXTRACTORS) if names is None else list(names)
+    unknown = [n for n in names if n not in EXTRACTORS]
+    if unknown:
+        raise ValueError(f"Unknown feature: {', '.join(unknown)} (available: {', '.join(EXTRACTORS)})")
+
+    conn = open_features(db_path)
+    try:
+        if not matches_source(conn, source):
+            _reset(conn)
+        have = computed_features(conn)
+        todo = [n for n in names if n not in have]
+        need_tweets = "tweets" not in have
+        if not todo and not need_tweets:
+            return []
+
+        extractors = [EXTRACTORS[n]() for n in todo]
+        inserts = []
+        with conn:
+            for ex in extractors:
+                cols = ", ".join(f'"{c}" {t}' for c, t in ex.columns)
+                conn.execute(f'DROP TABLE IF EXISTS "f_{ex.name}"')
+                conn.execute(f'CREATE TABLE "f_{ex.name}" (row INTEGER NOT NULL, {cols})')
+                marks = ", ".join("?" * (len(ex.columns) + 1))
+                inserts.append(f'INSERT INTO "f_{ex.name}" VALUES ({marks})')
+
+        pending_tweets: List[tuple] = []
+        pending: List[List[tuple]] = [[] for _ in extractors]
+        rows = 0
+
+        def flush() -> None:
+            with conn:
+                if pending_tweets:
+                    conn.executemany("INSERT INTO tweets VALUES (?, ?, ?, ?)", pending_tweets)
+                for sql, values in zip(inserts, pending):
+                    conn.executemany(sql, values)
+            pending_tweets.clear()
+            for values in pending:
+                values.clear()
+
+        for tweet in iter_tweets(source, encoding):
+            if need_tweets:
+                pending_tweets.append((tweet.row, tweet.id, tweet.target, tweet.user))
+            for ex, values in zip(extractors, pending):
+                for value in ex.extract(tweet):
+                    values.append((tweet.row, *value))
+            rows += 1
+            if rows % INSERT_BATCH == 0:
+                flush()
+                print(f"Progress: {rows} tweets...", file=sys.stderr)
+        flush()
+
+        with conn:
+            for ex in extractors:
+                conn.execute(f'CREATE INDEX "f_{ex.name}_by_row" ON "f_{ex.name}" (row)')
+            done = todo + (["tweets"] if need_tweets else [])
+            conn.executemany("INSERT OR REPLACE INTO computed VALUES (?, ?)", [(n, rows) for n in done])
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (_signature(source),))
+        return todo
+    finally:
+        conn.close()
+
+
+def require(conn: sqlite3.Connection, name: str) -> None:
+    """Fail with a clear message when the file lacks feature `name`."""
+    if name not in computed_features(conn):
+        raise SystemExit(f"The feature table has no '{name}'; run: features.py build --features {name}")
+
+
+def matches_source(conn: sqlite3.Connection, source: str) -> bool:
+    """True when the file was built from `source` (or its columnar copy) as it is now."""
+    stored = dict(conn.execute("SELECT key, value FROM meta"))
+    return stored.get("source") == _signature(source)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-tweet feature table (one pass).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Compute the missing features")
+    b.add_argument("--source", required=True, help="Sentiment140 CSV (also .gz/.zst/.zip) or its columnar copy (.cols)")
+    b.add_argument("--db", required=True, help="SQLite feature file")
+    b.add_argument("--features", default="", help=f"Comma-separated list (default: {','.join(EXTRACTORS)})")
+    b.add_argument("--encoding", default="latin-1", help="CSV encoding (default: latin-1)")
+    ls = sub.add_parser("list", help="Show the computed features")
+    ls.add_argument("--db", required=True, help="SQLite feature file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        names = [n.strip() for n in args.features.split(",") if n.strip()] or None
+        done = build_features(args.source, args.db, names, encoding=args.encoding)
+        print(f"Computed: {', '.join(done) if done else 'none (all were there)'}")
+    else:
+        conn = open_features(args.db)
+        try:
+            for name, rows in computed_features(conn).items():
+                print(f"{name}\t{rows}")
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,535 @@
+"""
+Joins by tweet id between the tool outputs and the European label corpus.
+
+  joins.py hashtags.csv marcas.csv --output marca_hashtag.csv
+  joins.py hashtags.csv european --output hashtag_label.csv --count hashtag,label
+
+A source is a CSV with a header whose key column is id, ids or TweetID (or
+--left-key/--right-key), such as the output of extract_hashtags.py (id,
+target,hashtag) or exportar_marcas_csv.py (ids,user,text,Marca), or the
+European corpus ("european" or its folder, via the european.py cache) with
+columns label, annotator and language.
+
+Both sides are reduced to sorted int64 id arrays paired with a row
+reference; the other columns of a CSV row are stored once, already
+formatted, in a spool file the reference points into. Ids are sorted in
+runs of at most --memory-rows; when a side has more rows, the sorted runs
+are written to temporary .npy files and memory-mapped. The join then walks
+the id space in ranges holding about --memory-rows ids (boundaries from a
+sample of every run), slices each run with searchsorted and merges the two
+sorted sides with searchsorted as well, so memory stays bounded and the
+output comes out ordered by id.
+
+The smaller side is read first and a Bloom filter of its ids is checked on
+every row of the other side: rows that cannot match are dropped before
+their columns are formatted or stored. A filter of the surviving ids of the
+second side drops the rows of the first one that will not match before the
+merge.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import compressed
+import european
+import mmap_csv
+import pipeline
+
+
+KEY_NAMES = ("id", "ids", "tweetid")
+MEMORY_ROWS = 1 << 23
+BATCH_ROWS = 1 << 16
+SAMPLES_PER_RUN = 1024
+BLOOM_FP = 0.01
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    # Wrapping uint64 arithmetic; numpy does not warn on array overflow
+    z = x + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class BloomFilter:
+    """Bloom filter over int64 keys; add() and contains() take whole arrays."""
+
+    def __init__(self, capacity: int, fp_rate: float = BLOOM_FP) -> None:
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.bits = max(64, (bits + 63) // 64 * 64)
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._words = np.zeros(self.bits // 64, dtype=np.uint64)
+
+    def _positions(self, keys: np.ndarray) -> Iterator[np.ndarray]:
+        x = keys.astype(np.uint64, copy=False)
+        h1 = _splitmix64(x)
+        h2 = _splitmix64(x ^ np.uint64(0x5851F42D4C957F2D)) | np.uint64(1)
+        m = np.uint64(self.bits)
+        for i in range(self.hashes):
+            yield (h1 + np.uint64(i) * h2) % m
+
+    def add(self, keys: np.ndarray) -> None:
+        for pos in self._positions(keys):
+            np.bitwise_or.at(self._words, pos >> np.uint64(6), np.uint64(1) << (pos & np.uint64(63)))
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.ones(len(keys), dtype=bool)
+        for pos in self._positions(keys):
+            found &= (self._words[pos >> np.uint64(6)] >> (pos & np.uint64(63))) & np.uint64(1) != 0
+        return found
+
+
+class Runs:
+    """
+    (id, ref) pairs of one side as sorted runs: in memory while they fit in
+    memory_rows, otherwise spilled to .npy files in workdir.
+    """
+
+    def __init__(self, workdir: str, name: str, memory_rows: int) -> None:
+        self._workdir = workdir
+        self._name = name
+        self._memory_rows = memory_rows
+        self._ids: List[np.ndarray] = []
+        self._refs: List[np.ndarray] = []
+        self._pending = 0
+        self.runs: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.spilled = 0
+        self.rows = 0
+
+    def add(self, ids: np.ndarray, refs: np.ndarray) -> None:
+        self._ids.append(ids)
+        self._refs.append(refs)
+        self._pending += len(ids)
+        self.rows += len(ids)
+        if self._pending >= self._memory_rows:
+            self._cut(spill=True)
+
+    def _cut(self, spill: bool) -> None:
+        if not self._pending:
+            return
+        ids = np.concatenate(self._ids)
+        refs = np.concatenate(self._refs)
+        self._ids, self._refs, self._pending = [], [], 0
+        order = np.argsort(ids, kind="stable")
+        ids, refs = ids[order], refs[order]
+        if spill:
+            base = os.path.join(self._workdir, f"{self._name}_{len(self.runs)}")
+            np.save(base + ".ids.npy", ids)
+            np.save(base + ".refs.npy", refs)
+            ids = np.load(base + ".ids.npy", mmap_mode="r")
+            refs = np.load(base + ".refs.npy", mmap_mode="r")
+            self.spilled += 1
+        self.runs.append((ids, refs))
+
+    def finish(self) -> "Runs":
+        # The last run stays in memory unless earlier ones were spilled
+        self._cut(spill=bool(self.runs))
+        return self
+
+    def sample(self) -> np.ndarray:
+        parts = [ids[:: max(1, len(ids) // SAMPLES_PER_RUN)] for ids, _ in self.runs]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def slice(self, lo: Optional[int], hi: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted (ids, refs) with lo <= id < hi (None: unbounded); ties keep source order."""
+        ids_parts, refs_parts = [], []
+        for ids, refs in self.runs:
+            a = 0 if lo is None else int(np.searchsorted(ids, lo, "left"))
+            b = len(ids) if hi is None else int(np.searchsorted(ids, hi, "left"))
+            if b > a:
+                ids_parts.append(np.asarray(ids[a:b]))
+                refs_parts.append(np.asarray(refs[a:b]))
+        if not ids_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if len(ids_parts) == 1:
+            return ids_parts[0], refs_parts[0]
+        ids = np.concatenate(ids_parts)
+        refs = np.concatenate(refs_parts)
+        order = np.argsort(ids, kind="stable")
+        return ids[order], refs[order]
+
+
+class CSVSource:
+    """A CSV with a header; every column but the key is carried to the output."""
+
+    def __init__(self, path: str, key: Optional[str] = None, encoding: str = "utf-8") -> None:
+        self.path = path
+        self.encoding = encoding
+        self.name = os.path.basename(path)
+        with mmap_csv.open_csv(path, encoding=encoding) as f:
+            header, self._start = f.first_record()
+        lowered = [c.strip().lower() for c in header]
+        wanted = [key.lower()] if key else list(KEY_NAMES)
+        found = [lowered.index(k) for k in wanted if k in lowered]
+        if not found:
+            raise ValueError(f"{path}: no {' / '.join(wanted)} column in the header ({', '.join(header)})")
+        self.key_index = found[0]
+        self.columns = [c for i, c in enumerate(header) if i != self.key_index]
+        self._spool_path: Optional[str] = None
+        self._heap: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    def size_hint(self) -> int:
+        return Path(compressed.split_zip_member(self.path)[0]).stat().st_size
+
+    def scan(
+        self,
+        workdir: str,
+        runs: Runs,
+        keep: Optional[BloomFilter] = None,
+        times: Optional[pipeline.StageTimes] = None,
+    ) -> Tuple[int, int, int]:
+        """
+        Read the source once into runs: (rows, dropped by the filter, rows
+        without a numeric id). The other columns of the kept rows go to a spool.
+        """
+        times = times or pipeline.StageTimes()
+        self._spool_path = os.path.join(workdir, f"spool_{id(self)}.bin")
+        k = self.key_index
+        buf = io.StringIO(newline="")
+        writer = csv.writer(buf, lineterminator="")
+        offsets = [np.zeros(1, dtype=np.int64)]
+        position = 0
+        rows = dropped = bad = 0
+        with mmap_csv.open_csv(self.path, encoding=self.encoding) as fin, open(self._spool_path, "wb") as spool:
+            batch: List[List[str]] = []
+            ids_list: List[int] = []
+
+            def flush() -> None:
+                nonlocal position, dropped
+                ids = np.array(ids_list, dtype=np.int64)
+                if keep is not None:
+                    with times.measure("bloom"):
+                        mask = keep.contains(ids)
+                    dropped += len(ids) - int(mask.sum())
+                    ids = ids[mask]
+                    kept = [r for r, m in zip(batch, mask.tolist()) if m]
+                else:
+                    kept = batch
+                with times.measure("spool"):
+                    data = []
+                    for r in kept:
+                        writer.writerow(r[:k] + r[k + 1:])
+                        data.append(buf.getvalue().encode("utf-8"))
+                        buf.seek(0)
+                        buf.truncate()
+                    lengths = np.fromiter((len(d) for d in data), dtype=np.int64, count=len(data))
+                    ends = position + np.cumsum(lengths)
+                    spool.write(b"".join(data))
+                    refs = np.arange(runs.rows, runs.rows + len(ids), dtype=np.int64)
+                    if len(ends):
+                        position = int(ends[-1])
+                    offsets.append(ends)
+                with times.measure("sort"):
+                    runs.add(ids, refs)
+                batch.clear()
+                ids_list.clear()
+
+            for row in times.timed(pipeline.READ, fin.iter_rows(self._start)):
+                if len(row) <= k:
+                    bad += 1
+                    continue
+                try:
+                    ids_list.append(int(row[k]))
+                except ValueError:
+                    bad += 1
+                    continue
+                batch.append(row)
+                rows += 1
+                if len(batch) >= BATCH_ROWS:
+                    flush()
+            flush()
+        with times.measure("sort"):
+            runs.finish()
+        self._offsets = np.concatenate(offsets)
+        return rows, dropped, bad
+
+    def payloads(self, refs: np.ndarray) -> List[str]:
+        if self._heap is None:
+            assert self._spool_path is not None
+            with open(self._spool_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return ["" for _ in refs]
+                self._heap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        off = self._offsets
+        heap = self._heap
+        return [heap[off[r]:off[r + 1]].decode("utf-8") for r in refs.tolist()]
+
+    def close(self) -> None:
+        if self._heap is not None:
+            self._heap.close()
+            self._heap = None
+
+
+class EuropeanSource:
+    """The European corpus through its cache (european.py); references are row numbers."""
+
+    columns = ["label", "annotator", "language"]
+
+    def __init__(self, folder: Optional[str] = None) -> None:
+        self.name = "european"
+        self._table = european.load(folder or european.DEFAULT_FOLDER)
+        cols = self._table.arrays()
+        self._ids = cols["ids"]
+        self._label = cols["label"]
+        self._annotator = cols["annotator"]
+        self._lang = cols["lang"]
+        self._labels = self._table.labels
+
+    def size_hint(self) -> int:
+        return self._table.rows * 16
+
+    def scan(
+        self,
+        workdir: str,
+        runs: Runs,
+        keep: Optional[BloomFilter] = None,
+        times: Optional[pipeline.StageTimes] = None,
+    ) -> Tuple[int, int, int]:
+        times = times or pipeline.StageTimes()
+        dropped = 0
+        for a in range(0, self._table.rows, BATCH_ROWS):
+            ids = np.asarray(self._ids[a:a + BATCH_ROWS])
+            refs = np.arange(a, a + len(ids), dtype=np.int64)
+            if keep is not None:
+                with times.measure("bloom"):
+                    mask = keep.contains(ids)
+                dropped += len(ids) - int(mask.sum())
+                ids, refs = ids[mask], refs[mask]
+            with times.measure("sort"):
+                runs.add(ids, refs)
+        with times.measure("sort"):
+            runs.finish()
+        return self._table.rows, dropped, 0
+
+    def payloads(self, refs: np.ndarray) -> List[str]:
+        labels = self._labels
+        languages = self._table.languages
+        return [
+            f"{labels[l] if l >= 0 else ''},{a},{languages[g]}"
+            for l, a, g in zip(self._label[refs].tolist(), self._annotator[refs].tolist(), self._lang[refs].tolist())
+        ]
+
+    def close(self) -> None:
+        # The numpy views hold the maps open; they are released with the object
+        self._ids = self._label = self._annotator = self._lang = None  # type: ignore[assignment]
+        self._table.close()
+
+
+def open_source(spec: str, key: Optional[str] = None, encoding: str = "utf-8"):
+    """CSVSource, or EuropeanSource for 'european' or a folder of *_Twitter_sentiment.csv."""
+    if spec.lower() == "european":
+        return EuropeanSource()
+    if os.path.isdir(spec) and european.corpus_files(Path(spec)):
+        return EuropeanSource(spec)
+    if not os.path.exists(compressed.split_zip_member(spec)[0]):
+        raise FileNotFoundError(f"File not found: {spec}")
+    return CSVSource(spec, key=key, encoding=encoding)
+
+
+def _boundaries(samples: np.ndarray, parts: int) -> List[Optional[int]]:
+    # parts - 1 distinct cut points between None (-inf) and None (+inf)
+    if parts <= 1 or not len(samples):
+        return [None, None]
+    samples = np.sort(samples)
+    cuts = np.unique(samples[(np.arange(1, parts) * len(samples)) // parts])
+    return [None] + [int(c) for c in cuts] + [None]
+
+
+def _pairs(lk: np.ndarray, rk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Positions (i in lk, j in rk) of equal keys; both arrays are sorted
+    first = np.searchsorted(rk, lk, "left")
+    count = np.searchsorted(rk, lk, "right") - first
+    li = np.repeat(np.arange(len(lk)), count)
+    starts = np.cumsum(count) - count
+    rj = np.repeat(first - starts, count) + np.arange(len(li))
+    return li, rj
+
+
+def _lines(keys: List[int], lp: List[str], rp: List[str], with_left: bool, with_right: bool) -> List[str]:
+    # A side with only the key column has an empty payload: it adds no field
+    if with_left and with_right:
+        return [f"{k},{p},{q}" for k, p, q in zip(keys, lp, rp)]
+    if with_left:
+        return [f"{k},{p}" for k, p in zip(keys, lp)]
+    if with_right:
+        return [f"{k},{q}" for k, q in zip(keys, rp)]
+    return [str(k) for k in keys]
+
+
+def _output_columns(left, right) -> List[str]:
+    columns = ["id"] + list(left.columns)
+    for c in right.columns:
+        columns.append(c if c not in columns else f"{c}_2")
+    return columns
+
+
+def join(
+    left_spec: str,
+    right_spec: str,
+    output: str,
+    left_key: Optional[str] = None,
+    right_key: Optional[str] = None,
+    encoding: str = "utf-8",
+    count: Optional[Sequence[str]] = None,
+    memory_rows: int = MEMORY_ROWS,
+    fp_rate: float = BLOOM_FP,
+    times: Optional[pipeline.StageTimes] = None,
+) -> Dict[str, int]:
+    """
+    Inner join of two sources on the tweet id into output (CSV, also
+    .gz/.zst/.zip), ordered by id. With count, output has those columns and
+    n, the number of joined rows per combination, from most to least frequent.
+    Returns counters for the summary.
+    """
+    times = times or pipeline.StageTimes()
+    workdir = tempfile.mkdtemp(prefix="joins_")
+    with times.measure("open"):
+        left = open_source(left_spec, left_key, encoding)
+        right = open_source(right_spec, right_key, encoding)
+    stats: Dict[str, int] = {}
+    try:
+        columns = _output_columns(left, right)
+        if count:
+            missing = [c for c in count if c not in columns]
+            if missing:
+                raise ValueError(f"Unknown columns for --count: {', '.join(missing)} (available: {', '.join(columns)})")
+
+        # The smaller side is read first; its filter skips rows of the other one
+        sides = {"left": left, "right": right}
+        first, second = sorted(sides, key=lambda s: sides[s].size_hint())
+        runs = {s: Runs(workdir, s, memory_rows) for s in sides}
+        rows, _, bad = sides[first].scan(workdir, runs[first], None, times)
+        stats[f"{first}_rows"], stats[f"{first}_bad"] = rows, bad
+        with times.measure("bloom"):
+            bloom = BloomFilter(runs[first].rows, fp_rate)
+            for ids, _ in runs[first].runs:
+                bloom.add(np.asarray(ids))
+        rows, dropped, bad = sides[second].scan(workdir, runs[second], bloom, times)
+        stats[f"{second}_rows"], stats[f"{second}_bad"] = rows, bad
+        stats[f"{second}_bloom_dropped"] = dropped
+        with times.measure("bloom"):
+            back = BloomFilter(runs[second].rows, fp_rate)
+            for ids, _ in runs[second].runs:
+                back.add(np.asarray(ids))
+
+        total = runs["left"].rows + runs["right"].rows
+        parts = max(1, math.ceil(total / memory_rows))
+        cuts = _boundaries(np.concatenate([runs["left"].sample(), runs["right"].sample()]), parts)
+        stats["partitions"] = len(cuts) - 1
+        stats["spilled_runs"] = runs["left"].spilled + runs["right"].spilled
+
+        written = 0
+        skipped = 0
+        counts: Counter = Counter()
+        picks = [columns.index(c) for c in count] if count else []
+        with compressed.open_output(output, "utf-8") as fout, pipeline.AsyncWriter(fout, times) as writer:
+            writer.writerow(list(count) + ["n"] if count else columns)
+            for lo, hi in zip(cuts, cuts[1:]):
+                with times.measure("merge"):
+                    lk, lr = runs["left"].slice(lo, hi)
+                    rk, rr = runs["right"].slice(lo, hi)
+                    # The filter of the second side drops first-side ids that cannot match
+                    fk, fr = (lk, lr) if first == "left" else (rk, rr)
+                    mask = back.contains(fk)
+                    skipped += len(fk) - int(mask.sum())
+                    fk, fr = fk[mask], fr[mask]
+                    lk, lr, rk, rr = (fk, fr, rk, rr) if first == "left" else (lk, lr, fk, fr)
+                for a in range(0, len(lk), BATCH_ROWS):
+                    with times.measure("merge"):
+                        li, rj = _pairs(lk[a:a + BATCH_ROWS], rk)
+                    if not len(li):
+                        continue
+                    with times.measure("fetch"):
+                        keys = lk[a:a + BATCH_ROWS][li].tolist()
+                        lp = left.payloads(lr[a:a + BATCH_ROWS][li])
+                        rp = right.payloads(rr[rj])
+                    written += len(keys)
+                    lines = _lines(keys, lp, rp, bool(left.columns), bool(right.columns))
+                    if count:
+                        with times.measure("count"):
+                            for record in csv.reader(lines):
+                                counts[tuple(record[i] for i in picks)] += 1
+                    else:
+                        writer.write("\r\n".join(lines) + "\r\n")
+            if count:
+                writer.writerows([list(k) + [str(n)] for k, n in counts.most_common()])
+        stats[f"{first}_filter_dropped"] = skipped
+        stats["joined"] = written
+        if count:
+            stats["groups"] = len(counts)
+        return stats
+    finally:
+        left.close()
+        right.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Join the outputs of the tools and the European corpus by tweet id.")
+    parser.add_argument("left", help="CSV with a header (id/ids/TweetID), or 'european' / the European corpus folder")
+    parser.add_argument("right", help="Same as left")
+    parser.add_argument("--output", required=True, help="Output CSV (also .gz/.zst/.zip)")
+    parser.add_argument("--left-key", default=None, help="Id column of left (default: id, ids or TweetID)")
+    parser.add_argument("--right-key", default=None, help="Id column of right (default: id, ids or TweetID)")
+    parser.add_argument("--encoding", default="utf-8", help="Encoding of the input CSVs (default: utf-8)")
+    parser.add_argument("--count", default="", help="Count joined rows by these columns, e.g. Marca,hashtag")
+    parser.add_argument("--memory-rows", type=int, default=MEMORY_ROWS, help=f"Ids per in-memory range (default: {MEMORY_ROWS})")
+    parser.add_argument("--bloom-fp", type=float, default=BLOOM_FP, help=f"False positive rate of the Bloom filter (default: {BLOOM_FP})")
+    parser.add_argument("--timings", action="store_true", help="Show the time of each stage")
+    args = parser.parse_args()
+
+    count = [c.strip() for c in args.count.split(",") if c.strip()] or None
+    times = pipeline.StageTimes(
+        ("open", pipeline.READ, "spool", "bloom", "sort", "merge", "fetch", "count", pipeline.WRITE, pipeline.QUEUE_WAIT)
+    )
+    t0 = time.perf_counter()
+    try:
+        stats = join(
+            args.left,
+            args.right,
+            args.output,
+            left_key=args.left_key,
+            right_key=args.right_key,
+            encoding=args.encoding,
+            count=count,
+            memory_rows=max(1, args.memory_rows),
+            fp_rate=args.bloom_fp,
+            times=times,
+        )
+    except (FileNotFoundError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    for side in ("left", "right"):
+        line = f"{side}: {stats[f'{side}_rows']} rows"
+        if stats.get(f"{side}_bad"):
+            line += f", {stats[f'{side}_bad']} without a numeric id"
+        dropped = stats.get(f"{side}_bloom_dropped", 0) + stats.get(f"{side}_filter_dropped", 0)
+        if dropped:
+            line += f", {dropped} dropped by the Bloom filter"
+        print(line)
+    print(f"Joined rows: {stats['joined']}" + (f" in {stats['groups']} groups" if count else ""))
+    print(f"Output: {args.output}")
+    if args.timings:
+        print(times.report(time.perf_counter() - t0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Memory-mapped CSV reader shared by the tweet tools (latin-1 Sentiment140 files).
+
+The file is mapped once instead of being read through a text wrapper. Record
+boundaries are found over the raw bytes: a batch ends at the last newline
+with an even number of quotes before it, so quoted fields that span lines
+never straddle two batches and every batch starts on a record. Each batch is
+decoded in one call and split into fields by the C csv tokenizer, so rows
+are the same as csv.reader over the whole file. Batch end offsets are exact
+byte positions, usable to resume or to split the file between workers.
+The encoding must be ASCII-compatible (latin-1, utf-8, cp1252, ...).
+
+Compressed files (gzip, zstd, zip member; see compressed.py) cannot be
+mapped; open_csv() returns a StreamCSV for them instead, with the same
+methods over the decompressed bytes read front to back.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import mmap
+import os
+from itertools import chain
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import compressed
+
+
+BATCH_BYTES = 1 << 20
+
+
+def _record_cut(block: bytes) -> int:
+    # End of the last complete record in block (0 if there is none)
+    cut = block.rfind(b"\n") + 1
+    # Back off to a newline that is not inside a quoted field
+    while cut > 0 and block.count(b'"', 0, cut) & 1:
+        cut = block.rfind(b"\n", 0, cut - 1) + 1
+    return cut
+
+
+class MmapCSV:
+    """
+    Read-only mmap of a CSV file.
+
+    >>> with MmapCSV(path) as f:
+    ...     header, pos = f.first_record()
+    ...     for row in f.iter_rows(pos):
+    ...         ...
+    """
+
+    def __init__(self, path: str, encoding: str = "latin-1") -> None:
+        self.path = path
+        self.encoding = encoding
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def __enter__(self) -> "MmapCSV":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def batches(
+        self, start: int = 0, batch_bytes: int = BATCH_BYTES, stop: Optional[int] = None
+    ) -> Iterator[Tuple[str, int]]:
+        """
+        Yield (decoded text, end offset) for record-aligned blocks of about
+        batch_bytes from `start` (which must be a record boundary) to EOF,
+        or to `stop` when given (also a record boundary).
+        """
+        mm = self._mm
+        size = self.size if stop is None else min(stop, self.size)
+        enc = self.encoding
+        pos = start
+        while pos < size:
+            limit = pos + batch_bytes
+            while True:
+                if limit >= size:
+                    block = mm[pos:size]
+                    cut = len(block)
+                    break
+                block = mm[pos:limit]
+                cut = _record_cut(block)
+                if cut > 0:
+                    break
+                # One record longer than the batch: look further
+                limit += batch_bytes
+            yield block[:cut].decode(enc), pos + cut
+            pos += cut
+
+    def first_record(self, start: int = 0) -> Tuple[List[str], int]:
+        """(all fields of the record at `start`, offset of the next record); ([], start) at EOF."""
+        mm = self._mm
+        end = start
+        while end < self.size:
+            nl = mm.find(b"\n", end)
+            end = self.size if nl < 0 else nl + 1
+            if not mm[start:end].count(b'"') & 1:
+                break
+        if end == start:
+            return [], start
+        text = mm[start:end].decode(self.encoding)
+        return next(csv.reader(io.StringIO(text, newline="")), []), end
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[List[str]]:
+        """Every record from `start` (to `stop`) as a list of fields, like csv.reader."""
+        # chain keeps the per-row loop in C; Python only runs once per batch
+        return chain.from_iterable(
+            csv.reader(io.StringIO(text, newline="")) for text, _ in self.batches(start, stop=stop)
+        )
+
+
+class StreamCSV:
+    """
+    MmapCSV's methods over a forward-only byte stream (a decompressed file).
+    Offsets count decompressed bytes. first_record() does not consume the
+    stream; batches() and iter_rows() can start anywhere not yet passed.
+    `size` is None until the stream has been read to the end.
+    """
+
+    def __init__(self, stream: BinaryIO, encoding: str = "latin-1", path: Optional[str] = None) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.size: Optional[int] = None
+        self._f = stream
+        self._buf = b""
+        self._buf_pos = 0  # offset of _buf[0]
+        self._eof = False
+
+    def __enter__(self) -> "StreamCSV":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def _read_more(self, n: int) -> bool:
+        if self._eof:
+            return False
+        block = self._f.read(n)
+        if not block:
+            self._eof = True
+            self.size = self._buf_pos + len(self._buf)
+            return False
+        self._buf += block
+        return True
+
+    def _seek(self, start: int) -> None:
+        if start < self._buf_pos:
+            raise ValueError(f"{self.path or 'stream'}: offset {start} was already read")
+        while self._buf_pos + len(self._buf) < start and self._read_more(BATCH_BYTES):
+            pass
+        drop = min(start - self._buf_pos, len(self._buf))
+        self._buf = self._buf[drop:]
+        self._buf_pos += drop
+
+    def batches(
+        self, start: int = 0, batch_bytes: int = BATCH_BYTES, stop: Optional[int] = None
+    ) -> Iterator[Tuple[str, int]]:
+        self._seek(start)
+        enc = self.encoding
+        while True:
+            # Bytes up to `stop` behave like the end of the stream
+            avail = len(self._buf) if stop is None else min(len(self._buf), stop - self._buf_pos)
+            at_end = self._eof or (stop is not None and self._buf_pos + len(self._buf) >= stop)
+            block = self._buf if avail == len(self._buf) else self._buf[:max(avail, 0)]
+            cut = _record_cut(block) if avail >= batch_bytes or at_end else 0
+            if cut == 0:
+                if not at_end and self._read_more(batch_bytes):
+                    continue
+                if avail <= 0:
+                    return
+                cut = avail
+            block = self._buf[:cut]
+            self._buf = self._buf[cut:]
+            self._buf_pos += cut
+            yield block.decode(enc), self._buf_pos
+
+    def first_record(self, start: int = 0) -> Tuple[List[str], int]:
+        self._seek(start)
+        end = 0
+        while True:
+            nl = self._buf.find(b"\n", end)
+            if nl < 0:
+                if self._read_more(BATCH_BYTES):
+                    continue
+                end = len(self._buf)
+                break
+            end = nl + 1
+            if not self._buf.count(b'"', 0, end) & 1:
+                break
+        if end == 0:
+            return [], start
+        text = self._buf[:end].decode(self.encoding)
+        return next(csv.reader(io.StringIO(text, newline="")), []), start + end
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[List[str]]:
+        return chain.from_iterable(
+            csv.reader(io.StringIO(text, newline="")) for text, _ in self.batches(start, stop=stop)
+        )
+
+
+def open_csv(path: str, encoding: str = "latin-1") -> Union[MmapCSV, StreamCSV]:
+    """MmapCSV for a plain file, StreamCSV over the decompressed data of a compressed one."""
+    if compressed.is_compressed(path):
+        return StreamCSV(compressed.open_input(path), encoding, path)
+    return MmapCSV(path, encoding)
@@ -0,0 +1,183 @@
+"""
+Pipelined output for the CSV exporters.
+
+The main thread reads and computes batches of output rows; a writer thread
+formats each batch with csv.writer.writerows into memory and hands it to
+the output file in one large write. The queue between them is bounded, so
+at most `max_batches` batches wait in memory and a slow disk (or a gzip
+output) throttles the producer instead of growing the heap. File writes
+and zlib release the GIL, so they overlap with parsing and classification.
+
+StageTimes adds up the seconds spent in each stage for the --timings
+reports and benchmark.py. Every tool uses the stage names below, so their
+reports and benchmark phases line up: read, compute, plot, workers (waiting
+on a process pool), write, and queue wait (the producer blocked on a full
+queue). Stages specific to one tool (e.g. bloom, sort in joins.py) come
+after them.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, TypeVar
+
+
+MAX_BATCHES = 8
+READ = "read"
+COMPUTE = "compute"
+PLOT = "plot"
+WORKERS = "workers"
+WRITE = "write"
+QUEUE_WAIT = "queue wait"
+STAGES = (READ, COMPUTE, PLOT, WORKERS, WRITE, QUEUE_WAIT)
+T = TypeVar("T")
+_STOP = object()
+
+
+class StageTimes:
+    """
+    Seconds spent per stage; reported in `order`, then in first-use order.
+    add() is called from the writer thread as well as the main thread.
+    """
+
+    def __init__(self, order: Sequence[str] = STAGES) -> None:
+        self.order = tuple(order)
+        self.seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def timed(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield from items, charging the time spent producing each one to stage."""
+        it = iter(items)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - t0)
+                return
+            self.add(stage, time.perf_counter() - t0)
+            yield item
+
+    def report(self, wall: Optional[float] = None) -> str:
+        total = sum(self.seconds.values())
+        base = wall if wall else total
+        stages = [s for s in self.order if s in self.seconds] + [s for s in self.seconds if s not in self.order]
+        width = max([len(s) for s in stages] + [4]) + 2
+        lines = []
+        for stage in stages:
+            secs = self.seconds[stage]
+            lines.append(f"  {stage:<{width}}{secs:9.3f} s  {100 * secs / base if base else 0:5.1f}%")
+        if wall is not None:
+            # The writer thread overlaps the other stages, so they can add up to more than this
+            lines.append(f"  {'wall':<{width}}{wall:9.3f} s")
+        return "\n".join(lines)
+
+
+class AsyncWriter:
+    """
+    csv.writer-like sink whose formatting and writing run in a background
+    thread. Batches are written in the order they were queued.
+
+    >>> with AsyncWriter(fout, times) as w:
+    ...     w.writerows(header_and_rows)
+    ...     w.write(already_formatted_csv_text)
+    """
+
+    def __init__(
+        self,
+        fout: TextIO,
+        times: Optional[StageTimes] = None,
+        max_batches: int = MAX_BATCHES,
+        stage: str = WRITE,
+        wait_stage: str = QUEUE_WAIT,
+        **csv_options: Any,
+    ) -> None:
+        self._fout = fout
+        self._times = times
+        self._stage = stage
+        self._wait_stage = wait_stage
+        self._csv_options = csv_options
+        self._queue: "queue.Queue[object]" = queue.Queue(max_batches)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        buf = io.StringIO(newline="")
+        writer = csv.writer(buf, **self._csv_options)
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue  # drain so the producer never blocks
+            t0 = time.perf_counter()
+            try:
+                if isinstance(item, str):
+                    self._fout.write(item)
+                else:
+                    writer.writerows(item)  # type: ignore[arg-type]
+                    self._fout.write(buf.getvalue())
+                    buf.seek(0)
+                    buf.truncate()
+            except BaseException as exc:
+                self._error = exc
+            if self._times is not None:
+                self._times.add(self._stage, time.perf_counter() - t0)
+
+    def _put(self, item: object) -> None:
+        if self._error is not None:
+            raise self._error
+        if self._times is None:
+            self._queue.put(item)
+            return
+        t0 = time.perf_counter()
+        self._queue.put(item)
+        self._times.add(self._wait_stage, time.perf_counter() - t0)
+
+    def writerows(self, rows: Sequence[List[str]]) -> None:
+        """Queue a batch of rows (the list is handed over, do not reuse it)."""
+        if rows:
+            self._put(rows)
+
+    def writerow(self, row: List[str]) -> None:
+        self._put([row])
+
+    def write(self, text: str) -> None:
+        """Queue text that is already CSV (e.g. produced by a worker process)."""
+        if text:
+            self._put(text)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "AsyncWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
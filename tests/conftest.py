@@ -0,0 +1,39 @@
+import gzip
+import os
+import sys
+import zipfile
+
+import pytest
+
+# The tools are scripts in their own folders, not packages
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("", "ANOVA", "Hashtags", "Marcas"):
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def compress(tmp_path):
+    """compress(plain, kind): a compressed copy of plain as "gz", "zip" or "member" (path inside the zip)."""
+
+    def _compress(plain, kind):
+        data = plain.read_bytes()
+        if kind == "gz":
+            path = tmp_path / "tweets.csv.gz"
+            path.write_bytes(gzip.compress(data))
+            return str(path)
+        archive = tmp_path / "tweets.zip"
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("tweets.csv", data)
+        return str(archive) if kind == "zip" else f"{archive}/tweets.csv"
+
+    return _compress
+
+
+@pytest.fixture(params=["gz", "zip", "zst"])
+def compressed_suffix(request):
+    """Output suffixes compressed.open_output understands; zst only with zstandard installed."""
+    if request.param == "zst":
+        pytest.importorskip("zstandard")
+    return request.param
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import acuerdo
+
+
+def _columnas(unidades):
+    # unidades: [[(anotador, etiqueta), ...] por tweet] -> ids, etiquetas, anotadores
+    ids, etiquetas, anotadores = [], [], []
+    for tweet, anotaciones in enumerate(unidades):
+        for anotador, etiqueta in anotaciones:
+            ids.append(1000 + tweet)
+            etiquetas.append(etiqueta)
+            anotadores.append(anotador)
+    return np.array(ids, dtype=np.int64), np.array(etiquetas, dtype=np.int8), np.array(anotadores, dtype=np.int16)
+
+
+def test_acuerdo_perfecto():
+    unidades = [[(1, 0), (2, 0)], [(1, 1), (2, 1), (3, 1)], [(2, 2), (3, 2)], [(1, 0), (3, 0)]]
+    r = acuerdo.acuerdo_idioma(*_columnas(unidades))["todas"]
+    assert r["acuerdo_observado"] == 1
+    for clave in ("alfa_nominal", "alfa_intervalo", "kappa_fleiss", "kappa_cohen"):
+        assert r[clave] == pytest.approx(1.0)
+
+
+def test_cohen_dos_anotadores():
+    # Tabla 2×2 clásica (Wikipedia, "Cohen's kappa"): 20 sí/sí, 5 sí/no, 10 no/sí, 15 no/no
+    pares = [(0, 0)] * 20 + [(0, 1)] * 5 + [(1, 0)] * 10 + [(1, 1)] * 15
+    r = acuerdo.acuerdo_idioma(*_columnas([[(1, a), (2, b)] for a, b in pares]))["todas"]
+    assert r["kappa_cohen"] == pytest.approx(0.4)
+    # Dos anotadores sin datos faltantes: α = 1 − 99·30 / (2·55·45) y π de Scott
+    assert r["alfa_nominal"] == pytest.approx(0.4)
+    assert r["kappa_fleiss"] == pytest.approx((0.7 - 0.505) / 0.495)
+    assert r["acuerdo_observado"] == pytest.approx(0.7)
+
+
+def test_krippendorff_ejemplo_publicado(monkeypatch):
+    # Krippendorff (2011), "Computing Krippendorff's Alpha-Reliability": 4 observadores,
+    # 12 unidades, valores 1–5 con datos faltantes; α nominal = 0.743, intervalo = 0.849.
+    # La unidad 12 tiene un solo valor y no cuenta.
+    monkeypatch.setattr(acuerdo, "K", 5)
+    observadores = [
+        [1, 2, 3, 3, 2, 1, 4, 1, 2, None, None, None],
+        [1, 2, 3, 3, 2, 2, 4, 1, 2, 5, None, 3],
+        [None, 3, 3, 3, 2, 3, 4, 2, 2, 5, 1, None],
+        [1, 2, 3, 3, 2, 4, 4, 1, 2, 5, 1, None],
+    ]
+    unidades = [
+        [(o, fila[u] - 1) for o, fila in enumerate(observadores) if fila[u] is not None] for u in range(12)
+    ]
+    r = acuerdo.acuerdo_idioma(*_columnas(unidades))
+    assert r["tweets"] == 12 and r["repetidos"] == 11
+    assert r["todas"]["anotaciones"] == 40
+    assert r["todas"]["alfa_nominal"] == pytest.approx(0.743, abs=5e-4)
+    assert r["todas"]["alfa_intervalo"] == pytest.approx(0.849, abs=5e-4)
+
+
+def test_tweets_con_una_sola_anotacion_se_excluyen():
+    repetidos = [[(1, 0), (2, 1)], [(1, 2), (2, 2)], [(1, 1), (3, 1)], [(2, 0), (3, 2)]]
+    solos = [[(1, 0)], [(2, 2)], [(3, 1)]]
+    base = acuerdo.acuerdo_idioma(*_columnas(repetidos))
+    con_solos = acuerdo.acuerdo_idioma(*_columnas(repetidos + solos))
+    assert con_solos["tweets"] == base["tweets"] + 3
+    assert con_solos["repetidos"] == base["repetidos"] == 4
+    assert con_solos["todas"] == base["todas"]
+
+
+def test_mismo_anotador_y_distintos():
+    unidades = [[(1, 0), (1, 0)], [(1, 2), (1, 2)], [(1, 0), (2, 1)], [(2, 1), (3, 2)], [(2, 2), (3, 2)]]
+    r = acuerdo.acuerdo_idioma(*_columnas(unidades))
+    assert r["mismo_anotador"]["tweets"] == 2
+    assert r["mismo_anotador"]["acuerdo_observado"] == 1
+    assert r["distintos"]["tweets"] == 3
+    assert r["distintos"]["acuerdo_observado"] == pytest.approx(1 / 3)
+
+
+def test_menos_de_dos_tweets():
+    assert acuerdo.metricas(np.array([[2, 0, 0]]), (np.array([0]), np.array([0]))) is None
+
+
+def test_etiqueta_desconocida_no_cuenta():
+    ids, etiquetas, anotadores = _columnas([[(1, 0), (2, 0)], [(1, 1), (2, 1)], [(1, 2), (2, -1)]])
+    r = acuerdo.acuerdo_idioma(ids, etiquetas, anotadores)
+    assert r["invalidas"] == 1
+    assert r["repetidos"] == 2
@@ -0,0 +1,111 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import agrupado
+
+
+def _datos(semilla, celdas, n_por_celda):
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for (a, b), n in zip(celdas, n_por_celda):
+        efecto = 3 * a + 5 * (b == "y") + 4 * (a == 2 and b == "x")
+        filas += [(a, b, int(v)) for v in rng.poisson(20 + efecto, n)]
+    return filas
+
+
+def _rss(y, columnas):
+    X = np.column_stack([np.ones(len(y))] + columnas)
+    beta, *_ = np.linalg.lstsq(X, y, rcond=None)
+    r = y - X @ beta
+    return float(r @ r)
+
+
+def _referencia_ols(filas):
+    y = np.array([v for _, _, v in filas], dtype=float)
+    niveles_a = sorted({a for a, _, _ in filas})
+    niveles_b = sorted({b for _, b, _ in filas})
+    A = [np.array([a == k for a, _, _ in filas], dtype=float) for k in niveles_a[1:]]
+    B = [np.array([b == k for _, b, _ in filas], dtype=float) for k in niveles_b[1:]]
+    celdas = sorted({(a, b) for a, b, _ in filas})
+    C = [np.array([(a, b) == k for a, b, _ in filas], dtype=float) for k in celdas[1:]]
+    rss_a, rss_b, rss_ab, sse = _rss(y, A), _rss(y, B), _rss(y, A + B), _rss(y, C)
+    df_e = len(y) - len(celdas)
+    df = {"A": len(niveles_a) - 1, "B": len(niveles_b) - 1}
+    df["AB"] = len(celdas) - df["A"] - df["B"] - 1
+    ss = {"A": rss_b - rss_ab, "B": rss_a - rss_ab, "AB": rss_ab - sse}
+    return {k: (ss[k], (ss[k] / df[k]) / (sse / df_e)) for k in ss}, sse
+
+
+@pytest.mark.parametrize(
+    "celdas, n_por_celda",
+    [
+        ([(0, "x"), (0, "y"), (1, "x"), (1, "y"), (2, "x"), (2, "y")], [5, 12, 9, 3, 20, 7]),
+        # Una celda vacía (2, "y"); los niveles siguen conectados
+        ([(0, "x"), (0, "y"), (1, "x"), (1, "y"), (2, "x")], [8, 4, 15, 6, 11]),
+    ],
+)
+def test_anova_dos_factores_igual_que_ols(celdas, n_por_celda):
+    filas = _datos(3, celdas, n_por_celda)
+    g = agrupado.AcumuladorPorGrupo()
+    for a, b, v in filas:
+        g.agregar((a, b), v)
+    res = agrupado.anova_dos_factores(g.acumuladores())
+    esperado, sse = _referencia_ols(filas)
+    assert res["error"]["SS"] == pytest.approx(sse)
+    for fila, (ss, F) in esperado.items():
+        assert res[fila]["SS"] == pytest.approx(ss, rel=1e-8, abs=1e-8)
+        assert res[fila]["F"] == pytest.approx(F, rel=1e-8, abs=1e-8)
+
+
+def test_un_solo_nivel_devuelve_none():
+    g = agrupado.AcumuladorPorGrupo()
+    for v in (1, 2, 3):
+        g.agregar((0, "x"), v)
+        g.agregar((0, "y"), v + 1)
+    assert agrupado.anova_dos_factores(g.acumuladores()) is None
+
+
+def _una_pasada(xs):
+    return agrupado.acumulador(len(xs), sum(xs), sum(x * x for x in xs), dict(sorted(Counter(xs).items())))
+
+
+@pytest.mark.parametrize("cortes", [[0, 7, 7, 30, 100], [0, 1, 99, 100], [0, 50, 100]])
+def test_combinar_igual_que_una_pasada(cortes):
+    xs = [int(v) for v in np.random.default_rng(5).integers(0, 300, 100)]
+    total = _una_pasada(xs)
+    partes = [_una_pasada(xs[a:b]) for a, b in zip(cortes, cortes[1:])]
+    combinado = partes[0]
+    for p in partes[1:]:
+        combinado = agrupado.combinar(combinado, p)
+    assert combinado["n"] == total["n"]
+    assert combinado["mean"] == pytest.approx(total["mean"])
+    assert combinado["m2"] == pytest.approx(total["m2"])
+    assert combinado["hist"] == total["hist"]
+
+
+def test_acumulador_por_grupo_sin_numpy_y_por_lotes(monkeypatch):
+    filas = _datos(9, [(0, "x"), (1, "y"), (2, "x")], [40, 25, 33])
+    con_numpy = agrupado.AcumuladorPorGrupo(lote=16)
+    for a, b, v in filas:
+        con_numpy.agregar(a, v)
+    monkeypatch.setattr(agrupado, "np", None)
+    sin_numpy = agrupado.AcumuladorPorGrupo()
+    for a, b, v in filas:
+        sin_numpy.agregar(a, v)
+    esperado = {a: _una_pasada([v for a2, _, v in filas if a2 == a]) for a in (0, 1, 2)}
+    for accs in (con_numpy.acumuladores(), sin_numpy.acumuladores()):
+        assert list(accs) == [0, 1, 2]
+        for a, acc in accs.items():
+            assert acc["n"] == esperado[a]["n"]
+            assert acc["mean"] == pytest.approx(esperado[a]["mean"])
+            assert acc["m2"] == pytest.approx(esperado[a]["m2"])
+            assert acc["hist"] == esperado[a]["hist"]
+
+
+def test_anova_tweets_usa_los_mismos_acumuladores():
+    import AnovaTweets2
+
+    assert AnovaTweets2.acumulador is agrupado.acumulador
+    assert AnovaTweets2.combinar is agrupado.combinar
@@ -0,0 +1,130 @@
+import csv
+import math
+from collections import Counter
+
+import pytest
+
+import AnovaTweets2
+
+
+def _escribir(path, filas):
+    with open(path, "w", encoding="latin-1", newline="") as f:
+        w = csv.writer(f, quoting=csv.QUOTE_ALL)
+        w.writerow(["target", "ids", "date", "flag", "user", "text"])
+        w.writerows(filas)
+
+
+def test_texto_demasiado_largo_se_omite(tmp_path, capsys):
+    ruta = tmp_path / "part-00000.csv"
+    _escribir(
+        ruta,
+        [
+            ["0", "1", "d", "NO_QUERY", "u", "hola"],
+            ["4", "2", "d", "NO_QUERY", "u", "x" * 70_000],
+            ["4", "3", "d", "NO_QUERY", "u", "adiós!"],
+        ],
+    )
+    accs, lengths = AnovaTweets2.acumular_archivo(ruta)
+    assert accs[0]["n"] == 1 and accs[4]["n"] == 1
+    assert list(lengths[4]) == [6]
+    assert accs[4]["hist"] == {6: 1}
+    assert "1 filas" in capsys.readouterr().err
+
+
+def _hist(xs):
+    h = {}
+    for x in xs:
+        h[x] = h.get(x, 0) + 1
+    return h
+
+
+# Grupos pequeños con empates, un grupo de una sola observación y uno constante
+GRUPOS = [
+    [1, 2, 2, 3, 3, 3, 7],
+    [5],
+    [4, 4, 6, 7, 7, 9],
+    [2, 2, 2],
+]
+
+
+def test_levene_igual_a_scipy():
+    stats = pytest.importorskip("scipy.stats")
+    for grupos in (GRUPOS, GRUPOS[:2], GRUPOS[::2], [GRUPOS[0], GRUPOS[3]]):
+        w, df1, df2 = AnovaTweets2.levene_histogramas([_hist(g) for g in grupos])
+        esperado = stats.levene(*grupos)
+        assert w == pytest.approx(esperado.statistic, rel=1e-12)
+        assert (df1, df2) == (len(grupos) - 1, sum(map(len, grupos)) - len(grupos))
+
+
+def test_kruskal_igual_a_scipy():
+    stats = pytest.importorskip("scipy.stats")
+    for grupos in (GRUPOS, GRUPOS[:2], GRUPOS[::2], [GRUPOS[0], GRUPOS[3]]):
+        h, df = AnovaTweets2.kruskal_histogramas([_hist(g) for g in grupos])
+        esperado = stats.kruskal(*grupos)
+        assert h == pytest.approx(esperado.statistic, rel=1e-12)
+        assert df == len(grupos) - 1
+
+
+def test_grupos_constantes_dan_nan_como_scipy():
+    w, _, _ = AnovaTweets2.levene_histogramas([{5: 2}, {5: 3}])
+    h, _ = AnovaTweets2.kruskal_histogramas([{5: 2}, {5: 3}])
+    assert math.isnan(w) and math.isnan(h)
+
+
+def test_grupo_vacio_falla_explicitamente():
+    with pytest.raises(ValueError):
+        AnovaTweets2.levene_histogramas([_hist(GRUPOS[0]), {}])
+    with pytest.raises(ValueError):
+        AnovaTweets2.kruskal_histogramas([_hist(GRUPOS[0]), {}])
+    with pytest.raises(ValueError):
+        AnovaTweets2.kruskal_histogramas([_hist(GRUPOS[0])])
+
+
+def test_pruebas_excluyen_grupos_vacios():
+    stats = pytest.importorskip("scipy.stats")
+    hists = {0: _hist(GRUPOS[0]), 2: {}, 4: _hist(GRUPOS[2])}
+    hom = AnovaTweets2.homogeneidad_test(hists)
+    kw = AnovaTweets2.kruskal_wallis(hists)
+    assert hom["p"] == pytest.approx(stats.levene(GRUPOS[0], GRUPOS[2]).pvalue, rel=1e-9)
+    assert kw["p"] == pytest.approx(stats.kruskal(GRUPOS[0], GRUPOS[2]).pvalue, rel=1e-9)
+    assert AnovaTweets2.kruskal_wallis({0: _hist(GRUPOS[0]), 2: {}, 4: {}}) is None
+
+
+def test_columnar_igual_que_csv(tmp_path, capsys):
+    import columnar
+
+    ruta = tmp_path / "part-00000.csv"
+    _escribir(
+        ruta,
+        [
+            ["0", "1", "d", "NO_QUERY", "u", "hola"],
+            ["4", "2", "d", "NO_QUERY", "u", "x" * 70_000],
+            ["2", "3", "d", "NO_QUERY", "u", ""],
+            ["4", "4", "d", "NO_QUERY", "u", "adiós!"],
+            ["0", "5", "d", "NO_QUERY", "u", "otra más"],
+        ],
+    )
+    esperado = AnovaTweets2.acumular_archivo(ruta)
+    cols = columnar.ingest_csv(ruta)
+    obtenido = AnovaTweets2.acumular_archivo(cols)
+    assert obtenido[0] == esperado[0]
+    assert {t: list(xs) for t, xs in obtenido[1].items()} == {t: list(xs) for t, xs in esperado[1].items()}
+    assert capsys.readouterr().err.count("1 filas") == 2
+
+
+@pytest.mark.parametrize("bloque", [1 << 20, 7])
+def test_qq_histograma_igual_que_probplot(bloque):
+    from scipy import stats
+
+    datos = [3, 3, 3, 5, 8, 8, 9, 12, 12, 12, 12, 20, 41, 41, 140]
+    hist = dict(sorted(Counter(datos).items()))
+    osm, osr, pendiente, intercepto = AnovaTweets2.qq_histograma(hist, puntos=len(datos), bloque=bloque)
+    (osm_sp, osr_sp), (pendiente_sp, intercepto_sp, _) = stats.probplot(datos)
+    assert osm == pytest.approx(osm_sp)
+    assert list(osr) == list(osr_sp)
+    assert pendiente == pytest.approx(pendiente_sp)
+    assert intercepto == pytest.approx(intercepto_sp)
+    osm5, osr5, _, _ = AnovaTweets2.qq_histograma(hist, puntos=5, bloque=bloque)
+    idx = [0, 3, 7, 10, 14]
+    assert osm5 == pytest.approx(osm_sp[idx])
+    assert list(osr5) == list(osr_sp[idx])
@@ -0,0 +1,30 @@
+import csv
+
+import pytest
+
+import columnar
+
+TEXTS = ["", "plain", "", "acentuación ñandú", "emoji 😀 ok", "", "€", "last"]
+
+
+def _table(tmp_path, encoding, texts=TEXTS):
+    path = tmp_path / "tweets.csv"
+    with open(path, "w", encoding=encoding, newline="") as f:
+        w = csv.writer(f, quoting=csv.QUOTE_ALL)
+        for i, text in enumerate(texts):
+            w.writerow(["4", str(i), "d", "NO_QUERY", "", text])
+    return columnar.ingest_csv(path, encoding=encoding)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_char_lengths(tmp_path, encoding):
+    texts = TEXTS if encoding == "utf-8" else [t for t in TEXTS if t.isascii() or t.startswith("acent")]
+    with columnar.ColumnarTable(_table(tmp_path, encoding, texts)) as table:
+        assert [int(n) for n in table.char_lengths("text")] == [len(t) for t in texts]
+        assert [int(n) for n in table.char_lengths("user")] == [0] * len(texts)
+
+
+def test_char_lengths_without_numpy(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "np", None)
+    with columnar.ColumnarTable(_table(tmp_path, "utf-8")) as table:
+        assert list(table.char_lengths("text")) == [len(t) for t in TEXTS]
@@ -0,0 +1,66 @@
+import gzip
+import zipfile
+
+import pytest
+
+import compressed
+
+LINES = ["ids,text\r\n", '1,"año, ñandú"\r\n', "2,#Monday\r\n"]
+
+
+def _write(path, lines, append=False):
+    with compressed.open_output(str(path), "utf-8", append=append) as f:
+        f.writelines(lines)
+
+
+def _read(path):
+    with compressed.open_text(str(path), "utf-8") as f:
+        return f.read()
+
+
+def test_open_output_round_trip(tmp_path, compressed_suffix):
+    path = tmp_path / f"out.csv.{compressed_suffix}"
+    _write(path, LINES)
+    assert compressed.detect(str(path)) == compressed.output_compression(str(path))
+    assert _read(path) == "".join(LINES)
+
+
+def test_open_output_plain(tmp_path):
+    path = tmp_path / "out.csv"
+    _write(path, LINES)
+    assert compressed.detect(str(path)) is None
+    assert path.read_bytes() == "".join(LINES).encode("utf-8")
+
+
+def test_gzip_zip_readable_by_stdlib(tmp_path):
+    _write(tmp_path / "out.csv.gz", LINES)
+    assert gzip.decompress((tmp_path / "out.csv.gz").read_bytes()).decode("utf-8") == "".join(LINES)
+    _write(tmp_path / "out.csv.zip", LINES)
+    with zipfile.ZipFile(tmp_path / "out.csv.zip") as zf:
+        assert zf.namelist() == ["out.csv"]
+        assert zf.read("out.csv").decode("utf-8") == "".join(LINES)
+    # The member can also be named through the archive path
+    assert _read(tmp_path / "out.csv.zip" / "out.csv") == "".join(LINES)
+
+
+@pytest.mark.parametrize("suffix", ["gz", "zst"])
+def test_append_adds_a_member(tmp_path, suffix):
+    if suffix == "zst":
+        pytest.importorskip("zstandard")
+    path = tmp_path / f"out.csv.{suffix}"
+    _write(path, LINES[:2])
+    _write(path, LINES[2:], append=True)
+    assert _read(path) == "".join(LINES)
+
+
+def test_zip_cannot_append(tmp_path):
+    path = tmp_path / "out.csv.zip"
+    _write(path, LINES)
+    with pytest.raises(ValueError):
+        _write(path, LINES, append=True)
+
+
+def test_zst_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(compressed, "zstandard", None)
+    with pytest.raises(RuntimeError, match="zstandard"):
+        _write(tmp_path / "out.csv.zst", LINES)
@@ -0,0 +1,24 @@
+import european
+
+
+def _corpus(folder):
+    folder.mkdir()
+    (folder / "Spanish_Twitter_sentiment.csv").write_text("TweetID,HandLabel,AnnotatorID\n1,Positive,3\n2,Negative,3\n")
+    (folder / "German_Twitter_sentiment.csv").write_text("TweetID,HandLabel,AnnotatorID\n5,Neutral,7\n")
+
+
+def test_cache_outside_the_corpus_folder(tmp_path):
+    folder = tmp_path / "corpus"
+    _corpus(folder)
+    cache = european.cache_path_for(folder, tmp_path / "user-cache")
+    with european.load(folder, cache, workers=1) as table:
+        assert table.rows == 3
+        assert table.ranges == {"German": (0, 1), "Spanish": (1, 3)}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["corpus", "user-cache"]
+    assert european.is_up_to_date(folder, cache)
+
+
+def test_same_name_different_folders(tmp_path):
+    a = european.cache_path_for(tmp_path / "a" / "corpus")
+    b = european.cache_path_for(tmp_path / "b" / "corpus")
+    assert a != b and a.parent == b.parent == european.CACHE_DIR
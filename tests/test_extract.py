@@ -0,0 +1,69 @@
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import extract
+
+DATASET = "owner/data"
+FILE = "data.csv"
+CONTENT = b"a,b\n" * 1000
+
+
+class ShortSource(extract.LocalSource):
+    """Serves a truncated copy while reporting the real size."""
+
+    def download(self, dataset, file_name, dest_dir):
+        dest = dest_dir / file_name
+        dest.write_bytes(CONTENT[:-10])
+        return dest
+
+
+@pytest.fixture
+def remote(tmp_path):
+    base = tmp_path / "remote" / DATASET
+    base.mkdir(parents=True)
+    (base / FILE).write_bytes(CONTENT)
+    return tmp_path / "remote"
+
+
+def test_descarga_y_reutiliza(tmp_path, remote):
+    source = extract.LocalSource(remote)
+    cached, manifest = extract.fetch_into_cache(source, DATASET, FILE, tmp_path / "cache")
+    assert cached.read_bytes() == CONTENT
+    assert manifest["size"] == len(CONTENT)
+    assert not (cached.parent / "download").exists()
+    again, _ = extract.fetch_into_cache(source, DATASET, FILE, tmp_path / "cache")
+    assert again == cached
+
+
+def test_zip_remoto(tmp_path, remote):
+    base = remote / DATASET
+    with zipfile.ZipFile(base / f"{FILE}.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(FILE, CONTENT)
+    (base / FILE).unlink()
+    cached, _ = extract.fetch_into_cache(extract.LocalSource(remote), DATASET, FILE, tmp_path / "cache")
+    assert cached.read_bytes() == CONTENT
+
+
+def test_tamano_distinto_no_entra_en_cache(tmp_path, remote):
+    with pytest.raises(RuntimeError, match="tamaño remoto"):
+        extract.fetch_into_cache(ShortSource(remote), DATASET, FILE, tmp_path / "cache")
+    entries = list((tmp_path / "cache").iterdir())
+    assert len(entries) == 1
+    assert not (entries[0] / "manifest.json").exists()
+    assert not (entries[0] / FILE).exists()
+
+
+def test_restos_de_descarga_se_descartan(tmp_path, remote):
+    source = extract.LocalSource(remote)
+    version = source.remote_version(DATASET, FILE)
+    entry = extract.cache_entry_dir(tmp_path / "cache", DATASET, FILE, version)
+    # A crashed run: a truncated file already in download/ and a partial one in download.part/
+    (entry / "download").mkdir(parents=True)
+    (entry / "download" / FILE).write_bytes(CONTENT[:100])
+    (entry / "download.part").mkdir()
+    (entry / "download.part" / FILE).write_bytes(b"x")
+    cached, _ = extract.fetch_into_cache(source, DATASET, FILE, tmp_path / "cache")
+    assert cached.read_bytes() == CONTENT
+    assert not (entry / "download.part").exists()
@@ -0,0 +1,59 @@
+import gzip
+
+import pytest
+
+import hashtag_index
+
+
+def _row(i, tag):
+    return f'"4","{i}","d","NO_QUERY","u","text {tag}"\n'.encode("latin-1")
+
+
+def _counts(conn):
+    return dict(conn.execute("SELECT hashtag, total FROM hashtag_totals"))
+
+
+def _write(path, data):
+    path.write_bytes(gzip.compress(data) if path.suffix == ".gz" else data)
+
+
+@pytest.fixture(params=["tweets.csv", "tweets.csv.gz"])
+def source(request, tmp_path):
+    return tmp_path / request.param
+
+
+def test_append_is_incremental(tmp_path, source):
+    _write(source, _row(1, "#aa") + _row(2, "#bb"))
+    conn = hashtag_index.open_index(str(tmp_path / "index.sqlite"))
+    assert hashtag_index.update_from_csv(conn, str(source)) == (2, 2)
+    _write(source, _row(1, "#aa") + _row(2, "#bb") + _row(3, "#aa"))
+    assert hashtag_index.update_from_csv(conn, str(source)) == (1, 1)
+    assert _counts(conn) == {"#aa": 2, "#bb": 1}
+
+
+@pytest.mark.parametrize("extra", [b"", _row(3, "#dd")])
+def test_rewrite_in_place_rebuilds(tmp_path, source, capsys, extra):
+    _write(source, _row(1, "#aa") + _row(2, "#bb"))
+    conn = hashtag_index.open_index(str(tmp_path / "index.sqlite"))
+    hashtag_index.update_from_csv(conn, str(source))
+    # Same size (or longer): only the hash tells it apart from an append
+    _write(source, _row(1, "#cc") + _row(2, "#bb") + extra)
+    hashtag_index.update_from_csv(conn, str(source))
+    expected = {"#cc": 1, "#bb": 1, **({"#dd": 1} if extra else {})}
+    assert _counts(conn) == expected
+    assert "rebuilding" in capsys.readouterr().err
+
+
+def test_index_without_hash_column_is_migrated(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "index.sqlite"
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE sources (path TEXT PRIMARY KEY, offset INTEGER NOT NULL, rows INTEGER NOT NULL)")
+    old.commit()
+    old.close()
+    source = tmp_path / "tweets.csv"
+    _write(source, _row(1, "#aa"))
+    conn = hashtag_index.open_index(str(path))
+    assert hashtag_index.update_from_csv(conn, str(source)) == (1, 1)
+    assert hashtag_index.update_from_csv(conn, str(source)) == (0, 0)
@@ -0,0 +1,75 @@
+import csv
+from typing import List, Tuple
+
+import pytest
+
+import compressed
+from extract_hashtags import extract_hashtags, process_rows
+
+
+# (text, expected hashtags) for the intended word-boundary behavior
+BOUNDARY_CASES: List[Tuple[str, List[str]]] = [
+    ("", []),
+    ("no tags here", []),
+    ("#start of text", ["#start"]),
+    ("end of text #end", ["#end"]),
+    ("two #one #two", ["#one", "#two"]),
+    ("inside a word: abc#tag", []),
+    ("after digit 1#tag", []),
+    ("after underscore _#tag", []),
+    ("after accented letter é#tag", []),
+    ("double ##tag", ["#tag"]),
+    ("glued #one#two", ["#one"]),
+    ("punctuation (#tag), [#x]", ["#tag", "#x"]),
+    ("after mention @user#tag", []),
+    ("after slash http://x.com/#frag", ["#frag"]),
+    ("stops at punctuation #tag!", ["#tag"]),
+    ("stops at hyphen #foo-bar", ["#foo"]),
+    ("underscore and digits #f1_2009", ["#f1_2009"]),
+    ("non-ASCII body #é", []),
+    ("non-ASCII stops body #caféx", ["#caf"]),
+    ("lone # sign", []),
+    ("case kept #FollowFriday", ["#FollowFriday"]),
+]
+
+
+@pytest.mark.parametrize("text, expected", BOUNDARY_CASES)
+def test_boundaries(text, expected):
+    assert extract_hashtags(text) == expected
+
+
+def test_lowercase():
+    assert extract_hashtags("#FollowFriday #F1", lowercase=True) == ["#followfriday", "#f1"]
+
+
+TWEETS = [
+    ["0", "1", "d", "NO_QUERY", "ana", "#Monday again"],
+    ["4", "2", "d", "NO_QUERY", "beto", "no tags,\njust a newline"],
+    ["4", "3", "d", "NO_QUERY", "caro", "#one and #two"],
+]
+
+
+@pytest.mark.parametrize("kind", ["gz", "zip", "member"])
+def test_process_rows_compressed_input(tmp_path, compress, kind):
+    plain = tmp_path / "tweets.csv"
+    with open(plain, "w", encoding="latin-1", newline="") as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL).writerows(TWEETS)
+    expected = tmp_path / "expected.csv"
+    process_rows(str(plain), str(expected))
+    output = tmp_path / "output.csv"
+    process_rows(compress(plain, kind), str(output), index_path=str(tmp_path / "index.sqlite"))
+    assert output.read_bytes() == expected.read_bytes()
+    assert expected.read_text().splitlines()[1:] == ["1,0,#Monday", "3,4,#one", "3,4,#two"]
+
+
+def test_process_rows_compressed_output(tmp_path, compressed_suffix):
+    plain = tmp_path / "tweets.csv"
+    with open(plain, "w", encoding="latin-1", newline="") as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL).writerows(TWEETS)
+    expected = tmp_path / "expected.csv"
+    process_rows(str(plain), str(expected))
+    output = tmp_path / f"output.csv.{compressed_suffix}"
+    process_rows(str(plain), str(output))
+    assert compressed.detect(str(output)) is not None
+    with compressed.open_input(str(output)) as f:
+        assert f.read() == expected.read_bytes()
@@ -0,0 +1,91 @@
+import csv
+
+import numpy as np
+import pytest
+
+import joins
+
+
+def _csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def _read(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_pairs_matches_nested_loop():
+    rng = np.random.default_rng(1)
+    lk = np.sort(rng.integers(0, 20, 50))
+    rk = np.sort(rng.integers(0, 20, 40))
+    li, rj = joins._pairs(lk, rk)
+    expected = [(i, j) for i in range(len(lk)) for j in range(len(rk)) if lk[i] == rk[j]]
+    assert list(zip(li.tolist(), rj.tolist())) == expected
+
+
+def test_bloom_has_no_false_negatives():
+    keys = np.arange(0, 50_000, 7, dtype=np.int64)
+    bloom = joins.BloomFilter(len(keys), 0.01)
+    bloom.add(keys)
+    assert bloom.contains(keys).all()
+    others = np.arange(1, 50_000, 7, dtype=np.int64)
+    assert bloom.contains(others).mean() < 0.05
+
+
+def test_key_only_side(tmp_path):
+    left = _csv(tmp_path / "l.csv", [["id"], ["1"], ["3"]])
+    right = _csv(tmp_path / "r.csv", [["id", "x"], ["1", "foo"], ["2", "bar"], ["3", "baz"]])
+    out = tmp_path / "out.csv"
+    joins.join(left, right, str(out))
+    assert _read(out) == [["id", "x"], ["1", "foo"], ["3", "baz"]]
+    joins.join(right, left, str(out))
+    assert _read(out) == [["id", "x"], ["1", "foo"], ["3", "baz"]]
+
+
+def test_quoted_payload(tmp_path):
+    text = 'a "quoted", multi\nline text'
+    left = _csv(tmp_path / "l.csv", [["ids", "user", "text"], ["5", "ana", text], ["6", "beto", "x"]])
+    right = _csv(tmp_path / "r.csv", [["id", "target", "hashtag"], ["5", "4", "#one"], ["5", "4", "#two"]])
+    out = tmp_path / "out.csv"
+    stats = joins.join(left, right, str(out))
+    assert stats["joined"] == 2
+    assert _read(out) == [
+        ["id", "user", "text", "target", "hashtag"],
+        ["5", "ana", text, "4", "#one"],
+        ["5", "ana", text, "4", "#two"],
+    ]
+
+
+def test_count_with_key_only_side(tmp_path):
+    left = _csv(tmp_path / "l.csv", [["id"], ["1"], ["2"], ["3"]])
+    right = _csv(tmp_path / "r.csv", [["id", "Marca", "hashtag"], ["1", "Apple", "#a"], ["2", "Apple", "#a"], ["3", "Sony", "#a"]])
+    out = tmp_path / "out.csv"
+    stats = joins.join(left, right, str(out), count=["Marca"])
+    assert stats["groups"] == 2
+    assert _read(out) == [["Marca", "n"], ["Apple", "2"], ["Sony", "1"]]
+
+
+def test_spilled_runs_give_the_same_output(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    left_ids = rng.integers(0, 500, 2000)
+    right_ids = rng.integers(0, 500, 300)
+    left = _csv(tmp_path / "l.csv", [["id", "a"]] + [[str(i), f"l{n}"] for n, i in enumerate(left_ids)])
+    right = _csv(tmp_path / "r.csv", [["id", "b"]] + [[str(i), f"r{n}"] for n, i in enumerate(right_ids)])
+    whole, spilled = tmp_path / "whole.csv", tmp_path / "spilled.csv"
+    joins.join(left, right, str(whole))
+    # Small batches, so the runs are cut (and spilled) every 100 rows
+    monkeypatch.setattr(joins, "BATCH_ROWS", 50)
+    stats = joins.join(left, right, str(spilled), memory_rows=100)
+    assert stats["spilled_runs"] > 2 and stats["partitions"] > 1
+    assert _read(spilled) == _read(whole)
+    expected = sum(int((right_ids == i).sum()) for i in left_ids)
+    assert stats["joined"] == expected == len(_read(whole)) - 1
+
+
+def test_unknown_count_column(tmp_path):
+    left = _csv(tmp_path / "l.csv", [["id", "a"], ["1", "x"]])
+    with pytest.raises(ValueError):
+        joins.join(left, left, str(tmp_path / "out.csv"), count=["nope"])
@@ -0,0 +1,234 @@
+import csv
+import sqlite3
+from collections import Counter
+
+import pytest
+
+import compressed
+import exportar_marcas_csv as marcas
+import features
+
+FILAS = [
+    ["0", "1", "d", "NO_QUERY", "ana", "me encanta mi iphone"],
+    ["4", "2", "d", "NO_QUERY", "beto", "nada que ver"],
+    ["4", "3", "d", "NO_QUERY", "caro", "probando la nueva xbox"],
+]
+
+
+def _escribir(path, filas=FILAS):
+    with open(path, "w", encoding="latin-1", newline="") as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL).writerows(filas)
+
+
+def _leer(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def entrada(tmp_path):
+    ruta = tmp_path / "tweets.csv"
+    _escribir(ruta)
+    return ruta
+
+
+@pytest.fixture
+def esperado(entrada, tmp_path):
+    salida = tmp_path / "esperado.csv"
+    marcas.process_csv(str(entrada), str(salida))
+    return _leer(salida)
+
+
+def test_features_igual_que_clasificar(entrada, esperado, tmp_path):
+    db = tmp_path / "f.sqlite"
+    features.build_features(str(entrada), str(db), ["brand"])
+    salida = tmp_path / "salida.csv"
+    marcas.process_csv(str(entrada), str(salida), features_db=str(db))
+    assert _leer(salida) == esperado
+
+
+@pytest.mark.parametrize("sql", ["DELETE FROM f_brand WHERE row = 2", "INSERT INTO f_brand VALUES (3, NULL)"])
+def test_features_con_filas_distintas_falla(entrada, tmp_path, capsys, sql):
+    db = tmp_path / "f.sqlite"
+    features.build_features(str(entrada), str(db), ["brand"])
+    with sqlite3.connect(db) as conn:
+        conn.execute(sql)
+    with pytest.raises(SystemExit):
+        marcas.process_csv(str(entrada), str(tmp_path / "salida.csv"), features_db=str(db))
+    assert "ERROR" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("formato", ["gz", "zip", "member"])
+def test_entrada_comprimida(entrada, esperado, tmp_path, compress, formato):
+    salida = tmp_path / "salida.csv"
+    marcas.process_csv(compress(entrada, formato), str(salida))
+    assert _leer(salida) == esperado
+
+
+def test_salida_comprimida(entrada, esperado, tmp_path, compressed_suffix):
+    salida = tmp_path / f"salida.csv.{compressed_suffix}"
+    marcas.process_csv(str(entrada), str(salida))
+    assert compressed.detect(str(salida)) is not None
+    with compressed.open_text(str(salida), "utf-8") as f:
+        assert list(csv.reader(f)) == esperado
+
+
+def test_paralelo_igual_que_secuencial(tmp_path, capsys):
+    ruta = tmp_path / "muchos.csv"
+    filas = [[str(i % 2 * 4), str(i), "d", "NO_QUERY", "u", f"tweet {i} iphone" if i % 3 else "nada"] for i in range(120_000)]
+    _escribir(ruta, filas)
+    secuencial, paralelo = tmp_path / "s.csv", tmp_path / "p.csv"
+    marcas.process_csv(str(ruta), str(secuencial))
+    salida_s = capsys.readouterr().out
+    marcas.process_csv(str(ruta), str(paralelo), workers=3)
+    salida_p = capsys.readouterr().out
+    assert paralelo.read_bytes() == secuencial.read_bytes()
+    # Un aviso por cada 100000 filas en ambos caminos (no uno por rango); el
+    # número exacto depende del tamaño de lote de cada uno
+    def avisos(salida):
+        return [l for l in salida.splitlines() if l.startswith("Progreso")]
+
+    assert len(avisos(salida_p)) == len(avisos(salida_s)) == 1
+
+
+PATRONES = marcas.build_brand_patterns()
+
+# Solapes de prioridad y bordes que no son de palabra
+TEXTOS = [
+    "",
+    "nada que ver",
+    "mi iphone y mi galaxy",
+    "galaxy antes que iphone",
+    "escuchando apple music",
+    "apple music y después samsung",
+    "hbo max esta noche",
+    "max y hbo",
+    "amazon web services caído",
+    "google pay falla, google cloud no",
+    "sony pictures estrena",
+    "iphone5 no es iphone",
+    "xboxone",
+    "x-box nueva",
+    "#iphone @apple",
+    "apple's store",
+    "_apple",
+    "ápple",
+    "éiphone",
+    "APPLE!!!",
+    "mac os",
+    "macos",
+    "mac  os",
+    "fire tv stick",
+    "el wd de 2tb",
+    "windows7 vs win7",
+    "iPhone\ny galaxy",
+]
+
+
+def _variantes():
+    textos = []
+    for _, alias in marcas.cargar_catalogo():
+        for a in alias:
+            for v in sorted(marcas._expandir_alias(a) or []):
+                textos += [v, f"x {v} y", f"x{v}", f"{v}s", f"#{v}", f"@{v}!", f"{v.upper()}'s", f"({v.lower()})"]
+    return textos
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_classify_brand_igual_que_secuencial(texto):
+    matcher = marcas.build_brand_matcher(PATRONES)
+    esperado = marcas.classify_brand_secuencial(texto, PATRONES)
+    assert marcas.classify_brand(texto, matcher) == esperado
+    # Firma original: la lista de patrones
+    assert marcas.classify_brand(texto, PATRONES) == esperado
+
+
+def test_todos_los_alias_igual_que_secuencial(tmp_path):
+    matcher = marcas.load_brand_matcher(cache_dir=str(tmp_path))
+    textos = _variantes() + TEXTOS
+    esperado = [marcas.classify_brand_secuencial(t, PATRONES) for t in textos]
+    assert [marcas.classify_brand(t, matcher) for t in textos] == esperado
+    etiquetas = marcas.brand_labels(matcher)
+    assert [etiquetas[c] for c in marcas.classify_brands(textos, matcher)] == esperado
+
+
+def test_patrones_con_otra_forma_se_prueban_en_orden():
+    import re
+
+    patrones = [("Uno", re.compile(r"uno\d")), ("Dos", re.compile(r"dos", re.IGNORECASE))]
+    assert marcas.classify_brand("DOS y uno1", patrones) == "Uno"
+    assert marcas.classify_brand("DOS", patrones) == "Dos"
+    assert marcas.classify_brand("UNO1", patrones) == "sin marca"
+
+
+def test_cache_del_matcher(tmp_path, monkeypatch):
+    catalogo = tmp_path / "marcas.csv"
+    catalogo.write_text("prioridad,categoria,marca,alias\n1,X,Uno,UNO\n2,X,Dos,DOS\n", encoding="utf-8")
+    cache = tmp_path / "cache"
+    m = marcas.load_brand_matcher(str(catalogo), str(cache))
+    assert m["labels"] == ["Uno", "Dos"]
+    (archivo,) = cache.iterdir()
+    assert archivo.name.startswith(f"matcher-v{marcas.VERSION_MATCHER}-")
+    # Mismo catálogo: se reutiliza el archivo
+    assert marcas.load_brand_matcher(str(catalogo), str(cache))["labels"] == ["Uno", "Dos"]
+    assert len(list(cache.iterdir())) == 1
+    # Otro catálogo: otra huella, otro archivo
+    catalogo.write_text("prioridad,categoria,marca,alias\n1,X,Tres,TRES\n", encoding="utf-8")
+    assert marcas.load_brand_matcher(str(catalogo), str(cache))["labels"] == ["Tres"]
+    assert len(list(cache.iterdir())) == 2
+    # Otra versión del índice: no se lee el archivo anterior
+    monkeypatch.setattr(marcas, "VERSION_MATCHER", marcas.VERSION_MATCHER + 1)
+    assert marcas.load_brand_matcher(str(catalogo), str(cache))["labels"] == ["Tres"]
+    assert len(list(cache.iterdir())) == 3
+    # Un archivo dañado se reconstruye
+    for f in cache.iterdir():
+        f.write_text("{no es json", encoding="utf-8")
+    assert marcas.load_brand_matcher(str(catalogo), str(cache))["labels"] == ["Tres"]
+    assert marcas.classify_brand("hola tres", marcas.load_brand_matcher(str(catalogo), str(cache))) == "Tres"
+
+
+def test_find_brands_dos_marcas(tmp_path):
+    matcher = marcas.load_brand_matcher(cache_dir=str(tmp_path))
+    etiquetas = marcas.brand_labels(matcher)
+    texto = "mi iPhone y mi galaxy, otra vez iphone"
+    encontradas = [(etiquetas[c], a, b) for c, a, b in marcas.find_brands(texto, matcher)]
+    assert encontradas == [("Apple", 3, 9), ("Samsung", 15, 21), ("Apple", 32, 38)]
+    assert marcas._columnas_multimarca(marcas.find_brands(texto, matcher), etiquetas) == [
+        "Apple|Samsung",
+        "Apple:3-9;Samsung:15-21;Apple:32-38",
+    ]
+    # Dos marcas que empiezan en la misma palabra
+    solapadas = {etiquetas[c] for c, _, _ in marcas.find_brands("apple music", matcher)}
+    assert solapadas == {"Apple", "Apple Music"}
+
+
+def _conteos_desde_filas(filas):
+    tweets, menciones, pares = Counter(), Counter(), Counter()
+    for fila in filas:
+        presentes = [m for m in fila[-2].split("|") if m]
+        tweets.update(presentes)
+        menciones.update(p.rsplit(":", 1)[0] for p in fila[-1].split(";") if p)
+        # Los pares del CSV van en orden de prioridad (código menor primero)
+        for i, a in enumerate(presentes):
+            for b in presentes[i + 1:]:
+                pares[frozenset((a, b))] += 1
+    return tweets, menciones, pares
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_conteos_igual_que_filas_escritas(tmp_path, workers):
+    ruta = tmp_path / "tweets.csv"
+    textos = ["iphone y galaxy", "nada", "apple music en mi ipad", "xbox, sony y xbox", "galaxy", "iphone galaxy xbox"]
+    _escribir(ruta, [["4", str(i), "d", "NO_QUERY", "u", t] for i, t in enumerate(textos * 50)])
+    salida, conteos = tmp_path / "salida.csv", tmp_path / "conteos.csv"
+    marcas.process_csv(str(ruta), str(salida), workers=workers, multimarca=True, conteos=str(conteos))
+    filas = _leer(salida)
+    assert filas[0] == ["ids", "user", "text", "Marca", "Marcas", "Posiciones"]
+    assert filas[1][3:] == ["Apple", "Apple|Samsung", "Apple:0-6;Samsung:9-15"]
+    tweets, menciones, pares = _conteos_desde_filas(filas[1:])
+    tabla = _leer(conteos)
+    assert tabla[0] == ["marca", "tweets", "menciones", "porcentaje"]
+    assert {f[0]: (int(f[1]), int(f[2])) for f in tabla[1:]} == {m: (tweets[m], menciones[m]) for m in tweets}
+    assert all(float(f[3]) == pytest.approx(100 * int(f[1]) / 300, abs=1e-4) for f in tabla[1:])
+    tabla_pares = _leer(tmp_path / "conteos_pares.csv")
+    assert {frozenset(f[:2]): int(f[2]) for f in tabla_pares[1:]} == dict(pares)
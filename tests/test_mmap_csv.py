@@ -0,0 +1,57 @@
+import gzip
+import io
+
+import pytest
+
+import mmap_csv
+
+DATA = b"".join(
+    b'"%d","user%d","line with a ""quote"" and\nnewline %d"\n' % (i, i, i) if i % 3 == 0 else b'"%d","user%d","plain %d"\n' % (i, i, i)
+    for i in range(200)
+)
+
+
+def _boundaries(path):
+    with mmap_csv.MmapCSV(path) as f:
+        return [end for _, end in f.batches(0, batch_bytes=1)]
+
+
+@pytest.fixture
+def plain(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def _stream():
+    return mmap_csv.StreamCSV(io.BytesIO(DATA))
+
+
+@pytest.mark.parametrize("batch_bytes", [1, 64, 1 << 20])
+def test_stream_batches_match_mmap(plain, batch_bytes):
+    bounds = _boundaries(plain)
+    for start, stop in [(0, None), (0, bounds[10]), (bounds[5], bounds[50]), (bounds[7], bounds[7]), (bounds[-2], len(DATA) + 100)]:
+        with mmap_csv.MmapCSV(plain) as f:
+            expected = "".join(text for text, _ in f.batches(start, batch_bytes, stop))
+        with _stream() as s:
+            batches = list(s.batches(start, batch_bytes, stop))
+        assert "".join(text for text, _ in batches) == expected
+        if batches:
+            assert batches[-1][1] == start + len(expected.encode("latin-1"))
+
+
+def test_stream_iter_rows_stop(plain):
+    bounds = _boundaries(plain)
+    with mmap_csv.MmapCSV(plain) as f:
+        expected = list(f.iter_rows(bounds[3], bounds[30]))
+    with _stream() as s:
+        assert list(s.iter_rows(bounds[3], bounds[30])) == expected
+    assert len(expected) == 27
+
+
+def test_open_csv_gzip(tmp_path, plain):
+    path = tmp_path / "data.csv.gz"
+    path.write_bytes(gzip.compress(DATA))
+    with mmap_csv.open_csv(str(path)) as s, mmap_csv.MmapCSV(plain) as f:
+        assert isinstance(s, mmap_csv.StreamCSV)
+        assert list(s.iter_rows(0, stop=None)) == list(f.iter_rows(0))
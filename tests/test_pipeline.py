@@ -0,0 +1,38 @@
+import csv
+import threading
+
+import pipeline
+
+import exportar_marcas_csv as marcas
+from extract_hashtags import process_rows
+
+
+def test_add_from_many_threads():
+    times = pipeline.StageTimes()
+
+    def work():
+        for _ in range(20_000):
+            times.add(pipeline.WRITE, 1.0)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert times.seconds[pipeline.WRITE] == 160_000.0
+
+
+def test_tools_share_stage_names(tmp_path):
+    source = tmp_path / "tweets.csv"
+    with open(source, "w", encoding="latin-1", newline="") as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL).writerows(
+            [["4", str(i), "d", "NO_QUERY", "u", f"#tag {i} iphone"] for i in range(100)]
+        )
+    for run in (
+        lambda t: process_rows(str(source), str(tmp_path / "h.csv"), times=t),
+        lambda t: marcas.process_csv(str(source), str(tmp_path / "m.csv"), etapas=t),
+    ):
+        times = pipeline.StageTimes()
+        run(times)
+        assert set(times.seconds) <= set(pipeline.STAGES)
+        assert {pipeline.READ, pipeline.COMPUTE, pipeline.WRITE} <= set(times.seconds)